@@ -0,0 +1,247 @@
+"""
+下载吞吐基准测试
+
+启动本地 Range 测试服务器（benchmarks/range_server.py，独立进程），
+在不同网络场景下分别以单线程和多线程模式运行下载引擎（src.core.downloader），报告：
+- 吞吐（MB/s）和总耗时
+- 尾部耗时：服务器发出 90% 数据到发出最后一个字节之间的时间，反映慢分片拖尾
+- 客户端 CPU 时间和峰值 RSS（每次下载在独立子进程中运行）
+- 下载结果是否与服务器内容一致（SHA-256），以及重试带来的额外流量
+
+用法：
+    python benchmarks/download_benchmark.py
+    python benchmarks/download_benchmark.py --size 256MB --threads 8 --scenario flaky
+    python benchmarks/download_benchmark.py --output download.json
+    python benchmarks/download_benchmark.py --compare download.json
+
+下载结果校验失败，或 --compare 时吞吐下降超过 --threshold，都会返回非零退出码。
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARK_DIR)
+
+sys.path.insert(0, BENCHMARK_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from range_server import expected_sha256, parse_size  # noqa: E402
+
+# 网络场景：传给 range_server.py 的参数
+SCENARIOS = {
+    "local": [],
+    "throttled": ["--bandwidth", "8MB", "--latency", "30"],
+    "flaky": [
+        "--bandwidth", "8MB", "--latency", "30",
+        "--error-rate", "0.15", "--reset-rate", "0.15",
+        "--stall-rate", "0.2", "--stall-seconds", "1.5",
+        "--seed", "1",
+    ],
+}
+
+
+def start_server(scenario):
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(BENCHMARK_DIR, "range_server.py"), "--port", "0"]
+        + SCENARIOS[scenario],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    base_url = proc.stdout.readline().strip()
+    if not base_url:
+        proc.kill()
+        raise RuntimeError("测试服务器启动失败")
+    return proc, base_url
+
+
+def _server_json(base_url, path):
+    with urllib.request.urlopen(f"{base_url}{path}", timeout=10) as response:
+        return json.loads(response.read().decode("utf-8"))
+
+
+def tail_seconds(stats):
+    """服务器发出 90% 数据后到最后一个字节的时间"""
+    total = stats["bytes_sent"]
+    for timestamp, sent in stats["timeline"]:
+        if sent >= total * 0.9:
+            return max(0.0, stats["last_byte_at"] - timestamp)
+    return 0.0
+
+
+def run_child(url, size, threads):
+    """在子进程中运行一次下载，返回客户端测得的指标"""
+    import resource
+
+    from src.core.downloader import DownloadEngine
+
+    errors = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        engine = DownloadEngine(url, "benchmark.mp4", work_dir, threads)
+
+        usage_before = resource.getrusage(resource.RUSAGE_SELF)
+        start = time.perf_counter()
+        try:
+            engine.download()
+        except Exception as e:
+            errors.append(str(e))
+        elapsed = time.perf_counter() - start
+        usage_after = resource.getrusage(resource.RUSAGE_SELF)
+
+        path = os.path.join(work_dir, "benchmark.mp4")
+        digest = hashlib.sha256()
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(block)
+        downloaded = os.path.getsize(path) if os.path.exists(path) else 0
+
+    # Linux 上 ru_maxrss 的单位是 KB，macOS 上是字节
+    max_rss = usage_after.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    return {
+        "elapsed_s": elapsed,
+        "cpu_s": (usage_after.ru_utime + usage_after.ru_stime)
+        - (usage_before.ru_utime + usage_before.ru_stime),
+        "peak_rss_mb": max_rss / 1024 / 1024,
+        "downloaded": downloaded,
+        "sha256": digest.hexdigest(),
+        "errors": errors,
+    }
+
+
+def measure(scenario, mode, size, threads, expected_digest):
+    proc, base_url = start_server(scenario)
+    try:
+        _server_json(base_url, "/__reset")
+        url = f"{base_url}/file/{size}.mp4"
+        child = subprocess.run(
+            [sys.executable, __file__, "--child", url, "--size", str(size), "--threads", str(threads)],
+            capture_output=True,
+            text=True,
+            timeout=900,
+        )
+        result = None
+        for line in child.stdout.splitlines():
+            if line.startswith("RESULT "):
+                result = json.loads(line[len("RESULT "):])
+        if result is None:
+            raise RuntimeError(f"下载进程异常退出:\n{child.stderr[-2000:]}")
+        stats = _server_json(base_url, "/__stats")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    return {
+        "scenario": scenario,
+        "mode": mode,
+        "threads": threads,
+        "size_mb": size / 1024 / 1024,
+        "mb_per_s": size / 1024 / 1024 / result["elapsed_s"] if result["elapsed_s"] else 0,
+        "elapsed_s": result["elapsed_s"],
+        "tail_s": tail_seconds(stats),
+        "cpu_s": result["cpu_s"],
+        "peak_rss_mb": result["peak_rss_mb"],
+        "ok": result["sha256"] == expected_digest and result["downloaded"] == size,
+        "overhead": stats["bytes_sent"] / size - 1 if size else 0,
+        "requests": stats["requests"],
+        "max_connections": stats["max_connections"],
+        "injected": {
+            "errors": stats["errors_injected"],
+            "resets": stats["resets_injected"],
+            "stalls": stats["stalls_injected"],
+        },
+        "worker_errors": result["errors"],
+    }
+
+
+def print_report(results):
+    print(
+        f"{'场景':<10}{'模式':<8}{'MB/s':>8}{'耗时':>9}{'尾部':>8}{'CPU':>8}{'RSS':>9}"
+        f"{'额外流量':>10}  结果"
+    )
+    for r in results:
+        status = "OK" if r["ok"] else "校验失败"
+        if r["worker_errors"]:
+            status += f" ({r['worker_errors'][0][:40]})"
+        print(
+            f"{r['scenario']:<10}{r['mode']:<8}{r['mb_per_s']:>8.1f}{r['elapsed_s']:>8.1f}s"
+            f"{r['tail_s']:>7.1f}s{r['cpu_s']:>7.1f}s{r['peak_rss_mb']:>7.0f}MB"
+            f"{r['overhead']:>9.1%}  {status}"
+        )
+
+
+def compare(baseline, results, threshold):
+    """打印与基线的吞吐差异，返回是否出现回退"""
+    old = {(r["scenario"], r["mode"]): r for r in baseline}
+    regressed = False
+    print("\n与基线对比:")
+    for r in results:
+        base = old.get((r["scenario"], r["mode"]))
+        if not base or not base["mb_per_s"]:
+            continue
+        change = (r["mb_per_s"] - base["mb_per_s"]) / base["mb_per_s"]
+        flag = ""
+        if change < -threshold:
+            flag = "  <-- 回退"
+            regressed = True
+        print(
+            f"  {r['scenario']:<10}{r['mode']:<8}{base['mb_per_s']:>8.1f} -> {r['mb_per_s']:>8.1f} MB/s"
+            f"  ({change:+.1%})  尾部 {base['tail_s']:.1f}s -> {r['tail_s']:.1f}s{flag}"
+        )
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="下载吞吐基准测试")
+    parser.add_argument("--size", default="64MB", help="测试文件大小")
+    parser.add_argument("--threads", type=int, default=8, help="多线程模式的线程数")
+    parser.add_argument(
+        "--scenario", choices=sorted(SCENARIOS) + ["all"], default="all", help="网络场景"
+    )
+    parser.add_argument("--mode", choices=["single", "multi", "all"], default="all")
+    parser.add_argument("--output", help="将结果保存为 JSON 文件")
+    parser.add_argument("--compare", help="与之前保存的 JSON 结果对比")
+    parser.add_argument("--threshold", type=float, default=0.15, help="吞吐允许的下降比例")
+    parser.add_argument("--child", metavar="URL", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    size = parse_size(args.size)
+    if args.child:
+        print("RESULT " + json.dumps(run_child(args.child, size, args.threads)))
+        return
+
+    scenarios = sorted(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    modes = {"single": 1, "multi": args.threads}
+    if args.mode != "all":
+        modes = {args.mode: modes[args.mode]}
+
+    expected_digest = expected_sha256(size)
+    results = []
+    for scenario in scenarios:
+        for mode, threads in modes.items():
+            results.append(measure(scenario, mode, size, threads, expected_digest))
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到 {args.output}")
+
+    regressed = False
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressed = compare(json.load(f), results, args.threshold)
+
+    if regressed or not all(r["ok"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""
+Hanime1API 页面解析基准测试
+
+用本地 HTTP 服务器提供 benchmarks/fixtures 下保存的页面，对以下解析函数测量耗时、
+内存分配并与 golden 结果比对：
+- search_videos（常规布局 video-item-container 和裏番/泡麵番的 #home-rows-wrapper 布局）
+- get_video_info（视频页，内部还会请求下载页）
+- _extract_video_sources_from_download_page（下载页）
+
+用法：
+    python benchmarks/parser_benchmark.py --iterations 20
+    python benchmarks/parser_benchmark.py --update-golden     # 解析结果有意变化后更新 golden
+    python benchmarks/parser_benchmark.py --output parser.json
+    python benchmarks/parser_benchmark.py --compare parser.json
+
+解析结果与 golden 不一致，或 --compare 时解析耗时变慢超过 --threshold，都会返回非零退出码。
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARK_DIR)
+FIXTURE_DIR = os.path.join(BENCHMARK_DIR, "fixtures")
+GOLDEN_DIR = os.path.join(FIXTURE_DIR, "golden")
+
+sys.path.insert(0, ROOT_DIR)
+
+# 这两种类型的搜索结果页使用 #home-rows-wrapper 布局
+GENRE_LAYOUT = ("裏番", "泡麵番")
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """按请求路径返回对应的页面文件，模拟 hanime1.me"""
+
+    protocol_version = "HTTP/1.1"
+    # 响应头和正文分两次写出，关闭 Nagle 算法避免与延迟确认叠加出约 40ms 的等待
+    disable_nagle_algorithm = True
+
+    def _fixture_name(self):
+        parsed = urlparse(self.path)
+        if parsed.path == "/search":
+            genre = parse_qs(parsed.query).get("genre", [""])[0]
+            return "search_genre.html" if genre in GENRE_LAYOUT else "search_regular.html"
+        if parsed.path == "/watch":
+            return "watch.html"
+        if parsed.path == "/download":
+            return "download.html"
+        return None
+
+    def do_GET(self):
+        name = self._fixture_name()
+        if not name:
+            self.send_error(404)
+            return
+        body = self.server.fixtures[name]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fixture_server():
+    fixtures = {}
+    for name in os.listdir(FIXTURE_DIR):
+        if name.endswith(".html"):
+            with open(os.path.join(FIXTURE_DIR, name), "rb") as f:
+                fixtures[name] = f.read()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    server.fixtures = fixtures
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def build_cases(api):
+    """返回 {用例名: (解析调用, 同一页面的原始请求)}，原始请求用于扣除网络耗时"""
+
+    def search(query, filter_params):
+        def run():
+            api.search_cache.clear()
+            return api.search_videos(query, 1, filter_params)
+
+        return run
+
+    def fetch(path):
+        return lambda: api.session.get(f"{api.base_url}{path}", timeout=10).content
+
+    return {
+        "search_regular": (
+            search("test", {"genre": "", "tags": []}),
+            fetch("/search?query=test&page=1"),
+        ),
+        "search_genre": (
+            search("", {"genre": "裏番", "tags": []}),
+            fetch("/search?query=&page=1&genre=裏番"),
+        ),
+        "video_info": (
+            lambda: api.get_video_info("100111"),
+            # get_video_info 会依次请求视频页和下载页
+            lambda: (fetch("/watch?v=100111")(), fetch("/download?v=100111")()),
+        ),
+        "download_page": (
+            lambda: api._extract_video_sources_from_download_page("100111"),
+            fetch("/download?v=100111"),
+        ),
+    }
+
+
+def normalize(result, base_url):
+    """把本地服务器地址替换为占位符，使结果与端口无关"""
+    text = json.dumps(result, ensure_ascii=False, sort_keys=True)
+    return json.loads(text.replace(base_url, "{base_url}"))
+
+
+def _timed(func, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def measure_case(run, fetch, iterations):
+    # 预热：建立连接、填充繁简转换缓存
+    result = run()
+    fetch()
+
+    total = _timed(run, iterations)
+    network = _timed(fetch, iterations)
+
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    snapshot_blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+    tracemalloc.stop()
+
+    total_median = statistics.median(total)
+    network_median = statistics.median(network)
+    return result, {
+        "total_ms": total_median,
+        "network_ms": network_median,
+        "parse_ms": max(0.0, total_median - network_median),
+        "p95_ms": sorted(total)[int(len(total) * 0.95) - 1] if len(total) > 1 else total[0],
+        "peak_kb": peak / 1024,
+        "retained_blocks": snapshot_blocks,
+    }
+
+
+def check_golden(name, result, update):
+    """返回 (是否一致, 说明)"""
+    golden_file = os.path.join(GOLDEN_DIR, f"{name}.json")
+    if update:
+        os.makedirs(GOLDEN_DIR, exist_ok=True)
+        with open(golden_file, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write("\n")
+        return True, "已更新"
+    if not os.path.exists(golden_file):
+        return False, "缺少 golden 文件，请先运行 --update-golden"
+    with open(golden_file, "r", encoding="utf-8") as f:
+        expected = json.load(f)
+    if result == expected:
+        return True, "一致"
+    return False, _describe_difference(expected, result)
+
+
+def _describe_difference(expected, actual, path="$"):
+    if type(expected) is not type(actual):
+        return f"{path}: 类型 {type(expected).__name__} -> {type(actual).__name__}"
+    if isinstance(expected, dict):
+        for key in sorted(set(expected) | set(actual)):
+            if key not in actual:
+                return f"{path}.{key}: 缺失"
+            if key not in expected:
+                return f"{path}.{key}: 多出"
+            if expected[key] != actual[key]:
+                return _describe_difference(expected[key], actual[key], f"{path}.{key}")
+    if isinstance(expected, list):
+        if len(expected) != len(actual):
+            return f"{path}: 长度 {len(expected)} -> {len(actual)}"
+        for i, (a, b) in enumerate(zip(expected, actual)):
+            if a != b:
+                return _describe_difference(a, b, f"{path}[{i}]")
+    return f"{path}: {expected!r} -> {actual!r}"
+
+
+def run_benchmark(iterations, update_golden):
+    server = start_fixture_server()
+    work_dir = tempfile.TemporaryDirectory()
+    old_cwd = os.getcwd()
+    # Hanime1API 会读取当前目录下的 config/settings.json，切换到临时目录避免读写本地配置
+    os.chdir(work_dir.name)
+    try:
+        from src.api.hanime1_api import Hanime1API
+
+        api = Hanime1API()
+        api.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        results = {}
+        all_match = True
+        for name, (run, fetch) in build_cases(api).items():
+            output, timing = measure_case(run, fetch, iterations)
+            matched, message = check_golden(name, normalize(output, api.base_url), update_golden)
+            all_match = all_match and matched
+            timing["golden"] = message
+            results[name] = timing
+        return results, all_match
+    finally:
+        os.chdir(old_cwd)
+        work_dir.cleanup()
+        server.shutdown()
+
+
+def print_report(results):
+    print(f"{'用例':<16}{'解析':>10}{'总耗时':>10}{'网络':>10}{'p95':>10}{'峰值内存':>12}  golden")
+    for name, timing in results.items():
+        print(
+            f"{name:<16}{timing['parse_ms']:>8.2f}ms{timing['total_ms']:>8.2f}ms"
+            f"{timing['network_ms']:>8.2f}ms{timing['p95_ms']:>8.2f}ms"
+            f"{timing['peak_kb']:>10.0f}KB  {timing['golden']}"
+        )
+
+
+def compare(baseline, results, threshold):
+    """打印与基线的解析耗时差异，返回是否出现回退"""
+    regressed = False
+    print("\n与基线对比（解析耗时中位数）:")
+    for name, timing in results.items():
+        old = baseline.get(name, {}).get("parse_ms")
+        if not old:
+            continue
+        change = (timing["parse_ms"] - old) / old
+        flag = ""
+        if change > threshold:
+            flag = "  <-- 回退"
+            regressed = True
+        print(f"  {name:<16} {old:8.2f} -> {timing['parse_ms']:8.2f} ms  ({change:+.1%}){flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hanime1API 页面解析基准测试")
+    parser.add_argument("--iterations", type=int, default=20, help="每个用例的重复次数")
+    parser.add_argument("--update-golden", action="store_true", help="用当前解析结果更新 golden 文件")
+    parser.add_argument("--output", help="将结果保存为 JSON 文件")
+    parser.add_argument("--compare", help="与之前保存的 JSON 结果对比")
+    parser.add_argument("--threshold", type=float, default=0.2, help="解析耗时允许的变慢比例")
+    args = parser.parse_args()
+
+    results, all_match = run_benchmark(args.iterations, args.update_golden)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到 {args.output}")
+
+    regressed = False
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressed = compare(json.load(f), results, args.threshold)
+
+    if not all_match:
+        print("\n解析结果与 golden 不一致")
+    if regressed or not all_match:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
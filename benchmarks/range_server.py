@@ -0,0 +1,388 @@
+"""
+本地 HTTP Range 测试服务器
+
+提供任意大小的合成文件，用来离线、可重复地测试下载引擎：
+- 支持 HEAD、Range（206 + Content-Range）和 Accept-Ranges
+- 每个连接的带宽限制、首字节延迟、随机卡顿
+- 按概率注入 5xx 错误和连接重置
+- 可以模拟 HEAD 不返回长度 / 不支持 HEAD 的 CDN
+- 链接带 expires=<时间戳> 参数时，过期后返回 403，模拟签名链接过期
+
+文件路径为 /file/<字节数>.mp4，内容由偏移量决定（见 pattern_bytes），
+因此任何 Range 都可以直接生成，下载结果可以用 expected_sha256 校验。
+文件开头是 ftyp、moov 和延伸到文件末尾的 mdat 的 box 头，能通过下载后的 MP4 结构校验。
+
+单独运行：
+    python benchmarks/range_server.py --port 8000 --bandwidth 4MB --latency 50 --error-rate 0.05
+
+/__stats 返回服务器统计信息（JSON），/__reset 清空统计。
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# 内容按该长度循环；长度不是 2 的幂，分片错位拼接时校验一定会失败
+PATTERN_LENGTH = 65521
+PATTERN = hashlib.shake_256(b"hanime1dl-range-server").digest(PATTERN_LENGTH)
+# ftyp + 空 moov + 大小为 0（延伸到文件末尾）的 mdat
+MP4_HEADER = (
+    b"\x00\x00\x00\x18ftypisom\x00\x00\x02\x00isomiso2"
+    b"\x00\x00\x00\x08moov"
+    b"\x00\x00\x00\x00mdat"
+)
+WRITE_BLOCK = 64 * 1024
+FILE_PATH = re.compile(r"^/file/(\d+)(?:\.\w+)?$")
+RANGE_HEADER = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_size(text):
+    """解析 4MB / 512KB / 1048576 这样的大小"""
+    match = re.fullmatch(r"(?i)\s*([\d.]+)\s*([kmg]?)b?\s*", str(text))
+    if not match:
+        raise ValueError(f"无法解析大小: {text}")
+    value = float(match.group(1))
+    return int(value * {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3}[match.group(2).lower()])
+
+
+def pattern_bytes(start, length):
+    """返回文件中 [start, start + length) 的内容"""
+    offset = start % PATTERN_LENGTH
+    out = bytearray()
+    while len(out) < length:
+        take = min(PATTERN_LENGTH - offset, length - len(out))
+        out += PATTERN[offset : offset + take]
+        offset = 0
+    if start < len(MP4_HEADER):
+        header = MP4_HEADER[start : start + length]
+        out[: len(header)] = header
+    return bytes(out)
+
+
+def expected_sha256(size):
+    digest = hashlib.sha256()
+    position = 0
+    while position < size:
+        length = min(1024 * 1024, size - position)
+        digest.update(pattern_bytes(position, length))
+        position += length
+    return digest.hexdigest()
+
+
+class ServerOptions:
+    """故障注入和限速参数"""
+
+    def __init__(
+        self,
+        bandwidth=0,
+        latency=0.0,
+        stall_rate=0.0,
+        stall_seconds=2.0,
+        error_rate=0.0,
+        reset_rate=0.0,
+        head_mode="normal",
+        seed=None,
+    ):
+        self.bandwidth = bandwidth  # 每个连接的带宽（字节/秒），0 为不限速
+        self.latency = latency  # 首字节延迟（秒）
+        self.stall_rate = stall_rate  # 每个响应中途卡顿的概率
+        self.stall_seconds = stall_seconds
+        self.error_rate = error_rate  # 返回 503 的概率
+        self.reset_rate = reset_rate  # 传输中途重置连接的概率
+        # normal: 正常；no-length: HEAD 不返回长度和 Accept-Ranges；reject: HEAD 返回 405
+        self.head_mode = head_mode
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+
+    def chance(self, rate):
+        if rate <= 0:
+            return False
+        with self.random_lock:
+            return self.random.random() < rate
+
+    def uniform(self, low, high):
+        with self.random_lock:
+            return self.random.uniform(low, high)
+
+
+class ServerStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.requests = 0
+            self.head_requests = 0
+            self.range_requests = 0
+            self.bytes_sent = 0
+            self.errors_injected = 0
+            self.resets_injected = 0
+            self.stalls_injected = 0
+            self.expired_rejected = 0
+            self.open_connections = 0
+            self.max_connections = 0
+            self.last_byte_at = 0.0  # 最后一次发送数据的相对时间
+            self.timeline = []  # [(相对时间, 累计字节)]，每 1MB 记录一次
+
+    def add_bytes(self, count):
+        with self.lock:
+            before = self.bytes_sent
+            self.bytes_sent += count
+            self.last_byte_at = time.time() - self.started
+            if before // (1024 * 1024) != self.bytes_sent // (1024 * 1024):
+                self.timeline.append((self.last_byte_at, self.bytes_sent))
+
+    def snapshot(self):
+        with self.lock:
+            data = {key: value for key, value in vars(self).items() if key != "lock"}
+            data["timeline"] = list(self.timeline)
+            return data
+
+
+class RangeRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def options(self):
+        return self.server.options
+
+    @property
+    def stats(self):
+        return self.server.stats
+
+    def _send_json(self, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _file_size(self):
+        match = FILE_PATH.match(urlparse(self.path).path)
+        return int(match.group(1)) if match else None
+
+    def _expired(self):
+        expires = parse_qs(urlparse(self.path).query).get("expires")
+        return bool(expires) and float(expires[0]) < time.time()
+
+    def do_HEAD(self):
+        size = self._file_size()
+        with self.stats.lock:
+            self.stats.requests += 1
+            self.stats.head_requests += 1
+        if size is None:
+            self.send_error(404)
+            return
+        if self._expired():
+            self.send_error(403)
+            return
+        if self.options.head_mode == "reject":
+            self.send_error(405)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "video/mp4")
+        if self.options.head_mode == "no-length":
+            # 部分 CDN 对 HEAD 使用分块编码，不给出长度和 Range 支持
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Content-Length", str(size))
+            self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/__stats":
+            self._send_json(self.stats.snapshot())
+            return
+        if path == "/__reset":
+            self.stats.reset()
+            self._send_json({"ok": True})
+            return
+
+        size = self._file_size()
+        with self.stats.lock:
+            self.stats.requests += 1
+        if size is None:
+            self.send_error(404)
+            return
+        if self._expired():
+            with self.stats.lock:
+                self.stats.expired_rejected += 1
+            self.send_error(403)
+            return
+        if self.options.chance(self.options.error_rate):
+            with self.stats.lock:
+                self.stats.errors_injected += 1
+            self.send_error(503)
+            return
+
+        start, end = 0, size - 1
+        range_header = self.headers.get("Range")
+        if range_header:
+            match = RANGE_HEADER.match(range_header.strip())
+            if not match or (not match.group(1) and not match.group(2)):
+                self.send_error(416)
+                return
+            if match.group(1):
+                start = int(match.group(1))
+                if match.group(2):
+                    end = min(int(match.group(2)), size - 1)
+            else:
+                start = max(0, size - int(match.group(2)))
+            if start >= size or start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            with self.stats.lock:
+                self.stats.range_requests += 1
+
+        if self.options.latency:
+            time.sleep(self.options.latency)
+
+        length = end - start + 1
+        self.send_response(206 if range_header else 200)
+        self.send_header("Content-Type", "video/mp4")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(length))
+        if range_header:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        self._stream(start, length)
+
+    def _stream(self, start, length):
+        reset_at = length * self.options.uniform(0.1, 0.9) if self.options.chance(self.options.reset_rate) else None
+        stall_at = length * self.options.uniform(0.1, 0.9) if self.options.chance(self.options.stall_rate) else None
+
+        with self.stats.lock:
+            self.stats.open_connections += 1
+            self.stats.max_connections = max(self.stats.max_connections, self.stats.open_connections)
+        try:
+            sent = 0
+            began = time.time()
+            while sent < length:
+                if reset_at is not None and sent >= reset_at:
+                    with self.stats.lock:
+                        self.stats.resets_injected += 1
+                    self._reset_connection()
+                    return
+                if stall_at is not None and sent >= stall_at:
+                    with self.stats.lock:
+                        self.stats.stalls_injected += 1
+                    time.sleep(self.options.stall_seconds)
+                    stall_at = None
+
+                block = min(WRITE_BLOCK, length - sent)
+                self.wfile.write(pattern_bytes(start + sent, block))
+                sent += block
+                self.stats.add_bytes(block)
+
+                if self.options.bandwidth:
+                    ahead = sent / self.options.bandwidth - (time.time() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with self.stats.lock:
+                self.stats.open_connections -= 1
+
+    def _reset_connection(self):
+        """发送 RST 关闭连接，模拟中途断开"""
+        try:
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        except OSError:
+            pass
+        self.close_connection = True
+        self.connection.close()
+
+
+class RangeServer:
+    """在后台线程运行的测试服务器"""
+
+    def __init__(self, options=None, host="127.0.0.1", port=0):
+        self.httpd = ThreadingHTTPServer((host, port), RangeRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.options = options or ServerOptions()
+        self.httpd.stats = ServerStats()
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def file_url(self, size, expires=None):
+        url = f"{self.base_url}/file/{size}.mp4"
+        return f"{url}?expires={expires}" if expires is not None else url
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def add_server_arguments(parser):
+    parser.add_argument("--bandwidth", default="0", help="每个连接的带宽，如 4MB（默认不限速）")
+    parser.add_argument("--latency", type=float, default=0.0, help="首字节延迟（毫秒）")
+    parser.add_argument("--stall-rate", type=float, default=0.0, help="响应中途卡顿的概率")
+    parser.add_argument("--stall-seconds", type=float, default=2.0, help="卡顿时长（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 503 的概率")
+    parser.add_argument("--reset-rate", type=float, default=0.0, help="传输中途重置连接的概率")
+    parser.add_argument("--head-mode", choices=["normal", "no-length", "reject"], default="normal")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子")
+
+
+def options_from_arguments(args):
+    return ServerOptions(
+        bandwidth=parse_size(args.bandwidth),
+        latency=args.latency / 1000,
+        stall_rate=args.stall_rate,
+        stall_seconds=args.stall_seconds,
+        error_rate=args.error_rate,
+        reset_rate=args.reset_rate,
+        head_mode=args.head_mode,
+        seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 HTTP Range 测试服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = RangeServer(options_from_arguments(args), args.host, args.port)
+    # 第一行输出地址，供其他脚本读取
+    print(server.base_url, flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
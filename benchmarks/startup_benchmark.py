@@ -0,0 +1,199 @@
+"""
+启动耗时基准测试
+
+在独立进程中多次冷启动程序，记录：
+- 各模块导入耗时（python -X importtime）
+- 从进程启动到主窗口首次绘制完成的时间
+
+用法：
+    python benchmarks/startup_benchmark.py --runs 5 --output startup.json
+    python benchmarks/startup_benchmark.py --compare startup.json
+
+--compare 与之前保存的结果对比，首窗时间变慢超过 --threshold（默认 15%）时返回非零退出码，
+便于在发布前发现启动时间回退。每次运行都在临时工作目录中进行，不会读写本地的 config 目录。
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在子进程中执行：构建主窗口，等第一次绘制完成后输出耗时并退出
+FIRST_WINDOW_SCRIPT = r"""
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+
+from PyQt5.QtCore import QEvent, QObject, QTimer
+from PyQt5.QtWidgets import QApplication
+
+app = QApplication([])
+import_done = time.perf_counter()
+from src.gui.gui import Hanime1GUI
+gui_imported = time.perf_counter()
+
+
+class FirstPaint(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and not hasattr(self, "painted"):
+            self.painted = time.perf_counter()
+            QTimer.singleShot(0, app.quit)
+        return False
+
+
+window = Hanime1GUI()
+constructed = time.perf_counter()
+watcher = FirstPaint()
+window.installEventFilter(watcher)
+window.show()
+QTimer.singleShot(10000, app.quit)
+app.exec_()
+painted = getattr(watcher, "painted", time.perf_counter())
+print("RESULT " + json.dumps({
+    "qt_init_ms": (import_done - start) * 1000,
+    "gui_import_ms": (gui_imported - import_done) * 1000,
+    "construct_ms": (constructed - gui_imported) * 1000,
+    "first_window_ms": (painted - start) * 1000,
+}))
+"""
+
+
+def _environment():
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+
+def measure_imports():
+    """返回 {模块名: {"self_ms", "cumulative_ms"}}，取自 python -X importtime"""
+    code = f"import sys; sys.path.insert(0, {ROOT_DIR!r}); import PyQt5.QtWidgets; import src.gui.gui"
+    with tempfile.TemporaryDirectory() as work_dir:
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=work_dir,
+            env=_environment(),
+            capture_output=True,
+            text=True,
+        )
+    if proc.returncode != 0:
+        raise RuntimeError(f"导入失败:\n{proc.stderr[-2000:]}")
+
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = {
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        }
+    return modules
+
+
+def measure_first_window():
+    with tempfile.TemporaryDirectory() as work_dir:
+        proc = subprocess.run(
+            [sys.executable, "-c", FIRST_WINDOW_SCRIPT, ROOT_DIR],
+            cwd=work_dir,
+            env=_environment(),
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+    for line in proc.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    raise RuntimeError(f"启动失败:\n{proc.stderr[-2000:]}")
+
+
+def run_benchmark(runs):
+    samples = [measure_first_window() for _ in range(runs)]
+    imports = measure_imports()
+    summary = {
+        key: {
+            "median": statistics.median(s[key] for s in samples),
+            "min": min(s[key] for s in samples),
+            "max": max(s[key] for s in samples),
+        }
+        for key in samples[0]
+    }
+    project_modules = {
+        name: timing
+        for name, timing in imports.items()
+        if name.startswith("src.") or name.split(".")[0] in ("requests", "bs4", "zhconv", "PyQt5")
+    }
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "runs": runs,
+        "startup": summary,
+        "imports": project_modules,
+    }
+
+
+def print_report(result, top=15):
+    print(f"运行次数: {result['runs']}  Python {result['python']}")
+    for key, stats in result["startup"].items():
+        print(f"  {key:<16} 中位数 {stats['median']:8.1f} ms  (最小 {stats['min']:.1f}, 最大 {stats['max']:.1f})")
+    print("\n导入耗时最高的模块（累计）:")
+    ranked = sorted(result["imports"].items(), key=lambda kv: kv[1]["cumulative_ms"], reverse=True)
+    for name, timing in ranked[:top]:
+        print(f"  {name:<32} {timing['cumulative_ms']:8.1f} ms  (自身 {timing['self_ms']:.1f})")
+
+
+def compare(baseline, result, threshold):
+    """打印与基线的差异，返回是否出现回退"""
+    regressed = False
+    print("\n与基线对比（中位数）:")
+    for key, stats in result["startup"].items():
+        old = baseline.get("startup", {}).get(key, {}).get("median")
+        if not old:
+            continue
+        change = (stats["median"] - old) / old
+        flag = ""
+        if key == "first_window_ms" and change > threshold:
+            flag = "  <-- 回退"
+            regressed = True
+        print(f"  {key:<16} {old:8.1f} -> {stats['median']:8.1f} ms  ({change:+.1%}){flag}")
+
+    old_imports = baseline.get("imports", {})
+    for name, timing in result["imports"].items():
+        if name.startswith("src.") and name.count(".") == 2:
+            old = old_imports.get(name, {}).get("cumulative_ms")
+            if old is not None:
+                print(f"  {name:<32} {old:8.1f} -> {timing['cumulative_ms']:8.1f} ms")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hanime1DL 启动耗时基准测试")
+    parser.add_argument("--runs", type=int, default=5, help="冷启动次数")
+    parser.add_argument("--output", help="将结果保存为 JSON 文件")
+    parser.add_argument("--compare", help="与之前保存的 JSON 结果对比")
+    parser.add_argument("--threshold", type=float, default=0.15, help="首窗时间允许的变慢比例")
+    args = parser.parse_args()
+
+    result = run_benchmark(args.runs)
+    print_report(result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到 {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(baseline, result, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+"""
+Hanime1DL 命令行入口，不需要图形界面
+"""
+
+import sys
+
+from src.cli.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,10 @@
+"""
+Hanime1DL 下载守护进程入口
+"""
+
+import sys
+
+from src.daemon.daemon import main
+
+if __name__ == "__main__":
+    sys.exit(main())
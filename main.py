@@ -2,16 +2,20 @@
 Hanime1DL 主入口文件
 """
 
+import json
+import logging
 import multiprocessing
 import os
 import sys
+import time
 
 from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import QApplication, QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton
 import requests
-import json
 
 from src.gui.gui import Hanime1GUI
+from src.utils.settings_store import get_settings_store
+from src.workers.workers import AnnouncementWorker
 
 
 class DeclarationDialog(QDialog):
@@ -100,22 +104,55 @@ class AnnouncementDialog(QDialog):
         main_layout.addLayout(button_layout)
 
 
+ANNOUNCEMENT_URL = "https://gitee.com/yxxawa/gg/raw/master/GG.txt"
+ANNOUNCEMENT_CACHE_TTL = 6 * 3600  # 公告缓存有效期（秒）
+
+
+def _announcement_cache_file():
+    return os.path.join(os.getcwd(), "config", "announcement_cache.json")
+
+
+def _load_cached_content():
+    """读取缓存的公告，返回 (lines, timestamp)，不存在时返回 (None, 0)"""
+    try:
+        with open(_announcement_cache_file(), "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        return cache.get("lines", []), cache.get("timestamp", 0)
+    except Exception:
+        return None, 0
+
+
+def _save_cached_content(lines):
+    cache_file = _announcement_cache_file()
+    try:
+        tmp_file = f"{cache_file}.tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump({"lines": lines, "timestamp": time.time()}, f, ensure_ascii=False)
+        os.replace(tmp_file, cache_file)
+    except Exception as e:
+        logging.warning(f"Failed to save announcement cache: {e}")
+
+
 def _get_remote_content():
-    """从远程获取内容"""
-    url = "https://gitee.com/yxxawa/gg/raw/master/GG.txt"
+    """获取公告内容，缓存未过期时不发起网络请求，网络失败时退回到过期的缓存"""
+    cached_lines, timestamp = _load_cached_content()
+    if cached_lines is not None and time.time() - timestamp < ANNOUNCEMENT_CACHE_TTL:
+        return cached_lines
     try:
-        response = requests.get(url, timeout=10)
+        response = requests.get(ANNOUNCEMENT_URL, timeout=10)
         response.raise_for_status()
         content = response.text
         lines = content.strip().split('\n')
+        _save_cached_content(lines)
         return lines
     except Exception as e:
-        return []
+        logging.warning(f"Failed to fetch announcement: {e}")
+        return cached_lines or []
 
 
-def get_remote_announcement():
-    """从远程获取公告内容"""
-    lines = _get_remote_content()
+def parse_announcement(lines):
+    """解析公告内容，返回 (程序标题, 公告标题, 公告内容)"""
+    program_title = ""
     title = "公告"
     announcement_content = ""
     
@@ -125,6 +162,7 @@ def get_remote_announcement():
         if '-' in first_line:
             parts = first_line.split('-', 1)
             title = parts[0].strip()
+            program_title = title
             announcement_content = parts[1].strip()
             # 剩余行作为公告内容
             if len(lines) > 1:
@@ -134,35 +172,30 @@ def get_remote_announcement():
     else:
         announcement_content = "无法获取远程公告"
     
-    return title, announcement_content
+    return program_title, title, announcement_content
 
 
-def get_program_title():
-    """从远程获取程序标题"""
-    lines = _get_remote_content()
-    if lines:
-        first_line = lines[0]
-        if '-' in first_line:
-            parts = first_line.split('-', 1)
-            return parts[0].strip()
-    return ""
+def _apply_announcement(window, show_announcements, announcement):
+    """公告获取完成后设置窗口标题并弹出公告"""
+    program_title, title, content = announcement
+    if program_title:
+        window.setWindowTitle(f"{program_title}")
+    if show_announcements:
+        announcement_dialog = AnnouncementDialog(content, title, window)
+        announcement_dialog.exec_()
 
 
 def _launch_application(app, show_announcements):
     """启动应用程序"""
-    # 获取远程公告并显示
-    if show_announcements:
-        title, content = get_remote_announcement()
-        announcement_dialog = AnnouncementDialog(content, title)
-        announcement_dialog.exec_()
-    
-    # 启动应用
+    # 先显示主窗口，公告在后台获取，完成后再应用标题和弹窗
     window = Hanime1GUI()
-    # 设置窗口标题
-    program_title = get_program_title()
-    if program_title:
-        window.setWindowTitle(f"{program_title}")
     window.show()
+
+    worker = AnnouncementWorker(lambda: parse_announcement(_get_remote_content()))
+    worker.signals.result.connect(
+        lambda announcement: _apply_announcement(window, show_announcements, announcement)
+    )
+    window.api_pool.start(worker)
     sys.exit(app.exec_())
 
 
@@ -180,12 +213,7 @@ def main():
     
     # 如果settings.json文件存在，加载设置
     if os.path.exists(settings_file):
-        try:
-            with open(settings_file, "r", encoding="utf-8") as f:
-                settings = json.load(f)
-                show_announcements = settings.get("show_announcements", True)
-        except Exception as e:
-            pass
+        show_announcements = get_settings_store().get("show_announcements", True)
     
     if not os.path.exists(settings_file):
         # 显示声明弹窗
@@ -13,8 +13,9 @@ import time
 from urllib.parse import urljoin
 
 import requests
-from bs4 import BeautifulSoup
-from zhconv import convert
+
+from src.utils.settings_store import get_settings_store
+from src.utils.zh_convert import to_simplified, to_simplified_many
 
 
 # 处理 PyInstaller 打包后的环境路径问题
@@ -65,8 +66,10 @@ class Hanime1API:
     REGEX_TITLE_CLEAN = re.compile(r"\s*[-–]\s*(H動漫|裏番|線上看)[:_\s]*.*$")
     REGEX_TITLE_CLASS = re.compile(r".*title.*|.*name.*")
 
-    def __init__(self):
+    def __init__(self, settings_store=None):
         self.base_url = "https://hanime1.me"
+        # 保存会话信息的设置存储，默认为 config/settings.json
+        self.settings_store = settings_store or get_settings_store()
         # 内置默认请求头
         self.default_headers = {
             "User-Agent": (
@@ -113,12 +116,8 @@ class Hanime1API:
         self.cache_ttl = 300  # 缓存有效期 5 分钟
 
     def _convert_to_simplified(self, text):
-        """将繁体中文转换为简体中文"""
-        try:
-            return convert(text, "zh-cn")
-        except Exception as e:
-            logging.warning(f"繁简转换失败: {e}")
-            return text
+        """将繁体中文转换为简体中文（结果由共享的转换器缓存）"""
+        return to_simplified(text)
 
     def _get_cache_key(self, query, page, filter_params):
         """生成缓存键"""
@@ -127,20 +126,8 @@ class Hanime1API:
         return (query, page, filter_str)
 
     def save_session(self):
-        """保存session信息和请求头到config/settings.json文件"""
+        """保存session信息和请求头到设置存储（默认为config/settings.json，合并写入）"""
         try:
-            # 确保config目录存在
-            config_dir = os.path.join(os.getcwd(), "config")
-            if not os.path.exists(config_dir):
-                os.makedirs(config_dir)
-            
-            # 使用config目录中的settings.json文件
-            settings_file = os.path.join(config_dir, "settings.json")
-            settings = {}
-            if os.path.exists(settings_file):
-                with open(settings_file, "r", encoding="utf-8") as f:
-                    settings = json.load(f)
-
             cookie_dict = {}
             for cookie in self.session.cookies:
                 cookie_dict[cookie.name] = {
@@ -152,30 +139,22 @@ class Hanime1API:
                     "httponly": getattr(cookie, "httponly", False),
                 }
 
-            settings["headers"] = self.headers
-            settings["session"] = {"cookies": cookie_dict, "timestamp": time.time()}
-
-            with open(settings_file, "w", encoding="utf-8") as f:
-                json.dump(settings, f, ensure_ascii=False, indent=2)
+            self.settings_store.update(
+                {
+                    "headers": self.headers,
+                    "session": {"cookies": cookie_dict, "timestamp": time.time()},
+                }
+            )
         except Exception as e:
             logging.warning(f"Failed to save session: {e}")
 
     def load_session(self):
-        """从config/settings.json加载session信息和请求头"""
+        """从设置存储加载session信息和请求头"""
         try:
-            # 确保config目录存在
-            config_dir = os.path.join(os.getcwd(), "config")
-            if not os.path.exists(config_dir):
-                os.makedirs(config_dir)
-            
-            # 使用config目录中的settings.json文件
-            settings_file = os.path.join(config_dir, "settings.json")
-            if not os.path.exists(settings_file):
+            settings = self.settings_store.snapshot()
+            if not settings:
                 return
 
-            with open(settings_file, "r", encoding="utf-8") as f:
-                settings = json.load(f)
-
             # 加载请求头
             self.headers = settings.get("headers", {})
 
@@ -206,13 +185,6 @@ class Hanime1API:
                         continue
         except Exception as e:
             logging.warning(f"Failed to load session: {e}")
-            # 如果加载失败，尝试清理旧的settings.json文件
-            try:
-                config_dir = os.path.join(os.getcwd(), "config")
-                settings_file = os.path.join(config_dir, "settings.json")
-                os.rename(settings_file, os.path.join(config_dir, "settings.json.backup"))
-            except Exception as e:
-                logging.warning(f"Failed to backup settings.json: {e}")
 
     def set_cf_clearance(self, cf_clearance_value):
         """手动设置cf_clearance cookie，这是Cloudflare反爬虫保护的关键
@@ -236,17 +208,18 @@ class Hanime1API:
             # 保存session，以便下次使用
             self.save_session()
 
-    def search_videos(self, query, page=1, filter_params=None):
+    def search_videos(self, query, page=1, filter_params=None, use_cache=True):
         """搜索视频
 
         参数:
             query: 搜索关键词
             page: 页码
             filter_params: 筛选参数
+            use_cache: 为 False 时忽略缓存，总是重新请求（结果仍会写入缓存）
         """
         # 检查缓存
         cache_key = self._get_cache_key(query, page, filter_params)
-        if cache_key in self.search_cache:
+        if use_cache and cache_key in self.search_cache:
             timestamp, cached_result = self.search_cache[cache_key]
             if time.time() - timestamp < self.cache_ttl:
                 return cached_result
@@ -326,6 +299,8 @@ class Hanime1API:
             if any(pattern in html_content for pattern in cloudflare_patterns):
                 raise Exception("Cloudflare 验证拦截")
 
+            from bs4 import BeautifulSoup
+
             soup = BeautifulSoup(html_content, "html.parser")
 
             # 搜索结果解析
@@ -364,7 +339,7 @@ class Hanime1API:
                     title_element = card.find("div", class_="home-rows-videos-title")
                     if not title_element:
                         continue
-                    title = self._convert_to_simplified(title_element.text.strip())
+                    title = title_element.text.strip()
 
                     # 提取封面URL
                     img = card.find("img")
@@ -424,7 +399,7 @@ class Hanime1API:
                         )
                     if not title_element:
                         continue
-                    title = self._convert_to_simplified(title_element.text.strip())
+                    title = title_element.text.strip()
 
                     # 提取封面URL
                     img = card.find("img")
@@ -440,8 +415,10 @@ class Hanime1API:
                         "thumbnail": cover_url,
                     }
 
-            # 将去重后的视频添加到结果列表
+            # 将去重后的视频添加到结果列表，标题统一批量转换为简体
             videos = list(video_dict.values())
+            for video, title in zip(videos, to_simplified_many([v["title"] for v in videos])):
+                video["title"] = title
 
             # 解析总页数
             def extract_page_numbers():
@@ -562,6 +539,8 @@ class Hanime1API:
                 return []
 
             html_content = response.text
+            from bs4 import BeautifulSoup
+
             soup = BeautifulSoup(html_content, "html.parser")
 
             video_sources = []
@@ -797,6 +776,32 @@ class Hanime1API:
             print(f"从下载页面提取视频源出错 (ID: {video_id}): {str(e)}")
             return []
 
+    def refresh_video_source(self, video_id, quality_num=0):
+        """重新获取视频源链接，用于签名链接在下载途中过期的情况
+
+        参数:
+            video_id: 视频ID
+            quality_num: 原链接的画质，优先返回相同画质的链接，找不到时返回最高画质
+
+        返回:
+            新的视频链接，获取失败时返回 None
+        """
+        # 只需要视频源，其余字段都不解析
+        visibility_settings = {
+            key: False
+            for key in (
+                "title", "upload_date", "likes", "duration", "views",
+                "tags", "cover", "description", "related_videos",
+            )
+        }
+        video_info = self.get_video_info(video_id, visibility_settings)
+        if not video_info or not video_info["video_sources"]:
+            return None
+        for source in video_info["video_sources"]:
+            if quality_num and source.get("quality_num") == quality_num:
+                return source["url"]
+        return video_info["video_sources"][0]["url"]
+
     def get_video_info(self, video_id, visibility_settings=None):
         """获取视频详细信息
 
@@ -828,6 +833,8 @@ class Hanime1API:
                     return None
 
                 html_content = response.text
+                from bs4 import BeautifulSoup
+
                 soup = BeautifulSoup(html_content, "html.parser")
 
                 video_info = {
@@ -983,8 +990,8 @@ class Hanime1API:
                         for link in tag_links:
                             tag_text = link.get_text(strip=True)
                             if tag_text and tag_text != "#" and "http" not in tag_text:
-                                tags.append(self._convert_to_simplified(tag_text))
-                        video_info["tags"] = tags
+                                tags.append(tag_text)
+                        video_info["tags"] = to_simplified_many(tags)
 
                 # 解析描述
                 if visibility_settings.get("description", True):
@@ -1019,7 +1026,6 @@ class Hanime1API:
                         title = (
                             title_elem.get_text(strip=True) if title_elem else item.get("title", "")
                         )
-                        title = self._convert_to_simplified(title)
 
                         # 获取缩略图
                         img_tag = item.find("img")
@@ -1038,6 +1044,8 @@ class Hanime1API:
                                 "duration": duration,
                             }
                         )
+                    for item, title in zip(series, to_simplified_many([v["title"] for v in series])):
+                        item["title"] = title
                     video_info["series"] = series
 
                 return video_info
@@ -0,0 +1,278 @@
+"""
+Hanime1DL 命令行批量下载
+
+不依赖 Qt，通过 Hanime1API 解析视频源，用 src.core.downloader 中的下载引擎下载。
+进度以 JSON Lines 写到标准输出（每行一个事件），日志写到标准错误，适合在无显示环境的服务器上批量下载。
+
+用法:
+    python cli.py 123456 https://hanime1.me/watch?v=234567
+    python cli.py --search 关键词 --genre 裏番 --tag 巨乳 --pages 2
+    python cli.py --favorites favorites.json --folder 默认收藏夹
+    python cli.py 123456 --dry-run
+
+事件类型: resolved / skipped / progress / completed / error / summary
+未指定的参数使用 config/settings.json 中的设置（下载目录、线程数、画质、命名规则、同时下载数）。
+"""
+
+import argparse
+import concurrent.futures
+import functools
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+
+from src.core.pipeline import crawl_search, resolve_source
+
+DEFAULT_SETTINGS = {
+    "download_mode": "multi_thread",
+    "num_threads": 4,
+    "max_simultaneous_downloads": 2,
+    "download_quality": "最高",
+    "download_path": os.path.join(os.getcwd(), "hanimeDownload"),
+    "file_naming_rule": "{title}",
+    "overwrite_existing": False,
+}
+TEMP_DOWNLOAD_DIR = os.path.join(os.getcwd(), ".HDDownload")  # 与界面共用，可以继续界面中未完成的下载
+REGEX_VIDEO_ID = re.compile(r"[?&]v=(\d+)")
+
+
+class EventWriter:
+    """把事件以 JSON Lines 写到标准输出，多个下载线程共用"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.lock = threading.Lock()
+
+    def write(self, event, **fields):
+        line = json.dumps({"event": event, "time": round(time.time(), 3), **fields}, ensure_ascii=False)
+        with self.lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+def parse_video_id(text):
+    """从视频 ID 或观看页链接中取出视频 ID，无法识别时返回 None"""
+    text = text.strip()
+    if text.isdigit():
+        return text
+    match = REGEX_VIDEO_ID.search(text)
+    return match.group(1) if match else None
+
+
+def build_filename(title, video_id, naming_rule):
+    """按命名规则生成文件名，与界面中的规则一致"""
+    safe_title = re.sub(r'[\\/:*?"<>|]', "_", title[:100]).strip(" _") or f"video_{video_id}"
+    try:
+        filename_core = naming_rule.format(title=safe_title, video_id=video_id)
+    except Exception as e:
+        logging.warning(f"Failed to format filename: {e}")
+        filename_core = safe_title
+    return f"{filename_core}.mp4"
+
+
+def collect_targets(args, api, events):
+    """汇总命令行中的视频，返回 (去重后的 [(video_id, 列表中的标题或 None)], 无法识别的数量)"""
+    targets = []
+    invalid = 0
+    for text in args.targets:
+        video_id = parse_video_id(text)
+        if video_id:
+            targets.append((video_id, None))
+        else:
+            invalid += 1
+            events.write("error", target=text, error="无法识别的视频 ID 或链接")
+
+    if args.search is not None:
+        filter_params = {
+            "genre": args.genre,
+            "sort": args.sort,
+            "date": args.date,
+            "duration": args.duration,
+            "tags": args.tag,
+            "broad": args.broad,
+        }
+        try:
+            targets.extend(
+                (video["video_id"], video.get("title"))
+                for video in crawl_search(api, args.search, filter_params, args.pages)
+            )
+        except Exception as e:
+            invalid += 1
+            events.write("error", search=args.search, error=str(e))
+
+    if args.favorites:
+        try:
+            with open(args.favorites, "r", encoding="utf-8") as f:
+                favorites = json.load(f)
+            # 收藏夹格式: {文件夹名: [{"video_id": ..., "title": ...}]}
+            if not isinstance(favorites, dict) or not all(
+                isinstance(videos, list)
+                and all(isinstance(video, dict) and video.get("video_id") for video in videos)
+                for videos in favorites.values()
+            ):
+                raise ValueError("收藏夹文件格式不正确")
+        except (OSError, ValueError) as e:
+            invalid += 1
+            events.write("error", favorites=args.favorites, error=str(e))
+            favorites = {}
+        for folder, videos in favorites.items():
+            if args.folder and folder not in args.folder:
+                continue
+            targets.extend((str(video["video_id"]), video.get("title")) for video in videos)
+
+    seen = set()
+    unique = []
+    for video_id, title in targets:
+        if video_id not in seen:
+            seen.add(video_id)
+            unique.append((video_id, title))
+    return unique, invalid
+
+
+def download(api, task, options, events):
+    """下载单个视频并移动到下载目录，返回是否成功"""
+    from src.core.downloader import DownloadEngine
+
+    video_id = task["video_id"]
+    filename = build_filename(task["title"], video_id, options["file_naming_rule"])
+    final_file = os.path.join(options["download_path"], filename)
+    if os.path.exists(final_file) and not options["overwrite_existing"]:
+        events.write("skipped", video_id=video_id, path=final_file, reason="文件已存在")
+        return True
+
+    def on_progress(info):
+        events.write(
+            "progress",
+            video_id=video_id,
+            progress=round(info["progress"], 2),
+            size=info["size"],
+            total_size=info["total_size"],
+            speed=round(info.get("speed", 0)),
+        )
+
+    engine = DownloadEngine(
+        task["url"],
+        filename,
+        TEMP_DOWNLOAD_DIR,
+        options["num_threads"] if options["download_mode"] == "multi_thread" else 1,
+        api.session.headers,
+        api.session.cookies.get_dict(),
+        url_refresher=functools.partial(api.refresh_video_source, video_id, task["quality_num"]),
+        progress_callback=on_progress,
+    )
+    temp_file = engine.download()
+
+    os.makedirs(options["download_path"], exist_ok=True)
+    shutil.move(temp_file, final_file)
+    events.write(
+        "completed",
+        video_id=video_id,
+        title=task["title"],
+        path=final_file,
+        size=os.path.getsize(final_file),
+    )
+    return True
+
+
+def process(api, video_id, title, options, events, dry_run):
+    try:
+        task = resolve_source(api, video_id, title, options["download_quality"])
+    except Exception as e:
+        events.write("error", video_id=video_id, error=str(e))
+        return False
+    events.write("resolved", **task)
+    if dry_run:
+        return True
+    try:
+        return download(api, task, options, events)
+    except Exception as e:
+        events.write("error", video_id=video_id, title=task["title"], error=str(e))
+        return False
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Hanime1DL 命令行批量下载")
+    parser.add_argument("targets", nargs="*", help="视频 ID 或观看页链接")
+
+    search = parser.add_argument_group("搜索")
+    search.add_argument("--search", metavar="QUERY", help="下载搜索结果（可以为空字符串，只按筛选条件搜索）")
+    search.add_argument("--genre", default="", help="类型，如 裏番")
+    search.add_argument("--sort", default="", help="排序方式")
+    search.add_argument("--date", default="", help="发布时间")
+    search.add_argument("--duration", default="", help="时长")
+    search.add_argument("--tag", action="append", default=[], help="标签，可重复指定")
+    search.add_argument("--broad", action="store_true", help="广泛配对标签")
+    search.add_argument("--pages", type=int, default=1, help="下载前几页搜索结果")
+
+    favorites = parser.add_argument_group("收藏夹")
+    favorites.add_argument("--favorites", metavar="FILE", help="界面导出的收藏夹 JSON 文件")
+    favorites.add_argument("--folder", action="append", help="只下载指定的收藏夹，可重复指定")
+
+    download_group = parser.add_argument_group("下载")
+    download_group.add_argument("-o", "--output", help="下载目录")
+    download_group.add_argument("--threads", type=int, help="每个视频的下载线程数")
+    download_group.add_argument("-j", "--jobs", type=int, help="同时下载的视频数")
+    download_group.add_argument("--quality", choices=["最高", "最低"], help="画质")
+    download_group.add_argument("--naming-rule", help="文件命名规则，可用 {title} 和 {video_id}")
+    download_group.add_argument("--overwrite", action="store_true", help="覆盖已存在的文件")
+    download_group.add_argument("--dry-run", action="store_true", help="只解析视频源，不下载")
+    download_group.add_argument("--base-url", help=argparse.SUPPRESS)
+    return parser
+
+
+def load_options(args):
+    """命令行参数覆盖 config/settings.json 中的设置"""
+    from src.utils.settings_store import get_settings_store
+
+    store = get_settings_store()
+    options = {key: store.get(key, default) for key, default in DEFAULT_SETTINGS.items()}
+    overrides = {
+        "download_path": args.output,
+        "num_threads": args.threads,
+        "max_simultaneous_downloads": args.jobs,
+        "download_quality": args.quality,
+        "file_naming_rule": args.naming_rule,
+    }
+    options.update({key: value for key, value in overrides.items() if value is not None})
+    if args.threads is not None:
+        options["download_mode"] = "multi_thread"
+    if args.overwrite:
+        options["overwrite_existing"] = True
+    options["file_naming_rule"] = options["file_naming_rule"] or "{title}"
+    options["download_path"] = os.path.abspath(options["download_path"])
+    return options
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not (args.targets or args.search is not None or args.favorites):
+        build_parser().error("请指定视频 ID、链接、--search 或 --favorites")
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format="%(levelname)s %(message)s")
+    events = EventWriter()
+
+    from src.api.hanime1_api import Hanime1API
+
+    options = load_options(args)
+    api = Hanime1API()
+    if args.base_url:
+        api.base_url = args.base_url.rstrip("/")
+
+    targets, invalid = collect_targets(args, api, events)
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(1, options["max_simultaneous_downloads"])
+    ) as executor:
+        futures = [
+            executor.submit(process, api, video_id, title, options, events, args.dry_run)
+            for video_id, title in targets
+        ]
+        results = [future.result() for future in futures]
+
+    failed = results.count(False) + invalid
+    events.write("summary", total=len(results) + invalid, succeeded=results.count(True), failed=failed)
+    return 1 if failed else 0
@@ -0,0 +1,45 @@
+"""
+共享带宽限制
+
+令牌桶实现，多个下载任务（以及任务中的多个分片线程）共用同一个实例即共享同一份带宽。
+"""
+
+import threading
+import time
+
+
+class BandwidthLimiter:
+    """令牌桶限速器
+
+    - rate: 每秒允许的字节数，0 为不限速
+    - 令牌最多积累 1 秒；一次消耗超过剩余令牌时记为欠额，调用方等待到欠额还清
+    """
+
+    def __init__(self, rate=0):
+        self._lock = threading.Lock()
+        self.rate = rate
+        self._tokens = float(rate)
+        self._updated = time.monotonic()
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill_locked()
+            self.rate = rate
+            self._tokens = min(self._tokens, float(rate))
+
+    def _refill_locked(self):
+        now = time.monotonic()
+        if self.rate > 0:
+            self._tokens = min(float(self.rate), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def consume(self, size):
+        """消耗 size 字节的令牌，必要时阻塞当前线程"""
+        with self._lock:
+            if self.rate <= 0 or size <= 0:
+                return
+            self._refill_locked()
+            self._tokens -= size
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
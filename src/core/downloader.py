@@ -0,0 +1,609 @@
+"""
+Hanime1DL 下载引擎
+
+不依赖 Qt，可以在命令行、基准测试和进程池中直接使用；界面通过 src.workers.workers.DownloadWorker 适配。
+"""
+
+import concurrent.futures
+import glob
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+from src.utils.download_verify import VerificationError, parse_server_digests, verify_file
+
+
+class DownloadCancelled(Exception):
+    """下载被 cancel() 取消，已下载的分片保留，之后可以继续下载"""
+
+
+class DownloadEngine:
+    """下载引擎，支持多线程和断点续传
+
+    不依赖 Qt，进度通过 progress_callback 回调报告（在下载线程中调用）。
+    download() 在当前线程中完成下载，失败时抛出异常。
+    """
+
+    # 常量定义
+    USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+    CHUNK_SIZE = 1048576  # 下载块大小1MB，减少I/O操作次数和锁竞争
+    MIN_CHUNK_SIZE = 5 * 1024 * 1024  # 最小块大小(5MB)，小于此值使用单线程
+    FILE_INFO_TTL = 600  # 文件信息缓存有效期（秒），签名链接通常很快过期，不宜过长
+    CONTENT_RANGE = re.compile(r"bytes\s+\d+-\d+/(\d+|\*)")
+    EXPIRED_STATUS_CODES = (403, 410)  # 签名链接过期时 CDN 返回的状态码
+    MAX_URL_REFRESHES = 3
+    MAX_VERIFY_ROUNDS = 2  # 校验失败后重新下载可疑片段的最大次数
+
+    # 所有下载任务共享：按 URL 缓存文件信息，继续下载时不再重复探测；
+    # 记录 HEAD 不可靠（被拒绝或不返回长度/Range 支持）的主机，之后直接使用 Range 探测
+    _file_info_cache = {}
+    _head_unreliable_hosts = set()
+    _probe_lock = threading.Lock()
+
+    def __init__(
+        self,
+        url,
+        filename,
+        save_path=".",
+        num_threads=4,
+        headers=None,
+        cookies=None,
+        url_refresher=None,
+        progress_callback=None,
+        session=None,
+        bandwidth_limiter=None,
+    ):
+        self.url = url
+        # 签名链接过期（403/410）时调用，返回同一画质的新链接
+        self.url_refresher = url_refresher
+        self.url_lock = threading.Lock()
+        self.url_refresh_count = 0
+        self.server_digests = {}  # 服务器提供的整个文件的摘要，用于下载后校验
+        self.filename = filename
+        self.save_path = save_path
+        self.num_threads = num_threads
+        self.headers = headers or {"User-Agent": self.USER_AGENT}
+        self.cookies = cookies or {}
+        self.progress_callback = progress_callback
+        self.is_paused = False
+        self.progress_lock = None
+        self.pause_event = threading.Event()
+        self.pause_event.set()  # 默认不暂停
+        self.cancelled = False
+        # 多个任务共享的 BandwidthLimiter，为 None 时不限速
+        self.bandwidth_limiter = bandwidth_limiter
+
+        # 传入 session 时共享其连接池，请求头和 Cookie 由调用方设置
+        if session is not None:
+            self.session = session
+        else:
+            self.session = self._create_session()
+
+        # 进度更新节流机制
+        self.last_progress_update = 0
+        self.last_progress_value = 0
+        self.progress_update_interval = 0.2
+        self.progress_update_threshold = 2.0
+
+        # 下载速度计算
+        self.start_time = time.time()
+        self.last_speed_update = 0
+        self.last_downloaded_size = 0
+        self.current_speed = 0
+
+    def _create_session(self):
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=self.num_threads + 2, pool_maxsize=self.num_threads + 2, max_retries=0
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update(self.headers)
+        if self.cookies:
+            session.cookies.update(self.cookies)
+        return session
+
+    def download(self):
+        """下载并校验文件，返回文件路径；校验通过后发送一次 100% 进度"""
+        os.makedirs(self.save_path, exist_ok=True)
+        self.full_path = os.path.join(self.save_path, self.filename)
+
+        file_total_size, supports_range_requests = self._with_url_refresh(self._get_file_info)
+        self.progress_lock = threading.Lock()
+
+        if supports_range_requests and file_total_size > 0:
+            self._download_with_multithreading(file_total_size)
+        else:
+            self._with_url_refresh(self._download_with_singlethread, file_total_size)
+            self._verify_singlethread(file_total_size)
+
+        self._emit_completed(file_total_size)
+        return self.full_path
+
+    def _is_expired_error(self, error):
+        response = getattr(error, "response", None)
+        return response is not None and response.status_code in self.EXPIRED_STATUS_CODES
+
+    def _refresh_url(self, failed_url):
+        """链接过期时获取新链接；多个分片同时失败时只刷新一次，返回是否可以重试"""
+        with self.url_lock:
+            if self.url != failed_url:
+                return True
+            if not self.url_refresher or self.url_refresh_count >= self.MAX_URL_REFRESHES:
+                return False
+            self.url_refresh_count += 1
+            try:
+                new_url = self.url_refresher()
+            except Exception as e:
+                logging.warning(f"刷新下载链接失败: {e}")
+                return False
+            if not new_url or new_url == failed_url:
+                return False
+            logging.info(f"下载链接已过期，已获取新链接: {self.filename}")
+            self.url = new_url
+            return True
+
+    def _with_url_refresh(self, func, *args):
+        """执行请求，链接过期时刷新链接后重试"""
+        while True:
+            url = self.url
+            try:
+                return func(*args)
+            except requests.HTTPError as e:
+                if not (self._is_expired_error(e) and self._refresh_url(url)):
+                    raise
+
+    def _get_file_info(self):
+        """获取文件大小和是否支持 Range 请求
+
+        先用 HEAD 请求；HEAD 被拒绝、不返回长度或不声明 Range 支持时，
+        改用 GET Range: bytes=0-0 从 Content-Range 中读取总大小。
+        """
+        with self._probe_lock:
+            cached = self._file_info_cache.get(self.url)
+        if cached and time.time() - cached[3] < self.FILE_INFO_TTL:
+            self.server_digests = cached[2]
+            return cached[0], cached[1]
+
+        host = urlparse(self.url).netloc
+        with self._probe_lock:
+            head_unreliable = host in self._head_unreliable_hosts
+
+        file_info = None if head_unreliable else self._probe_with_head()
+        if file_info is None or not file_info[1]:
+            range_info = self._probe_with_range()
+            # HEAD 被拒绝，或声明不支持 Range 但实际支持
+            if (file_info is None or range_info[1]) and not head_unreliable:
+                logging.info(f"HEAD 响应不可靠，之后对 {host} 使用 Range 探测")
+                with self._probe_lock:
+                    self._head_unreliable_hosts.add(host)
+            if file_info is None or range_info[1] or not file_info[0]:
+                file_info = range_info
+
+        file_total_size, supports_range_requests, self.server_digests = file_info
+        with self._probe_lock:
+            self._file_info_cache[self.url] = (
+                file_total_size,
+                supports_range_requests,
+                self.server_digests,
+                time.time(),
+            )
+        return file_total_size, supports_range_requests
+
+    def _probe_with_head(self):
+        """HEAD 探测，请求被拒绝时返回 None"""
+        try:
+            response = self.session.head(self.url, timeout=10, allow_redirects=True)
+        except requests.RequestException as e:
+            logging.warning(f"HEAD 请求失败: {e}")
+            return None
+        if response.status_code >= 400:
+            return None
+
+        content_length = response.headers.get("content-length")
+        file_total_size = int(content_length) if content_length else 0
+
+        accept_ranges = response.headers.get("accept-ranges", "none")
+        supports_range_requests = accept_ranges.lower() == "bytes" and file_total_size > 0
+
+        return file_total_size, supports_range_requests, parse_server_digests(response.headers)
+
+    def _probe_with_range(self):
+        """请求第一个字节，从 Content-Range 中读取总大小"""
+        headers = {"Range": "bytes=0-0"}
+        with self.session.get(self.url, headers=headers, stream=True, timeout=10) as response:
+            response.raise_for_status()
+            if response.status_code == 206:
+                digests = parse_server_digests(response.headers, partial=True)
+                match = self.CONTENT_RANGE.search(response.headers.get("content-range", ""))
+                if match and match.group(1) != "*":
+                    return int(match.group(1)), True, digests
+                return 0, False, digests
+
+            # 服务器忽略了 Range，返回完整内容：不读取正文，只取长度
+            content_length = response.headers.get("content-length")
+            digests = parse_server_digests(response.headers)
+            return (int(content_length) if content_length else 0), False, digests
+
+    def _download_with_multithreading(self, file_total_size):
+        if file_total_size < 10 * 1024 * 1024:
+            optimal_threads = min(self.num_threads, 2)
+        elif file_total_size < 50 * 1024 * 1024:
+            optimal_threads = min(self.num_threads, 4)
+        elif file_total_size < 200 * 1024 * 1024:
+            optimal_threads = min(self.num_threads, 8)
+        else:
+            optimal_threads = min(self.num_threads, 16)
+
+        chunk_size = file_total_size // optimal_threads
+        if chunk_size < self.MIN_CHUNK_SIZE:
+            optimal_threads = 1
+            chunk_size = file_total_size
+
+        self.num_threads = optimal_threads
+
+        temp_files = [f"{self.full_path}.part{i}" for i in range(self.num_threads)]
+        ranges = []
+        for i in range(self.num_threads):
+            start = i * chunk_size
+            end = start + chunk_size - 1 if i < self.num_threads - 1 else file_total_size - 1
+            ranges.append((start, end))
+
+        if os.path.exists(self.full_path) and os.path.getsize(self.full_path) == file_total_size:
+            # 上次已经合并，在重新下载损坏的分片时被取消：重新校验，只下载仍然损坏的分片。
+            # 剩下的分片文件可能按不同的线程数划分，不能直接写回
+            self._cleanup_temp_files([f"{self.full_path}.part*"])
+            downloaded_size_container = [file_total_size]
+            self.last_downloaded_size = file_total_size
+        else:
+            downloaded_size_container = self._download_and_merge(ranges, temp_files, file_total_size)
+
+        # 校验发现损坏时只重新下载可疑范围所在的分片，写回合并后的文件
+        for verify_round in range(self.MAX_VERIFY_ROUNDS + 1):
+            try:
+                verify_file(self.full_path, file_total_size, self.server_digests)
+                break
+            except VerificationError as e:
+                # 无法定位损坏位置（如摘要不一致）或多次重新下载仍然损坏时放弃
+                if e.suspect is None or verify_round == self.MAX_VERIFY_ROUNDS:
+                    self._safe_remove(self.full_path)
+                    raise Exception(f"下载校验失败: {e}")
+                suspect_indices = [
+                    i
+                    for i, (start, end) in enumerate(ranges)
+                    if start <= e.suspect[1] and end >= e.suspect[0]
+                ]
+                logging.warning(f"{self.filename} {e}，重新下载分片 {suspect_indices}")
+                self._redownload_chunks(
+                    suspect_indices, ranges, file_total_size, downloaded_size_container, merged=True
+                )
+                self._patch_merged_file(suspect_indices, ranges, temp_files)
+            except DownloadCancelled:
+                # 保留合并后的文件，下次继续时重新校验并下载损坏的分片
+                raise
+            except Exception:
+                self._safe_remove(self.full_path)
+                raise
+
+        self._cleanup_temp_files(temp_files)
+
+    def _download_and_merge(self, ranges, temp_files, file_total_size):
+        """下载所有分片并合并为目标文件，返回已下载大小的计数器"""
+        # 已下载大小以分片文件的实际大小为准；分片超出范围说明分片方式已改变，重新下载
+        existing_sizes = [os.path.getsize(p) if os.path.exists(p) else 0 for p in temp_files]
+        if any(size > end - start + 1 for size, (start, end) in zip(existing_sizes, ranges)):
+            self._cleanup_temp_files([f"{self.full_path}.part*"])
+            existing_sizes = [0] * self.num_threads
+        downloaded_size_container = [sum(existing_sizes)]
+        self.last_downloaded_size = downloaded_size_container[0]
+
+        self._download_chunks(range(self.num_threads), ranges, file_total_size, downloaded_size_container)
+
+        # 分片大小不正确时只重新下载这些分片
+        for verify_round in range(self.MAX_VERIFY_ROUNDS + 1):
+            suspect_indices = [
+                i
+                for i, (start, end) in enumerate(ranges)
+                if os.path.getsize(temp_files[i]) != end - start + 1
+            ]
+            if not suspect_indices:
+                break
+            if verify_round == self.MAX_VERIFY_ROUNDS:
+                self._cleanup_temp_files(temp_files)
+                raise Exception("下载校验失败: 分片大小不正确")
+            self._redownload_chunks(suspect_indices, ranges, file_total_size, downloaded_size_container)
+
+        self._merge_files(temp_files)
+        return downloaded_size_container
+
+    def _download_with_singlethread(self, file_total_size):
+        # 以已写入文件的实际大小作为起点
+        start_pos = os.path.getsize(self.full_path) if os.path.exists(self.full_path) else 0
+
+        # 如果已经下载完成，直接返回（完成进度由 download 统一发送）
+        if file_total_size > 0 and start_pos >= file_total_size:
+            return
+
+        # 设置Range请求头
+        headers = {"Range": f"bytes={start_pos}-"}
+
+        with self.session.get(self.url, headers=headers, stream=True, timeout=(5, 30)) as r:
+            if r.status_code == 416 and start_pos > 0:
+                # 大小未知时，416 表示文件已经下载完整
+                return
+            r.raise_for_status()
+
+            mode = "ab"
+            if start_pos > 0 and r.status_code != 206:
+                # 服务器不支持断点续传，返回了完整内容，从头写入
+                mode = "wb"
+                start_pos = 0
+
+            current_downloaded = start_pos
+            local_downloaded = 0  # 本地计数器，减少进度计算次数
+            with open(self.full_path, mode) as f:
+                for chunk in r.iter_content(chunk_size=self.CHUNK_SIZE):
+                    self._checkpoint(len(chunk))
+                    if chunk:
+                        f.write(chunk)
+                        current_downloaded += len(chunk)
+                        local_downloaded += len(chunk)
+
+                        # 减少进度更新频率，只在下载了1MB后才更新
+                        if local_downloaded >= 1048576:
+                            with self.progress_lock:
+                                self._report_progress(current_downloaded, file_total_size)
+                            local_downloaded = 0
+
+            # 更新剩余的本地计数
+            if local_downloaded > 0:
+                with self.progress_lock:
+                    self._report_progress(current_downloaded, file_total_size)
+
+    def _download_chunks(self, indices, ranges, file_total_size, downloaded_size_container):
+        """并发下载指定的分片"""
+        indices = list(indices)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(indices)) as executor:
+            futures = [
+                executor.submit(
+                    self._download_chunk, i, ranges[i], file_total_size, downloaded_size_container
+                )
+                for i in indices
+            ]
+            concurrent.futures.wait(futures)
+
+        # 任一分片失败时保留已下载的分片以便继续下载，并把错误交给上层处理
+        for future in futures:
+            future.result()
+
+    def _verify_singlethread(self, file_total_size):
+        """校验单线程下载的文件，能定位到损坏位置时截断到该位置后继续下载"""
+        for verify_round in range(self.MAX_VERIFY_ROUNDS + 1):
+            try:
+                verify_file(self.full_path, file_total_size, self.server_digests)
+                return
+            except VerificationError as e:
+                if e.suspect is None or verify_round == self.MAX_VERIFY_ROUNDS:
+                    self._safe_remove(self.full_path)
+                    raise Exception(f"下载校验失败: {e}")
+                logging.warning(f"{self.filename} {e}，从偏移 {e.suspect[0]} 处重新下载")
+                with open(self.full_path, "r+b") as f:
+                    f.truncate(e.suspect[0])
+                self._with_url_refresh(self._download_with_singlethread, file_total_size)
+
+    def _download_chunk(self, index, range_tuple, file_total_size, downloaded_size_container):
+        start, end = range_tuple
+        temp_file_path = f"{self.full_path}.part{index}"
+        max_retries = 3
+        failures = 0
+        last_error = None
+
+        while True:
+            # 每次请求前按分片文件的实际大小计算起点，重试和刷新链接后都从断点继续，不会重复写入
+            existing_size = os.path.getsize(temp_file_path) if os.path.exists(temp_file_path) else 0
+            actual_start = start + existing_size
+            if actual_start > end:
+                return {"size": end - start + 1}
+            if failures >= max_retries:
+                raise last_error or Exception(f"分片 {index} 下载不完整")
+
+            url = self.url
+            try:
+                self._download_range(
+                    url, actual_start, end, temp_file_path, file_total_size, downloaded_size_container
+                )
+                # 连接正常结束但数据不完整时，下一轮重新请求剩余部分
+                last_error = None
+                if start + os.path.getsize(temp_file_path) <= end:
+                    failures += 1
+            except DownloadCancelled:
+                raise
+            except Exception as e:
+                if self._is_expired_error(e) and self._refresh_url(url):
+                    continue
+                last_error = e
+                # 本次请求已经写入了新数据时不计入失败次数，只有连续没有进展才放弃
+                if os.path.exists(temp_file_path) and os.path.getsize(temp_file_path) > existing_size:
+                    failures = 0
+                    continue
+                failures += 1
+                if failures < max_retries:
+                    time.sleep(1 * failures)
+
+    def _download_range(
+        self, url, range_start, range_end, temp_file_path, file_total_size, downloaded_size_container
+    ):
+        """下载 [range_start, range_end] 并追加到分片文件"""
+        headers = {"Range": f"bytes={range_start}-{range_end}"}
+        local_downloaded = 0  # 线程本地计数器，减少锁竞争
+
+        with self.session.get(url, headers=headers, stream=True, timeout=(5, 30)) as r:
+            r.raise_for_status()
+            if r.status_code != 206:
+                raise Exception(f"服务器未按 Range 返回数据（状态码 {r.status_code}）")
+            # 刷新链接后确认仍是同一个文件
+            match = self.CONTENT_RANGE.search(r.headers.get("content-range", ""))
+            if match and match.group(1) != "*" and int(match.group(1)) != file_total_size:
+                raise Exception("文件大小与开始下载时不一致")
+
+            try:
+                # 使用'ab'模式打开文件，追加写入
+                with open(temp_file_path, "ab") as f:
+                    for chunk in r.iter_content(chunk_size=self.CHUNK_SIZE):
+                        self._checkpoint(len(chunk))
+                        if chunk:
+                            f.write(chunk)
+                            local_downloaded += len(chunk)
+
+                            # 减少锁操作频率，只在下载了1MB后才更新全局计数器
+                            if local_downloaded >= 1048576:
+                                with self.progress_lock:
+                                    downloaded_size_container[0] += local_downloaded
+                                    self._report_progress(downloaded_size_container[0], file_total_size)
+                                local_downloaded = 0
+            finally:
+                # 更新剩余的本地计数（中途失败时已写入的数据同样计入）
+                if local_downloaded > 0:
+                    with self.progress_lock:
+                        downloaded_size_container[0] += local_downloaded
+                        self._report_progress(downloaded_size_container[0], file_total_size)
+
+    def _report_progress(self, downloaded, file_total_size):
+        """计算速度并按节流规则发送进度，调用方需持有 progress_lock"""
+        progress = (downloaded / file_total_size) * 100 if file_total_size > 0 else 0
+
+        current_time = time.time()
+        time_diff = current_time - self.last_speed_update
+        if time_diff >= 1.0:
+            bytes_diff = downloaded - self.last_downloaded_size
+            self.current_speed = bytes_diff / time_diff
+            self.last_speed_update = current_time
+            self.last_downloaded_size = downloaded
+
+        # 100% 只在校验通过后由 _emit_completed 发送一次
+        finished = file_total_size > 0 and downloaded >= file_total_size
+        if not finished and self._should_update_progress(progress):
+            self._emit_progress(
+                {
+                    "progress": progress,
+                    "filename": self.filename,
+                    "size": downloaded,
+                    "total_size": file_total_size,
+                    "speed": self.current_speed,
+                    "url": self.url,
+                }
+            )
+
+    def _emit_progress(self, info):
+        if self.progress_callback:
+            self.progress_callback(info)
+
+    def _emit_completed(self, file_total_size):
+        self._emit_progress(
+            {
+                "progress": 100,
+                "filename": self.filename,
+                "size": file_total_size,
+                "total_size": file_total_size,
+                "url": self.url,
+            }
+        )
+
+    def _redownload_chunks(self, indices, ranges, file_total_size, downloaded_size_container, merged=False):
+        """重新下载指定分片；merged 为 True 时分片已合并，从已下载大小中扣除整个分片"""
+        temp_files = [f"{self.full_path}.part{i}" for i in indices]
+        with self.progress_lock:
+            for i, temp_file in zip(indices, temp_files):
+                if merged:
+                    downloaded_size_container[0] -= ranges[i][1] - ranges[i][0] + 1
+                elif os.path.exists(temp_file):
+                    downloaded_size_container[0] -= os.path.getsize(temp_file)
+        self._cleanup_temp_files(temp_files)
+        self._download_chunks(indices, ranges, file_total_size, downloaded_size_container)
+
+    def _merge_files(self, temp_files):
+        """原地合并：第一个分片直接改名为目标文件，其余分片依次追加并立即删除
+
+        合并过程中额外占用的空间只有正在追加的一个分片，而不是一份完整文件。
+        """
+        os.replace(temp_files[0], self.full_path)
+        with open(self.full_path, "ab") as f:
+            for temp_file in temp_files[1:]:
+                with open(temp_file, "rb") as tf:
+                    shutil.copyfileobj(tf, f, length=1024 * 1024)
+                f.flush()
+                os.remove(temp_file)
+
+    def _patch_merged_file(self, indices, ranges, temp_files):
+        """把重新下载的分片写回合并后文件中的对应位置"""
+        with open(self.full_path, "r+b") as f:
+            for i in indices:
+                f.seek(ranges[i][0])
+                with open(temp_files[i], "rb") as tf:
+                    shutil.copyfileobj(tf, f, length=1024 * 1024)
+                os.remove(temp_files[i])
+
+    def _cleanup_temp_files(self, temp_files):
+        for temp_file in temp_files:
+            if "*" in temp_file:
+                files = glob.glob(temp_file)
+                for file in files:
+                    self._safe_remove(file)
+            else:
+                self._safe_remove(temp_file)
+
+    def _safe_remove(self, file_path):
+        """安全删除文件"""
+        try:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        except Exception as e:
+            logging.warning(f"Failed to remove {file_path}: {e}")
+
+    def _should_update_progress(self, current_progress):
+        current_time = time.time()
+        time_passed = current_time - self.last_progress_update
+        progress_changed = (
+            abs(current_progress - self.last_progress_value) >= self.progress_update_threshold
+        )
+
+        if time_passed >= self.progress_update_interval or progress_changed:
+            self.last_progress_update = current_time
+            self.last_progress_value = current_progress
+            return True
+        return False
+
+    def _checkpoint(self, size):
+        """每写入一块数据前调用：等待暂停结束、响应取消、按共享带宽限速"""
+        self.pause_event.wait()
+        if self.cancelled:
+            raise DownloadCancelled("下载已取消")
+        if self.bandwidth_limiter is not None:
+            self.bandwidth_limiter.consume(size)
+
+    def pause(self):
+        self.is_paused = True
+        self.pause_event.clear()
+
+    def resume(self):
+        self.is_paused = False
+        self.pause_event.set()
+
+    def cancel(self):
+        """停止下载并释放下载线程，分片文件保留"""
+        self.cancelled = True
+        self.pause_event.set()
+
+
+def download_file(url, filename, save_path=".", num_threads=4, headers=None, cookies=None, progress_callback=None):
+    """下载单个文件并返回文件路径，参数均可序列化，可以提交到进程池中执行"""
+    engine = DownloadEngine(
+        url, filename, save_path, num_threads, headers, cookies, progress_callback=progress_callback
+    )
+    return engine.download()
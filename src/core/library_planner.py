@@ -0,0 +1,183 @@
+"""
+本地视频整理计划
+
+根据本地视频索引找出重复保存的视频（同一 video_id，或规范化后标题相同且大小相同），
+以及画质低于网站当前最高画质的视频，生成批量处理计划：删除重复文件、重新下载更高画质。
+不依赖 Qt，也不修改任何文件，计划由调用方确认后执行。
+"""
+
+import os
+import re
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+
+from src.core.pipeline import SourceResolver
+from src.utils.download_verify import mp4_video_height
+from src.utils.library_index import REGEX_BRACKET_ID
+
+# 网站提供的最高画质，已达到的文件不需要查询视频源
+MAX_SITE_QUALITY = 1080
+# 本地画质低于网站最高画质的该比例时才算需要升级，容忍编码时对高度的细微裁剪
+UPGRADE_THRESHOLD = 0.9
+# 系统复制文件时追加的编号，如 "标题 (1).mp4"
+REGEX_COPY_SUFFIX = re.compile(r"\s*[(（]\d+[)）]$")
+
+
+def normalize_title(filename):
+    """去掉扩展名、[视频ID] 前缀和副本编号，统一全半角、大小写和空白"""
+    title = os.path.splitext(os.path.basename(filename))[0]
+    title = REGEX_BRACKET_ID.sub("", title)
+    title = unicodedata.normalize("NFKC", title).lower()
+    title = REGEX_COPY_SUFFIX.sub("", title.strip())
+    return re.sub(r"[\s_]+", " ", title).strip()
+
+
+def find_duplicates(files, qualities):
+    """把同一 video_id，或规范化标题和文件大小都相同（且 video_id 不冲突）的文件归为一组
+
+    只凭标题不能确定是同一个视频："某作品 (1)" 和 "某作品 (2)" 可能是两个不同的视频，
+    没有 video_id 的文件也无从核对，所以按标题合并时还要求文件大小相同。
+
+    每组保留画质最高（相同时保留文件最大）的一个，返回
+    [{"reason": "video_id" 或 "title", "keep": 文件, "remove": [文件]}]。
+    """
+    parent = list(range(len(files)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    first_seen = {}
+    for i, entry in enumerate(files):
+        keys = []
+        title = normalize_title(entry["path"])
+        if title:
+            keys.append(("title", title, entry["size"]))
+        if entry["video_id"]:
+            keys.append(("video_id", entry["video_id"]))
+        for key in keys:
+            if key in first_seen:
+                parent[find(i)] = find(first_seen[key])
+            else:
+                first_seen[key] = i
+
+    merged = {}
+    for i in range(len(files)):
+        merged.setdefault(find(i), []).append(files[i])
+
+    groups = []
+    for group in merged.values():
+        video_ids = {entry["video_id"] for entry in group if entry["video_id"]}
+        if len(video_ids) <= 1:
+            groups.append(group)
+            continue
+        # 标题相同但 video_id 不同的是不同的视频，按 video_id 拆开；无法确定归属的文件不处理
+        for video_id in video_ids:
+            groups.append([entry for entry in group if entry["video_id"] == video_id])
+
+    duplicates = []
+    for group in groups:
+        if len(group) < 2:
+            continue
+        # 画质和大小都相同时，优先保留有 video_id、没有副本编号的文件
+        group.sort(
+            key=lambda entry: (
+                qualities.get(entry["path"], 0),
+                entry["size"],
+                bool(entry["video_id"]),
+                not REGEX_COPY_SUFFIX.search(os.path.splitext(entry["path"])[0]),
+            ),
+            reverse=True,
+        )
+        video_ids = {entry["video_id"] for entry in group}
+        duplicates.append(
+            {
+                "reason": "video_id" if len(video_ids) == 1 and None not in video_ids else "title",
+                "keep": group[0],
+                "remove": group[1:],
+            }
+        )
+    return duplicates
+
+
+class LibraryPlanner:
+    """
+    生成本地视频的整理计划
+
+    - 本地画质优先使用索引中记录的 quality_num，没有记录时读取 MP4 中的视频高度
+    - 只为低于 MAX_SITE_QUALITY 的文件查询视频源，查询并发进行并限制请求频率
+    """
+
+    def __init__(self, api, max_workers=8, rate=8):
+        self.api = api
+        self.max_workers = max_workers
+        self.resolver = SourceResolver(api, "最高", max_workers, rate)
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+        self.resolver.cancel()
+
+    def _local_qualities(self, files, on_progress):
+        qualities = {}
+        unknown = []
+        for entry in files:
+            if entry.get("quality_num"):
+                qualities[entry["path"]] = entry["quality_num"]
+            else:
+                unknown.append(entry["path"])
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for done, (path, height) in enumerate(
+                zip(unknown, executor.map(mp4_video_height, unknown)), 1
+            ):
+                if self._cancelled.is_set():
+                    break
+                qualities[path] = height
+                if on_progress:
+                    on_progress("quality", done, len(unknown))
+        return qualities
+
+    def build(self, files, on_progress=None):
+        """返回 {"duplicates": [...], "upgrades": [...], "unknown_quality": 无法判断画质的文件数}
+
+        on_progress(阶段, 已完成, 总数)，阶段为 "quality"（读取本地画质）或 "sources"（查询视频源）。
+        """
+        files = list(files)
+        qualities = self._local_qualities(files, on_progress)
+        duplicates = find_duplicates(files, qualities)
+        removed = {entry["path"] for group in duplicates for entry in group["remove"]}
+
+        candidates = {}
+        unknown_quality = 0
+        for entry in files:
+            if entry["path"] in removed or not entry["video_id"]:
+                continue
+            quality = qualities.get(entry["path"], 0)
+            if not quality:
+                unknown_quality += 1
+            elif quality < MAX_SITE_QUALITY * UPGRADE_THRESHOLD:
+                candidates[entry["video_id"]] = (entry, quality)
+
+        upgrades = []
+        done = 0
+
+        def on_resolved(task):
+            entry, quality = candidates[task["video_id"]]
+            if task["quality_num"] and quality < task["quality_num"] * UPGRADE_THRESHOLD:
+                upgrades.append({**task, "path": entry["path"], "local_quality": quality})
+            on_checked()
+
+        def on_checked(*args):
+            nonlocal done
+            done += 1
+            if on_progress:
+                on_progress("sources", done, len(candidates))
+
+        if not self._cancelled.is_set():
+            self.resolver.resolve_all(
+                ({"video_id": video_id} for video_id in candidates), on_resolved, on_checked
+            )
+        return {"duplicates": duplicates, "upgrades": upgrades, "unknown_quality": unknown_quality}
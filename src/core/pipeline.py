@@ -0,0 +1,167 @@
+"""
+批量解析视频源
+
+不依赖 Qt。多个视频并发解析并限制请求频率，按输入顺序逐个交给回调，
+前面的视频解析完成后即可开始下载，不必等整批解析结束。
+搜索结果可以用 crawl_search 按页读取后直接交给 SourceResolver。
+"""
+
+import collections
+import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from src.core.bandwidth import BandwidthLimiter
+
+# 解析时只需要标题和视频源
+SOURCE_VISIBILITY_SETTINGS = {
+    key: key == "title"
+    for key in (
+        "title", "upload_date", "likes", "duration", "views",
+        "tags", "cover", "description", "related_videos",
+    )
+}
+
+
+def select_source(video_sources, quality):
+    """按画质设置选择视频源，视频源按画质从高到低排列"""
+    return video_sources[0] if quality == "最高" else video_sources[-1]
+
+
+def resolve_source(api, video_id, title, quality):
+    """获取视频源，返回下载任务，失败时抛出异常"""
+    video_info = api.get_video_info(video_id, SOURCE_VISIBILITY_SETTINGS)
+    if not video_info or not video_info["video_sources"]:
+        raise Exception("获取视频源失败")
+    source = select_source(video_info["video_sources"], quality)
+    return {
+        "video_id": video_id,
+        # 与界面一致，优先使用列表中的标题
+        "title": title or video_info["title"],
+        "url": source["url"],
+        "quality": source.get("quality", ""),
+        "quality_num": source.get("quality_num", 0),
+    }
+
+
+def crawl_search(api, query, filter_params=None, pages=1, max_workers=2, rate=1):
+    """按页序逐个产出搜索结果第 1..pages 页中的视频，跨页去重
+
+    第 1 页确定总页数后，其余页面并发获取并限制请求频率（每秒 rate 页）。
+    最多提前获取 max_workers 页，下游读取慢时不再请求新的页面。
+    """
+    limiter = BandwidthLimiter(rate)
+    seen = set()
+
+    def fetch(page):
+        limiter.consume(1)
+        return api.search_videos(query, page, filter_params)
+
+    def unique(result):
+        for video in result["videos"]:
+            if video["video_id"] not in seen:
+                seen.add(video["video_id"])
+                yield video
+
+    first = fetch(1)
+    if not first:
+        raise Exception("搜索失败")
+    yield from unique(first)
+
+    last_page = min(pages, first.get("total_pages", 1))
+    next_page = 2
+    futures = collections.deque()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        while futures or next_page <= last_page:
+            while next_page <= last_page and len(futures) < max_workers:
+                futures.append((next_page, executor.submit(fetch, next_page)))
+                next_page += 1
+            page, future = futures.popleft()
+            try:
+                result = future.result()
+            except Exception as e:
+                logging.warning(f"Failed to fetch search page {page}: {e}")
+                continue
+            if not result:
+                logging.warning(f"Failed to fetch search page {page}")
+                continue
+            yield from unique(result)
+
+
+class SourceResolver:
+    """并发解析一批视频的视频源
+
+    - max_workers: 同时解析的视频数
+    - rate: 每秒最多开始解析的视频数（每个视频约两次请求），0 为不限
+    - videos 可以是生成器，只在有空闲时才读取下一个，读取慢的上游不会被一次性读完
+    """
+
+    def __init__(self, api, quality="最高", max_workers=4, rate=2):
+        self.api = api
+        self.quality = quality
+        self.max_workers = max(1, max_workers)
+        self.limiter = BandwidthLimiter(rate)
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def _resolve(self, video):
+        self.limiter.consume(1)
+        if self.cancelled:
+            return None
+        return resolve_source(self.api, video["video_id"], video.get("title"), self.quality)
+
+    def resolve_all(self, videos, on_resolved, on_failed=None):
+        """解析 videos（含 video_id 和可选 title 的字典），按输入顺序回调
+
+        同一 video_id 只解析一次。回调在调用 resolve_all 的线程中执行，
+        返回 (成功数, 失败数)。
+        """
+        videos = iter(videos)
+        seen = set()
+        pending = {}
+        order = []  # 已提交但还未回调的 future，保持输入顺序
+        exhausted = False
+        succeeded = failed = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while not self.cancelled:
+                # 最多有 max_workers * 2 个视频在途，前面的视频未完成时不再读取上游
+                while not exhausted and len(order) < self.max_workers * 2:
+                    video = next(videos, None)
+                    if video is None:
+                        exhausted = True
+                    elif video["video_id"] not in seen:
+                        seen.add(video["video_id"])
+                        future = executor.submit(self._resolve, video)
+                        pending[future] = video
+                        order.append(future)
+                if not order:
+                    break
+
+                while order and order[0].done() and not self.cancelled:
+                    future = order.pop(0)
+                    video = pending.pop(future)
+                    try:
+                        task = future.result()
+                    except Exception as e:
+                        failed += 1
+                        if on_failed:
+                            on_failed(video, e)
+                        continue
+                    if task is not None:
+                        succeeded += 1
+                        on_resolved(task)
+
+                if order and not order[0].done():
+                    wait(order[:1], return_when=FIRST_COMPLETED)
+
+            if self.cancelled:
+                for future in order:
+                    future.cancel()
+        return succeeded, failed
@@ -0,0 +1,60 @@
+"""
+订阅的增量检查
+
+订阅保存搜索关键词和筛选条件（一般按最新上传排序），以及最近见过的视频 ID。
+每次检查从第 1 页开始读，遇到见过的视频就停止，通常只需要一两次请求。
+不依赖 Qt。
+"""
+
+import time
+
+# 每个订阅保存的最近视频 ID 数量。保存多个而不是只保存最新的一个，
+# 最新的视频被删除或排序略有变动时仍能找到停止的位置
+SEEN_IDS_LIMIT = 100
+
+
+def new_subscription(name, query, filter_params):
+    return {
+        "name": name,
+        "query": query,
+        "filter_params": filter_params,
+        "seen_ids": [],
+        "last_checked": 0,
+        "created": time.time(),
+    }
+
+
+def poll_subscription(api, subscription, max_pages=2):
+    """检查订阅的新视频
+
+    返回 (新视频列表（从旧到新）, 更新后的 seen_ids)。
+    首次检查只记录当前第 1 页的视频作为起点，不返回新视频。
+    两次检查之间的新视频超过 max_pages 页时，更早的部分不再补抓。
+    第 1 页请求失败时抛出异常，订阅保持不变，下次重新检查。
+    """
+    seen_ids = subscription.get("seen_ids") or []
+    seen = set(seen_ids)
+    new_videos = []
+    for page in range(1, max_pages + 1):
+        result = api.search_videos(
+            subscription["query"], page, subscription.get("filter_params"), use_cache=False
+        )
+        if not result:
+            if page == 1:
+                raise Exception("搜索失败")
+            break
+        reached = False
+        for video in result["videos"]:
+            if video["video_id"] in seen:
+                reached = True
+                break
+            # 两页之间有新上传时，前一页末尾的视频会出现在下一页开头
+            seen.add(video["video_id"])
+            new_videos.append(video)
+        if reached or not seen_ids or page >= result.get("total_pages", 1):
+            break
+
+    seen_ids = ([video["video_id"] for video in new_videos] + seen_ids)[:SEEN_IDS_LIMIT]
+    if not subscription.get("seen_ids"):
+        return [], seen_ids
+    return new_videos[::-1], seen_ids
@@ -0,0 +1,88 @@
+"""
+下载守护进程的客户端
+
+默认从 config/daemon.json 读取守护进程的地址和 token。
+"""
+
+import json
+import os
+
+import requests
+
+from src.daemon.daemon import DAEMON_INFO_FILE
+
+
+class DaemonError(Exception):
+    """守护进程未运行或请求失败"""
+
+
+class DaemonClient:
+    def __init__(self, url=None, token=None, timeout=10):
+        if url is None or token is None:
+            info = self.read_info()
+            if info is None:
+                raise DaemonError("下载守护进程未运行")
+            url = url or info["url"]
+            token = token or info["token"]
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {token}"
+
+    @staticmethod
+    def read_info():
+        """读取守护进程写入的地址和 token，未运行时返回 None"""
+        if not os.path.exists(DAEMON_INFO_FILE):
+            return None
+        try:
+            with open(DAEMON_INFO_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _request(self, method, path, body=None):
+        try:
+            response = self.session.request(
+                method, f"{self.url}{path}", json=body, timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            raise DaemonError(f"无法连接下载守护进程: {e}") from e
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        if response.status_code >= 400:
+            raise DaemonError(data.get("error") or f"HTTP {response.status_code}")
+        return data
+
+    def status(self):
+        return self._request("GET", "/status")
+
+    def tasks(self):
+        return self._request("GET", "/tasks")
+
+    def task(self, video_id):
+        return self._request("GET", f"/tasks/{video_id}")
+
+    def enqueue(self, video_id, title=None, quality=None, priority=None):
+        """添加任务，video_id 也可以是观看页链接"""
+        body = {"video_id": video_id, "title": title, "quality": quality, "priority": priority}
+        return self._request("POST", "/tasks", {k: v for k, v in body.items() if v is not None})
+
+    def pause(self, video_id):
+        return self._request("POST", f"/tasks/{video_id}/pause")
+
+    def resume(self, video_id):
+        return self._request("POST", f"/tasks/{video_id}/resume")
+
+    def set_priority(self, video_id, priority):
+        return self._request("POST", f"/tasks/{video_id}/priority", {"priority": priority})
+
+    def remove(self, video_id):
+        return self._request("DELETE", f"/tasks/{video_id}")
+
+    def set_bandwidth(self, rate):
+        return self._request("POST", "/bandwidth", {"rate": rate})
+
+    def shutdown(self):
+        return self._request("POST", "/shutdown")
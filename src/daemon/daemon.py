@@ -0,0 +1,551 @@
+"""
+Hanime1DL 下载守护进程
+
+常驻后台，持有下载队列、Hanime1API 会话、共享的下载连接池和带宽限制，
+通过本地 HTTP/JSON 接口接受命令（客户端见 src/daemon/client.py）。
+界面关闭后下载继续进行，多个前端或脚本可以共用同一个守护进程。
+
+接口（请求头需带 Authorization: Bearer <token>，地址和 token 写在 config/daemon.json 中）:
+    GET    /status                      守护进程状态
+    GET    /tasks                       全部任务，按下载顺序排列
+    GET    /tasks/<video_id>            单个任务
+    POST   /tasks                       添加任务 {"video_id" 或 "url", "title", "quality", "priority"}
+    POST   /tasks/<video_id>/pause      暂停（释放下载线程，保留已下载的分片）
+    POST   /tasks/<video_id>/resume     继续
+    POST   /tasks/<video_id>/priority   调整顺序 {"priority": n}，数字越小越先下载
+    DELETE /tasks/<video_id>            移除任务
+    POST   /bandwidth                   设置总带宽 {"rate": 字节/秒}，0 为不限速
+    POST   /shutdown                    停止守护进程
+
+任务队列保存在 config/daemon.db（SQLite，每次只写入变化的任务），重启后继续未完成的任务。
+守护进程与界面各自持有自己的文件：会话信息保存在 config/daemon_session.json
+（首次启动时从 config/settings.json 复制），分片下载到 .HDDaemon，不写 settings.json，
+也不使用界面的临时目录。
+"""
+
+import argparse
+import concurrent.futures
+import functools
+import glob
+import json
+import logging
+import os
+import re
+import secrets
+import shutil
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import requests
+
+from src.cli.cli import build_filename, load_options, parse_video_id
+from src.core.bandwidth import BandwidthLimiter
+from src.core.downloader import DownloadCancelled, DownloadEngine
+from src.core.pipeline import resolve_source
+from src.utils.data_store import DataStore
+from src.utils.settings_store import SESSION_KEYS, SettingsStore, get_settings_store
+
+CONFIG_DIR = os.path.join(os.getcwd(), "config")
+DAEMON_INFO_FILE = os.path.join(CONFIG_DIR, "daemon.json")
+QUEUE_DB_FILE = os.path.join(CONFIG_DIR, "daemon.db")
+# 旧版本的队列文件，首次启动时导入
+LEGACY_QUEUE_FILE = os.path.join(CONFIG_DIR, "daemon_queue.json")
+SESSION_FILE = os.path.join(CONFIG_DIR, "daemon_session.json")
+TEMP_DOWNLOAD_DIR = os.path.join(os.getcwd(), ".HDDaemon")
+DEFAULT_PORT = 17651
+TASK_PATH = re.compile(r"^/tasks/(\d+)(?:/(pause|resume|priority))?$")
+
+
+def parse_rate(text):
+    """解析 4MB / 512K / 1048576 这样的带宽（字节/秒）"""
+    match = re.fullmatch(r"(?i)\s*([\d.]+)\s*([kmg]?)b?\s*", str(text))
+    if not match:
+        raise argparse.ArgumentTypeError(f"无法解析带宽: {text}")
+    return int(float(match.group(1)) * {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3}[match.group(2).lower()])
+
+
+def _session_store():
+    """守护进程自己的会话文件，首次启动时从界面的 settings.json 复制请求头和 Cookie"""
+    store = SettingsStore(SESSION_FILE)
+    if not store.snapshot():
+        settings = get_settings_store().snapshot()
+        session = {key: settings[key] for key in SESSION_KEYS if key in settings}
+        if session:
+            store.update(session)
+    return store
+
+
+class DownloadDaemon:
+    """下载队列和调度器，HTTP 接口的各个请求都在这里处理"""
+
+    MAX_RETRIES = 3
+
+    def __init__(self, options, bandwidth=0):
+        from src.api.hanime1_api import Hanime1API
+
+        self.options = options
+        self.session_store = _session_store()
+        self.api = Hanime1API(self.session_store)
+        self.condition = threading.Condition()
+        self.running = True
+        self.started_at = time.time()
+
+        self.store = DataStore(QUEUE_DB_FILE)
+        self._import_legacy_queue()
+        self.tasks = {}
+        for task in self.store.load_download_queue():
+            if task["status"] == "downloading":
+                task["status"] = "pending"
+            self.tasks[task["video_id"]] = task
+        # 移除时仍在下载的任务可能留下分片
+        filenames = {task.get("filename") for task in self.tasks.values()}
+        for filename in self.store.pop_removed_temp_files():
+            if filename not in filenames:
+                self._remove_temp_files(filename)
+        self.engines = {}  # video_id -> 正在运行的 DownloadEngine
+        self.active = set()
+
+        # 所有任务共用一个连接池和一份带宽
+        max_jobs = max(1, options["max_simultaneous_downloads"])
+        self.bandwidth = BandwidthLimiter(bandwidth)
+        self.session = requests.Session()
+        pool_size = max_jobs * max(1, options["num_threads"]) + 2
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(self.api.session.headers)
+        self.session.cookies.update(self.api.session.cookies)
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_jobs, thread_name_prefix="daemon-download"
+        )
+        self.max_jobs = max_jobs
+
+    # ---- 队列操作（HTTP 线程调用） ----
+
+    def _ordered_locked(self):
+        return sorted(self.tasks.values(), key=lambda t: (t["priority"], t["added_at"]))
+
+    def _import_legacy_queue(self):
+        if not os.path.exists(LEGACY_QUEUE_FILE):
+            return
+        try:
+            with open(LEGACY_QUEUE_FILE, "r", encoding="utf-8") as f:
+                tasks = json.load(f).get("tasks", [])
+            if not self.store.load_download_queue():
+                self.store.save_download_tasks([(task["priority"], task) for task in tasks])
+            os.replace(LEGACY_QUEUE_FILE, LEGACY_QUEUE_FILE + ".backup")
+        except Exception as e:
+            logging.warning(f"Failed to import {LEGACY_QUEUE_FILE}: {e}")
+
+    def _save_locked(self, *video_ids):
+        """把指定任务写入数据库，不指定时写入全部任务"""
+        tasks = [self.tasks[vid] for vid in video_ids if vid in self.tasks] if video_ids else self.tasks.values()
+        self.store.save_download_tasks([(task["priority"], task) for task in tasks])
+
+    def list_tasks(self):
+        with self.condition:
+            return [dict(task) for task in self._ordered_locked()]
+
+    def get_task(self, video_id):
+        with self.condition:
+            task = self.tasks.get(video_id)
+            return dict(task) if task else None
+
+    def enqueue(self, video_id, title=None, quality=None, priority=None):
+        with self.condition:
+            task = self.tasks.get(video_id)
+            if task and task["status"] != "completed":
+                return dict(task)
+            if priority is None:
+                priority = max((t["priority"] for t in self.tasks.values()), default=-1) + 1
+            priority = int(priority)
+            task = {
+                "video_id": video_id,
+                "title": title or "",
+                "list_title": title,
+                "download_quality": quality or self.options["download_quality"],
+                "quality": "",
+                "url": None,
+                "quality_num": 0,
+                "status": "pending",
+                "priority": priority,
+                "added_at": time.time(),
+                "progress": 0,
+                "size": 0,
+                "total_size": 0,
+                "speed": 0,
+                "retry_count": 0,
+                "error": None,
+                "path": None,
+            }
+            self.tasks[video_id] = task
+            self._save_locked(video_id)
+            self.condition.notify_all()
+            return dict(task)
+
+    def pause(self, video_id):
+        with self.condition:
+            task = self.tasks.get(video_id)
+            if not task:
+                return None
+            if task["status"] in ("pending", "downloading"):
+                task["status"] = "paused"
+                engine = self.engines.get(video_id)
+                if engine:
+                    engine.cancel()
+                self._save_locked(video_id)
+            return dict(task)
+
+    def resume(self, video_id):
+        with self.condition:
+            task = self.tasks.get(video_id)
+            if not task:
+                return None
+            if task["status"] in ("paused", "error"):
+                task.update({"status": "pending", "retry_count": 0, "error": None})
+                self._save_locked(video_id)
+                self.condition.notify_all()
+            return dict(task)
+
+    def set_priority(self, video_id, priority):
+        with self.condition:
+            task = self.tasks.get(video_id)
+            if not task:
+                return None
+            task["priority"] = priority
+            self._save_locked(video_id)
+            self.condition.notify_all()
+            return dict(task)
+
+    def remove(self, video_id):
+        with self.condition:
+            task = self.tasks.pop(video_id, None)
+            if not task:
+                return None
+            engine = self.engines.get(video_id)
+            if engine:
+                engine.cancel()
+            self.store.save_download_tasks([], [video_id])
+        if task.get("filename") and task["status"] != "completed" and not engine:
+            self._remove_temp_files(task["filename"])
+        return task
+
+    def _remove_temp_files(self, filename):
+        for path in glob.glob(os.path.join(TEMP_DOWNLOAD_DIR, glob.escape(filename) + "*")):
+            try:
+                os.remove(path)
+            except OSError as e:
+                logging.warning(f"Failed to remove {path}: {e}")
+
+    def set_bandwidth(self, rate):
+        self.bandwidth.set_rate(rate)
+
+    def status(self):
+        with self.condition:
+            counts = {}
+            for task in self.tasks.values():
+                counts[task["status"]] = counts.get(task["status"], 0) + 1
+            return {
+                "pid": os.getpid(),
+                "uptime": time.time() - self.started_at,
+                "tasks": counts,
+                "active": sorted(self.active),
+                "max_jobs": self.max_jobs,
+                "bandwidth": self.bandwidth.rate,
+                "speed": sum(self.tasks[v]["speed"] for v in self.active if v in self.tasks),
+            }
+
+    # ---- 调度 ----
+
+    def schedule_forever(self):
+        """按优先级启动等待中的任务，直到 shutdown"""
+        with self.condition:
+            while self.running:
+                for task in self._ordered_locked():
+                    if len(self.active) >= self.max_jobs:
+                        break
+                    if task["status"] == "pending" and task["video_id"] not in self.active:
+                        task["status"] = "downloading"
+                        self.active.add(task["video_id"])
+                        self.executor.submit(self._run_task, task["video_id"])
+                self.condition.wait(timeout=5)
+
+    def _run_task(self, video_id):
+        with self.condition:
+            task = self.tasks.get(video_id)
+            if task is None or task["status"] != "downloading":
+                self.active.discard(video_id)
+                self.condition.notify_all()
+                return
+            task = dict(task)
+
+        updates = {}
+        try:
+            if not task["url"]:
+                resolved = resolve_source(self.api, video_id, task["list_title"], task["download_quality"])
+                updates.update(resolved)
+                task.update(resolved)
+
+            filename = build_filename(task["title"], video_id, self.options["file_naming_rule"])
+            updates["filename"] = filename
+            final_file = os.path.join(self.options["download_path"], filename)
+            if os.path.exists(final_file) and not self.options["overwrite_existing"]:
+                updates.update({"status": "completed", "path": final_file, "progress": 100})
+                return
+
+            engine = DownloadEngine(
+                task["url"],
+                filename,
+                TEMP_DOWNLOAD_DIR,
+                self.options["num_threads"] if self.options["download_mode"] == "multi_thread" else 1,
+                url_refresher=functools.partial(self.api.refresh_video_source, video_id, task["quality_num"]),
+                progress_callback=functools.partial(self._on_progress, video_id),
+                session=self.session,
+                bandwidth_limiter=self.bandwidth,
+            )
+            with self.condition:
+                self.tasks.get(video_id, {}).update(updates)
+                self.engines[video_id] = engine
+                # 解析视频源期间被暂停或移除
+                if self.tasks.get(video_id, {}).get("status") != "downloading":
+                    engine.cancel()
+
+            temp_file = engine.download()
+            os.makedirs(self.options["download_path"], exist_ok=True)
+            shutil.move(temp_file, final_file)
+            updates.update({"status": "completed", "path": final_file, "progress": 100, "speed": 0})
+            logging.info(f"下载完成: {final_file}")
+        except DownloadCancelled:
+            updates["speed"] = 0
+        except Exception as e:
+            logging.warning(f"下载失败 {video_id}: {e}")
+            retry_count = task["retry_count"] + 1
+            updates.update(
+                {
+                    "retry_count": retry_count,
+                    "error": str(e),
+                    # 重试时重新获取视频源，链接可能已经失效
+                    "url": None,
+                    "speed": 0,
+                    "status": "pending" if retry_count < self.MAX_RETRIES else "error",
+                }
+            )
+        finally:
+            with self.condition:
+                current = self.tasks.get(video_id)
+                if current is None and updates.get("filename"):
+                    # 下载途中被移除，清理分片
+                    self._remove_temp_files(updates["filename"])
+                if current is not None:
+                    # 暂停状态由 pause() 设置，不被下载结果覆盖
+                    if current["status"] != "downloading":
+                        updates.pop("status", None)
+                    current.update(updates)
+                self.engines.pop(video_id, None)
+                self.active.discard(video_id)
+                self._save_locked(video_id)
+                self.condition.notify_all()
+
+    def _on_progress(self, video_id, info):
+        with self.condition:
+            task = self.tasks.get(video_id)
+            if task:
+                task.update(
+                    {
+                        "progress": info["progress"],
+                        "size": info["size"],
+                        "total_size": info["total_size"],
+                        "speed": info.get("speed", task["speed"]),
+                        "url": info.get("url", task["url"]),
+                    }
+                )
+
+    def shutdown(self):
+        """停止接受新任务，取消正在进行的下载（保留分片）并保存队列"""
+        with self.condition:
+            self.running = False
+            for engine in self.engines.values():
+                engine.cancel()
+            self.condition.notify_all()
+        self.executor.shutdown(wait=True)
+        with self.condition:
+            for task in self.tasks.values():
+                if task["status"] == "downloading":
+                    task["status"] = "pending"
+            self._save_locked()
+        self.session_store.flush()
+        self.store.close()
+
+
+def _int_param(value):
+    """请求中的整数参数，无法转换时返回 None"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class DaemonRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+    @property
+    def download_daemon(self):
+        return self.server.download_daemon
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode("utf-8"))
+
+    def _authorized(self):
+        expected = f"Bearer {self.server.token}"
+        return secrets.compare_digest(self.headers.get("Authorization", ""), expected)
+
+    def _handle(self, method):
+        if not self._authorized():
+            self._send_json(401, {"error": "unauthorized"})
+            return
+        try:
+            body = self._read_json() if method in ("POST", "DELETE") else {}
+        except ValueError:
+            self._send_json(400, {"error": "请求内容不是有效的 JSON"})
+            return
+        if not isinstance(body, dict):
+            self._send_json(400, {"error": "请求内容必须是 JSON 对象"})
+            return
+
+        path = urlparse(self.path).path.rstrip("/")
+        daemon = self.download_daemon
+        if method == "GET" and path == "/status":
+            self._send_json(200, daemon.status())
+        elif method == "GET" and path == "/tasks":
+            self._send_json(200, daemon.list_tasks())
+        elif method == "POST" and path == "/tasks":
+            video_id = parse_video_id(str(body.get("video_id") or body.get("url") or ""))
+            if not video_id:
+                self._send_json(400, {"error": "无法识别的视频 ID 或链接"})
+                return
+            priority = body.get("priority")
+            if priority is not None:
+                priority = _int_param(priority)
+                if priority is None:
+                    self._send_json(400, {"error": "priority 必须是整数"})
+                    return
+            task = daemon.enqueue(video_id, body.get("title"), body.get("quality"), priority)
+            self._send_json(201, task)
+        elif method == "POST" and path == "/bandwidth":
+            rate = _int_param(body.get("rate", 0))
+            if rate is None:
+                self._send_json(400, {"error": "rate 必须是整数"})
+                return
+            daemon.set_bandwidth(rate)
+            self._send_json(200, {"bandwidth": daemon.bandwidth.rate})
+        elif method == "POST" and path == "/shutdown":
+            self._send_json(200, {"ok": True})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        else:
+            match = TASK_PATH.match(path)
+            if not match:
+                self._send_json(404, {"error": "not found"})
+                return
+            video_id, action = match.groups()
+            if method == "GET" and not action:
+                task = daemon.get_task(video_id)
+            elif method == "DELETE" and not action:
+                task = daemon.remove(video_id)
+            elif method == "POST" and action == "pause":
+                task = daemon.pause(video_id)
+            elif method == "POST" and action == "resume":
+                task = daemon.resume(video_id)
+            elif method == "POST" and action == "priority" and _int_param(body.get("priority")) is not None:
+                task = daemon.set_priority(video_id, _int_param(body["priority"]))
+            else:
+                self._send_json(400, {"error": "不支持的请求"})
+                return
+            if task is None:
+                self._send_json(404, {"error": "任务不存在"})
+            else:
+                self._send_json(200, task)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+def _write_daemon_info(url, token):
+    os.makedirs(CONFIG_DIR, exist_ok=True)
+    temp_file = DAEMON_INFO_FILE + ".tmp"
+    # token 只允许当前用户读取
+    fd = os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"url": url, "token": token, "pid": os.getpid()}, f)
+    os.replace(temp_file, DAEMON_INFO_FILE)
+
+
+def serve(options, host="127.0.0.1", port=DEFAULT_PORT, bandwidth=0, base_url=None):
+    daemon = DownloadDaemon(options, bandwidth)
+    if base_url:
+        daemon.api.base_url = base_url.rstrip("/")
+    httpd = ThreadingHTTPServer((host, port), DaemonRequestHandler)
+    httpd.daemon_threads = True
+    httpd.download_daemon = daemon
+    httpd.token = secrets.token_urlsafe(24)
+    url = f"http://{httpd.server_address[0]}:{httpd.server_address[1]}"
+    _write_daemon_info(url, httpd.token)
+
+    scheduler = threading.Thread(target=daemon.schedule_forever, name="daemon-scheduler", daemon=True)
+    scheduler.start()
+    logging.info(f"下载守护进程已启动: {url}")
+    print(url, flush=True)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        daemon.shutdown()
+        try:
+            os.remove(DAEMON_INFO_FILE)
+        except OSError:
+            pass
+        logging.info("下载守护进程已停止")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hanime1DL 下载守护进程")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址，默认只允许本机访问")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="监听端口，0 为自动选择")
+    parser.add_argument("--bandwidth", type=parse_rate, default=0, help="总带宽，如 4MB（默认不限速）")
+    parser.add_argument("-o", "--output", help="下载目录")
+    parser.add_argument("--threads", type=int, help="每个视频的下载线程数")
+    parser.add_argument("-j", "--jobs", type=int, help="同时下载的视频数")
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    # 画质、命名规则等使用 config/settings.json 中的设置
+    parser.set_defaults(quality=None, naming_rule=None, overwrite=False)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format="%(levelname)s %(message)s")
+    serve(load_options(args), args.host, args.port, args.bandwidth, args.base_url)
+    return 0
@@ -2,10 +2,10 @@
 Dialogs for Hanime1DL
 """
 
-import json
 import os
+import time
 
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtWidgets import (
     QCheckBox,
     QComboBox,
@@ -22,6 +22,8 @@ from PyQt5.QtWidgets import (
     QRadioButton,
     QScrollArea,
     QSpinBox,
+    QTableWidget,
+    QTableWidgetItem,
     QTabWidget,
     QTextEdit,
     QVBoxLayout,
@@ -429,6 +431,237 @@ class VideoDetailsSettingsDialog(QDialog):
         return self.settings
 
 
+class PoolMetricsDialog(QDialog):
+    """线程池运行状态对话框，显示各线程池的排队深度和等待时间"""
+
+    COLUMNS = [
+        ("name", "线程池"),
+        ("max_threads", "最大线程"),
+        ("running", "运行中"),
+        ("queued", "排队"),
+        ("submitted", "已提交"),
+        ("completed", "已完成"),
+        ("cancelled", "已取消"),
+        ("avg_wait_ms", "平均等待(ms)"),
+        ("p95_wait_ms", "P95等待(ms)"),
+        ("max_wait_ms", "最大等待(ms)"),
+    ]
+
+    def __init__(self, pools, parent=None):
+        super().__init__(parent)
+        # 设置窗口标志，禁用上下文帮助按钮
+        self.setWindowFlags(self.windowFlags() & ~Qt.WindowContextHelpButtonHint)
+        self.pools = pools
+        self.init_ui()
+
+        # 每秒刷新一次
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start(1000)
+        self.refresh()
+
+    def init_ui(self):
+        self.setWindowTitle("运行状态")
+        self.setMinimumSize(900, 220)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(16, 16, 16, 16)
+        layout.setSpacing(12)
+
+        self.table = QTableWidget(len(self.pools), len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels([label for _, label in self.COLUMNS])
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.table)
+
+        btn_layout = QHBoxLayout()
+        close_btn = QPushButton("关闭")
+        close_btn.setFixedWidth(80)
+        close_btn.clicked.connect(self.accept)
+        btn_layout.addStretch()
+        btn_layout.addWidget(close_btn)
+        layout.addLayout(btn_layout)
+
+    def refresh(self):
+        for row, pool in enumerate(self.pools):
+            metrics = pool.metrics()
+            for col, (key, _) in enumerate(self.COLUMNS):
+                value = metrics.get(key, "")
+                text = f"{value:.1f}" if isinstance(value, float) else str(value)
+                self.table.setItem(row, col, QTableWidgetItem(text))
+        self.table.resizeColumnsToContents()
+
+
+class SubscriptionsDialog(QDialog):
+    """订阅管理对话框，列出订阅并可删除或立即检查"""
+
+    COLUMNS = ["名称", "关键词", "筛选条件", "上次检查"]
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        # 设置窗口标志，禁用上下文帮助按钮
+        self.setWindowFlags(self.windowFlags() & ~Qt.WindowContextHelpButtonHint)
+        self.parent = parent
+        self.init_ui()
+        self.refresh()
+
+    def init_ui(self):
+        self.setWindowTitle("订阅")
+        self.setMinimumSize(640, 300)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(16, 16, 16, 16)
+        layout.setSpacing(12)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        layout.addWidget(self.table)
+
+        btn_layout = QHBoxLayout()
+        check_btn = QPushButton("立即检查")
+        check_btn.clicked.connect(self.parent.check_subscriptions)
+        delete_btn = QPushButton("删除")
+        delete_btn.clicked.connect(self.delete_selected)
+        close_btn = QPushButton("关闭")
+        close_btn.setFixedWidth(80)
+        close_btn.clicked.connect(self.accept)
+        btn_layout.addWidget(check_btn)
+        btn_layout.addWidget(delete_btn)
+        btn_layout.addStretch()
+        btn_layout.addWidget(close_btn)
+        layout.addLayout(btn_layout)
+
+    def refresh(self):
+        subscriptions = self.parent.subscriptions
+        self.table.setRowCount(len(subscriptions))
+        for row, subscription in enumerate(subscriptions):
+            filter_params = subscription.get("filter_params") or {}
+            filters = [
+                filter_params.get(key, "")
+                for key in ("genre", "sort", "date", "duration")
+                if filter_params.get(key)
+            ] + list(filter_params.get("tags", []))
+            last_checked = subscription.get("last_checked")
+            values = [
+                subscription["name"],
+                subscription["query"],
+                ", ".join(filters),
+                time.strftime("%Y-%m-%d %H:%M", time.localtime(last_checked))
+                if last_checked
+                else "从未",
+            ]
+            for col, value in enumerate(values):
+                self.table.setItem(row, col, QTableWidgetItem(value))
+        self.table.resizeColumnsToContents()
+
+    def delete_selected(self):
+        rows = sorted({index.row() for index in self.table.selectedIndexes()})
+        if not rows:
+            return
+        names = [self.parent.subscriptions[row]["name"] for row in rows]
+        reply = QMessageBox.question(
+            self, "确认删除", f"确定要删除 {len(names)} 个订阅吗？", QMessageBox.Yes | QMessageBox.No
+        )
+        if reply == QMessageBox.Yes:
+            for name in names:
+                self.parent.remove_subscription(name)
+            self.refresh()
+
+
+class LibraryPlanDialog(QDialog):
+    """本地视频整理计划，确认后删除重复文件或下载更高画质"""
+
+    COLUMNS = ["操作", "文件", "说明"]
+
+    def __init__(self, plan, parent):
+        super().__init__(parent)
+        # 设置窗口标志，禁用上下文帮助按钮
+        self.setWindowFlags(self.windowFlags() & ~Qt.WindowContextHelpButtonHint)
+        self.plan = plan
+        self.parent = parent
+        self.removals = [entry for group in plan["duplicates"] for entry in group["remove"]]
+        self.init_ui()
+
+    def init_ui(self):
+        self.setWindowTitle("整理视频库")
+        self.setMinimumSize(800, 420)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(16, 16, 16, 16)
+        layout.setSpacing(12)
+
+        removal_size = sum(entry["size"] for entry in self.removals) / 1024 / 1024
+        summary = (
+            f"重复视频 {len(self.plan['duplicates'])} 组，可删除 {len(self.removals)} 个文件"
+            f"（{removal_size:.1f} MB）；可升级画质 {len(self.plan['upgrades'])} 个"
+        )
+        if self.plan["unknown_quality"]:
+            summary += f"；{self.plan['unknown_quality']} 个文件无法读取画质，已跳过"
+        layout.addWidget(QLabel(summary))
+
+        rows = []
+        for group in self.plan["duplicates"]:
+            keep_name = os.path.basename(group["keep"]["path"])
+            reason = "视频ID相同" if group["reason"] == "video_id" else "标题相同"
+            for entry in group["remove"]:
+                rows.append(("删除", os.path.basename(entry["path"]), f"{reason}，保留 {keep_name}"))
+        for upgrade in self.plan["upgrades"]:
+            rows.append(
+                (
+                    "升级",
+                    os.path.basename(upgrade["path"]),
+                    f"{upgrade['local_quality']}p → {upgrade['quality'] or upgrade['quality_num']}",
+                )
+            )
+
+        self.table = QTableWidget(len(rows), len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        for row, values in enumerate(rows):
+            for col, value in enumerate(values):
+                self.table.setItem(row, col, QTableWidgetItem(value))
+        self.table.resizeColumnsToContents()
+        layout.addWidget(self.table)
+
+        btn_layout = QHBoxLayout()
+        self.delete_btn = QPushButton("删除重复文件")
+        self.delete_btn.setEnabled(bool(self.removals))
+        self.delete_btn.clicked.connect(self.delete_duplicates)
+        self.upgrade_btn = QPushButton("下载更高画质")
+        self.upgrade_btn.setEnabled(bool(self.plan["upgrades"]))
+        self.upgrade_btn.clicked.connect(self.queue_upgrades)
+        close_btn = QPushButton("关闭")
+        close_btn.setFixedWidth(80)
+        close_btn.clicked.connect(self.accept)
+        btn_layout.addWidget(self.delete_btn)
+        btn_layout.addWidget(self.upgrade_btn)
+        btn_layout.addStretch()
+        btn_layout.addWidget(close_btn)
+        layout.addLayout(btn_layout)
+
+    def delete_duplicates(self):
+        reply = QMessageBox.question(
+            self,
+            "确认删除",
+            f"确定要删除 {len(self.removals)} 个重复文件吗？此操作无法撤销。",
+            QMessageBox.Yes | QMessageBox.No,
+        )
+        if reply == QMessageBox.Yes:
+            self.parent.delete_library_files([entry["path"] for entry in self.removals])
+            self.delete_btn.setEnabled(False)
+
+    def queue_upgrades(self):
+        self.parent.queue_library_upgrades(self.plan["upgrades"])
+        self.upgrade_btn.setEnabled(False)
+
+
 class SettingsDialog(QDialog):
     def __init__(self, settings, parent=None):
         super().__init__(parent)
@@ -449,6 +682,7 @@ class SettingsDialog(QDialog):
             "show_announcements": True,
             "font": "Segoe UI",
             "font_size": 9,
+            "subscription_interval": 60,
             "video_details_visibility": {
                 "title": True,
                 "upload_date": True,
@@ -584,6 +818,13 @@ class SettingsDialog(QDialog):
         self.max_downloads_spinbox.setValue(self.settings["max_simultaneous_downloads"])
         basic_form.addRow("最大同时下载任务:", self.max_downloads_spinbox)
 
+        self.subscription_interval_spinbox = QSpinBox()
+        self.subscription_interval_spinbox.setRange(0, 1440)
+        self.subscription_interval_spinbox.setSuffix(" 分钟")
+        self.subscription_interval_spinbox.setSpecialValueText("不自动检查")
+        self.subscription_interval_spinbox.setValue(self.settings["subscription_interval"])
+        basic_form.addRow("订阅检查间隔:", self.subscription_interval_spinbox)
+
         quality_layout = QHBoxLayout()
         self.highest_quality_radio = QRadioButton("最高")
         self.lowest_quality_radio = QRadioButton("最低")
@@ -757,15 +998,8 @@ class SettingsDialog(QDialog):
         if hasattr(self.parent, "api"):
             self.parent.api.session.cookies.clear()
             self.parent.settings["cloudflare_cookie"] = ""
-            if os.path.exists("settings.json"):
-                with open("settings.json", "r", encoding="utf-8") as f:
-                    settings = json.load(f)
-                if "session" in settings:
-                    del settings["session"]
-                if "cloudflare_cookie" in settings:
-                    del settings["cloudflare_cookie"]
-                with open("settings.json", "w", encoding="utf-8") as f:
-                    json.dump(settings, f, ensure_ascii=False, indent=2)
+            if hasattr(self.parent, "settings_store"):
+                self.parent.settings_store.remove("session")
                 self.parent.save_settings()
             QMessageBox.information(self, "成功", "Cookie已清除")
 
@@ -787,6 +1021,7 @@ class SettingsDialog(QDialog):
         )
         self.settings["num_threads"] = self.thread_spinbox.value()
         self.settings["max_simultaneous_downloads"] = self.max_downloads_spinbox.value()
+        self.settings["subscription_interval"] = self.subscription_interval_spinbox.value()
         self.settings["download_quality"] = (
             "最高" if self.highest_quality_radio.isChecked() else "最低"
         )
@@ -2,7 +2,9 @@
 Hanime1DL 主界面窗口
 """
 
+import collections
 import ctypes
+import functools
 import json
 import logging
 import multiprocessing
@@ -16,19 +18,19 @@ import datetime
 import requests
 import sip
 from PyQt5.QtCore import (
+    QFileSystemWatcher,
     QObject,
-    QRectF,
+    QPoint,
     QRunnable,
     QSize,
     Qt,
-    QThreadPool,
     QTimer,
     QUrl,
     pyqtSignal,
     pyqtSlot,
     QEvent,
 )
-from PyQt5.QtGui import QColor, QFont, QIcon, QPainter, QPainterPath, QPen, QPixmap
+from PyQt5.QtGui import QFont, QIcon, QPixmap
 from PyQt5.QtWidgets import (
     QApplication,
     QComboBox,
@@ -55,7 +57,14 @@ from PyQt5.QtWidgets import (
 
 
 from src.api.hanime1_api import Hanime1API
-from src.dialogs.dialogs import FilterDialog, SettingsDialog
+from src.core.pipeline import crawl_search
+from src.core.subscriptions import new_subscription
+from src.utils.data_store import DataStore
+from src.utils.disk_space import DiskSpaceAdmission
+from src.utils.library_index import LibraryIndex
+from src.utils.search_index import FavoritesIndex
+from src.utils.settings_store import SESSION_KEYS, get_settings_store
+from src.utils.thumbnail_cache import ThumbnailCache
 from src.widgets.widgets import (
     ChineseComboBox,
     ChineseLineEdit,
@@ -63,26 +72,53 @@ from src.widgets.widgets import (
     DownloadListWidget,
     PageNavigationWidget,
 )
-from src.workers.workers import DownloadWorker, GetVideoInfoWorker, SearchWorker
+from src.workers.workers import (
+    DownloadWorker,
+    GetVideoInfoWorker,
+    LibraryPlanWorker,
+    SearchWorker,
+    SourceResolveWorker,
+    SubscriptionWorker,
+    ThumbnailWorker,
+    WorkloadPool,
+)
+
+
+# 列表项中保存缩略图地址的数据角色
+THUMBNAIL_URL_ROLE = Qt.UserRole + 1
+# 批量下载时等待中的任务达到该数量后暂停解析
+BATCH_MAX_PENDING_DOWNLOADS = 20
+# 可视区域上下额外预加载的行数
+THUMBNAIL_PREFETCH_ROWS = 8
+# 内存中最多保留的缩略图数量，更早使用的由磁盘缓存重新读取
+THUMBNAIL_MEMORY_CACHE_SIZE = 300
 
 
 class Hanime1GUI(QMainWindow):
     def __init__(self):
         super().__init__()
-        self.api = Hanime1API()
-        self.threadpool = QThreadPool()
-        # 根据系统CPU核心数动态调整线程池大小
+        # 按负载类型使用独立的线程池，避免长时间运行的下载任务占满线程导致搜索和缩略图饿死
         cpu_count = multiprocessing.cpu_count()
-        max_threads = min(cpu_count * 3, 16)
-        self.threadpool.setMaxThreadCount(max_threads)
+        # 交互式接口请求：搜索、视频详情、获取下载源
+        self.api_pool = WorkloadPool("接口请求", 4)
+        # 图片加载：缩略图、封面
+        self.image_pool = WorkloadPool("图片加载", max(2, min(cpu_count, 6)))
+        # 下载任务：每个任务在整个下载期间占用一个线程（设置中最多同时下载 10 个）
+        self.download_pool = WorkloadPool("下载任务", 16)
+        # 批量解析：下载队列已满时会长时间等待，不能占用接口请求的线程
+        self.batch_pool = WorkloadPool("批量解析", 4)
+        self.workload_pools = [self.api_pool, self.image_pool, self.download_pool, self.batch_pool]
 
         # 确保config文件夹存在
         self.config_dir = os.path.join(os.getcwd(), "config")
         if not os.path.exists(self.config_dir):
             os.makedirs(self.config_dir)
         
-        # 迁移旧配置文件到config文件夹
+        # 迁移旧配置文件到config文件夹（需在首次读取设置之前完成）
         self._migrate_old_config_files()
+
+        self.settings_store = get_settings_store()
+        self.api = Hanime1API()
         
         # 初始化设置
         self.settings_file = os.path.join(self.config_dir, "settings.json")
@@ -102,6 +138,7 @@ class Hanime1GUI(QMainWindow):
             "show_announcements": True,
             "font": "Segoe UI",
             "font_size": 9,
+            "subscription_interval": 60,
             "video_details_visibility": {
                 "title": True,
                 "upload_date": True,
@@ -138,8 +175,16 @@ class Hanime1GUI(QMainWindow):
         self.current_video_id = None  # 跟踪当前加载的视频ID
         self.downloads = []
         self.active_downloads = {}
+        self.resolve_workers = set()  # 正在批量解析视频源的任务
+        self.search_batch_worker = None  # 正在解析的搜索结果批量下载
+        self.pending_download_count = 0  # 批量解析时据此暂停，不让等待队列无限增长
         self.current_cover_url = ""
-        self.thumbnail_cache = {}  # 缩略图缓存
+        self.thumbnail_cache = collections.OrderedDict()  # 缩略图缓存，按最近使用排序
+        # 正在进行的缩略图请求：{url: {"worker": worker, "items": [QListWidgetItem]}}
+        self._thumbnail_requests = {}
+        self._pending_thumbnail_lists = set()
+        # 缩略图磁盘缓存，保存已渲染好的缩略图
+        self.thumbnail_disk_cache = ThumbnailCache(os.path.join(self.config_dir, "thumbnails"))
         self._op_lock = threading.Lock()
         self._last_action_time = {}
         self.is_loading_video_info = False  # 防止重复加载视频信息
@@ -153,9 +198,45 @@ class Hanime1GUI(QMainWindow):
 
         self.download_history = []
         self.history_file = os.path.join(self.config_dir, "download_history.json")
+
+        # 收藏夹和下载历史保存在 SQLite 中，首次运行时导入旧的 JSON 文件
+        self.store = DataStore(os.path.join(self.config_dir, "hanime1.db"))
+        self.store.import_json(self.favorites_file, self.history_file)
         self.temp_download_dir = os.path.join(os.getcwd(), ".HDDownload")
         self._ensure_temp_download_dir()
 
+        # 下载队列增量写入数据库，1 秒内的多次变化合并为一次写入
+        self._saved_download_queue = {}  # video_id -> (位置, 上次写入的 JSON)
+        self.download_queue_timer = QTimer(self)
+        self.download_queue_timer.setSingleShot(True)
+        self.download_queue_timer.setInterval(1000)
+        self.download_queue_timer.timeout.connect(self.save_download_queue)
+
+        # 下载目录的视频索引，目录变化后合并 1 秒内的多次通知再更新
+        self.library = LibraryIndex(self.store)
+        self.library_watcher = QFileSystemWatcher(self)
+        self.library_watcher.directoryChanged.connect(lambda path: self.library_refresh_timer.start())
+        self.library_refresh_timer = QTimer(self)
+        self.library_refresh_timer.setSingleShot(True)
+        self.library_refresh_timer.setInterval(1000)
+        self.library_refresh_timer.timeout.connect(self.refresh_library)
+        self.library_plan_worker = None
+
+        # 磁盘空间不足时暂缓启动的任务，定时重新检查
+        self.disk_space_timer = QTimer(self)
+        self.disk_space_timer.setSingleShot(True)
+        self.disk_space_timer.setInterval(30000)
+        # 只重新检查等待中的任务，用户暂停的任务保持暂停
+        self.disk_space_timer.timeout.connect(self.start_pending_downloads)
+
+        # 订阅定时检查，发现新视频后自动加入下载队列
+        self.subscriptions = self.store.load_subscriptions()
+        self.subscription_worker = None
+        self.subscriptions_dialog = None
+        self.subscription_timer = QTimer(self)
+        self.subscription_timer.timeout.connect(self.check_subscriptions)
+        self._apply_subscription_interval()
+
         # 初始化UI
         self.init_ui()
 
@@ -163,6 +244,11 @@ class Hanime1GUI(QMainWindow):
         self.load_favorites()
         self.load_download_history()
         self.update_history_list()
+        self.load_library()
+        self.restore_download_queue()
+        if self.subscription_timer.isActive():
+            # 启动后稍等片刻再检查，不与恢复下载和首次搜索争抢请求
+            QTimer.singleShot(30000, self.check_subscriptions)
 
         # 应用详情显示设置
         self.apply_video_details_visibility()
@@ -560,6 +646,19 @@ class Hanime1GUI(QMainWindow):
         self.filter_button.clicked.connect(self.open_filter_dialog)
         search_layout.addWidget(self.filter_button)
 
+        self.batch_download_button = QPushButton("批量下载")
+        self.batch_download_button.setToolTip("按当前关键词和筛选条件下载多页搜索结果")
+        self.batch_download_button.clicked.connect(self.on_download_search_results)
+        search_layout.addWidget(self.batch_download_button)
+
+        self.subscription_button = QPushButton("订阅")
+        subscription_menu = QMenu(self.subscription_button)
+        subscription_menu.addAction("订阅当前搜索...").triggered.connect(self.subscribe_current_search)
+        subscription_menu.addAction("立即检查订阅").triggered.connect(lambda: self.check_subscriptions())
+        subscription_menu.addAction("管理订阅...").triggered.connect(self.open_subscriptions_dialog)
+        self.subscription_button.setMenu(subscription_menu)
+        search_layout.addWidget(self.subscription_button)
+
         self.settings_button = QPushButton("设置")
         self.settings_button.clicked.connect(self.open_settings)
         search_layout.addWidget(self.settings_button)
@@ -580,6 +679,12 @@ class Hanime1GUI(QMainWindow):
     def _init_tab_widget(self, parent_layout):
         tab_widget = QTabWidget()
 
+        # 滚动停止后只为可见行请求缩略图
+        self._visible_thumbnail_timer = QTimer(self)
+        self._visible_thumbnail_timer.setSingleShot(True)
+        self._visible_thumbnail_timer.setInterval(50)
+        self._visible_thumbnail_timer.timeout.connect(self._load_pending_visible_thumbnails)
+
         # 视频列表
         self.video_list = QListWidget()
         self.video_list.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
@@ -616,6 +721,11 @@ class Hanime1GUI(QMainWindow):
         self.favorites_search_input = ChineseLineEdit()
         self.favorites_search_input.setPlaceholderText("在收藏夹中搜索...")
         self.favorites_search_input.textChanged.connect(self.on_favorites_search)
+        self._favorites_index = None
+        self._favorites_search_timer = QTimer(self)
+        self._favorites_search_timer.setSingleShot(True)
+        self._favorites_search_timer.setInterval(200)
+        self._favorites_search_timer.timeout.connect(self._apply_favorites_filter)
         favorites_top_layout.addWidget(self.favorites_search_input, 1)
 
         export_favorites_button = QPushButton("导出")
@@ -660,6 +770,17 @@ class Hanime1GUI(QMainWindow):
 
         tab_widget.addTab(history_widget, "下载历史")
 
+        for list_widget in (self.video_list, self.favorites_list):
+            list_widget.verticalScrollBar().valueChanged.connect(
+                lambda _, lw=list_widget: self._schedule_visible_thumbnails(lw)
+            )
+        tab_widget.currentChanged.connect(
+            lambda _: [
+                self._schedule_visible_thumbnails(lw)
+                for lw in (self.video_list, self.favorites_list)
+            ]
+        )
+
         parent_layout.addWidget(tab_widget)
 
     def _init_right_panel(self):
@@ -771,9 +892,24 @@ class Hanime1GUI(QMainWindow):
         self.clear_download_button = QPushButton("清空列表")
         self.clear_download_button.clicked.connect(self.on_clear_download_list)
 
+        self.pool_metrics_button = QPushButton("运行状态")
+        self.pool_metrics_button.clicked.connect(self.open_pool_metrics)
+
+        self.library_plan_button = QPushButton("整理视频库")
+        self.library_plan_button.setToolTip("查找重复的视频和可以升级画质的视频")
+        self.library_plan_button.clicked.connect(self.on_analyze_library)
+
+        self.cancel_batch_button = QPushButton("取消批量解析")
+        self.cancel_batch_button.setToolTip("停止解析系列、搜索结果和订阅的视频源")
+        self.cancel_batch_button.setEnabled(False)
+        self.cancel_batch_button.clicked.connect(self.cancel_batch_downloads)
+
         for btn in [
             self.toggle_download_button,
             self.clear_download_button,
+            self.pool_metrics_button,
+            self.library_plan_button,
+            self.cancel_batch_button,
         ]:
             download_control_layout.addWidget(btn)
         download_layout.addLayout(download_control_layout)
@@ -820,20 +956,17 @@ class Hanime1GUI(QMainWindow):
                     logging.warning(f"迁移配置文件失败 {old_filename}: {e}")
     
     def load_settings(self):
-        try:
-            if os.path.exists(self.settings_file):
-                with open(self.settings_file, "r", encoding="utf-8") as f:
-                    return json.load(f)
-        except Exception as e:
-            logging.warning(f"Failed to load settings: {e}")
+        if os.path.exists(self.settings_file):
+            settings = self.settings_store.snapshot()
+            # 请求头和会话由 API 负责保存，界面设置中不保留，避免用旧值覆盖
+            for key in SESSION_KEYS:
+                settings.pop(key, None)
+            if settings:
+                return settings
         return self.default_settings.copy()
 
     def save_settings(self):
-        try:
-            with open(self.settings_file, "w", encoding="utf-8") as f:
-                json.dump(self.settings, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logging.warning(f"Failed to save settings: {e}")
+        self.settings_store.update(self.settings)
 
     def closeEvent(self, event):
         geometry = self.geometry()
@@ -841,28 +974,39 @@ class Hanime1GUI(QMainWindow):
         self.settings["window_pos"] = {"x": geometry.x(), "y": geometry.y()}
         self.save_settings()
         
-        # 停止所有正在运行的下载任务
+        # 保存下载队列，下次启动时恢复
+        self.download_queue_timer.stop()
+        self.save_download_queue()
+
+        for worker in list(self.resolve_workers):
+            worker.cancel()
+        if self.library_plan_worker is not None:
+            self.library_plan_worker.cancel()
+
+        # 取消正在运行的下载任务，已下载的分片保留在临时文件夹中
         for vid, worker in list(self.active_downloads.items()):
-            if hasattr(worker, "pause"):
-                worker.pause()
+            worker.cancel()
         
         # 等待线程池中的任务完成（最多等待3秒）
-        self.threadpool.clear()  # 清除所有待处理的任务
-        self.threadpool.waitForDone(3000)  # 等待正在运行的任务完成，最多3秒
+        for pool in self.workload_pools:
+            pool.clear()  # 清除所有待处理的任务
+        deadline = time.time() + 3  # 等待正在运行的任务完成，最多3秒
+        for pool in self.workload_pools:
+            pool.waitForDone(max(0, int((deadline - time.time()) * 1000)))
         
+        # 保存缩略图缓存索引
+        self.thumbnail_disk_cache.save_index()
+        self.store.close()
+        # 立即写入尚未落盘的设置
+        self.settings_store.flush()
+
         # 关闭API会话，释放连接
         if hasattr(self.api, "session"):
             try:
                 self.api.session.close()
             except Exception as e:
                 logging.warning(f"Failed to close API session: {e}")
-        
-        # 清理临时下载文件夹
-        try:
-            self._clear_temp_download_folder()
-        except Exception as e:
-            logging.warning(f"Failed to clear temp folder: {e}")
-        
+
         super().closeEvent(event)
 
     def apply_video_details_visibility(self):
@@ -900,12 +1044,23 @@ class Hanime1GUI(QMainWindow):
             print(f"应用 Cookie 失败: {str(e)}")
 
     def open_filter_dialog(self):
+        from src.dialogs.dialogs import FilterDialog
+
         dialog = FilterDialog(self.filter_params, self)
         if dialog.exec_():
             self.filter_params = dialog.get_filter_params()
             self.statusBar().showMessage("筛选设置已保存")
 
+    def open_pool_metrics(self):
+        """显示各线程池的排队深度和等待时间"""
+        from src.dialogs.dialogs import PoolMetricsDialog
+
+        dialog = PoolMetricsDialog(self.workload_pools, self)
+        dialog.exec_()
+
     def open_settings(self):
+        from src.dialogs.dialogs import SettingsDialog
+
         dialog = SettingsDialog(self.settings, self)
         if dialog.exec_():
             new_settings = dialog.get_settings()
@@ -917,8 +1072,11 @@ class Hanime1GUI(QMainWindow):
             new_font = new_settings.get("font", "Segoe UI")
             old_font_size = self.settings.get("font_size", 9)
             new_font_size = new_settings.get("font_size", 9)
+            old_download_path = self.settings.get("download_path")
 
             self.settings.update(new_settings)
+            if new_settings.get("download_path") != old_download_path:
+                self.load_library()
             self.save_settings()
 
             # 如果字体设置改变，重新应用全局样式
@@ -948,6 +1106,8 @@ class Hanime1GUI(QMainWindow):
                 # 刷新收藏夹列表
                 self.update_favorites_list()
 
+            self._apply_subscription_interval()
+
             # 更新详情显示
             self.apply_video_details_visibility()
 
@@ -957,13 +1117,7 @@ class Hanime1GUI(QMainWindow):
                     self.statusBar().showMessage("设置已保存，Cloudflare Cookie已应用")
                 else:
                     self.api.session.cookies.clear()
-                    if os.path.exists("settings.json"):
-                        with open("settings.json", "r", encoding="utf-8") as f:
-                            settings = json.load(f)
-                        if "session" in settings:
-                            del settings["session"]
-                        with open("settings.json", "w", encoding="utf-8") as f:
-                            json.dump(settings, f, ensure_ascii=False, indent=2)
+                    self.settings_store.remove("session")
                     self.statusBar().showMessage("设置已保存，Cloudflare Cookie已清除")
             else:
                 self.statusBar().showMessage("设置已保存")
@@ -1021,7 +1175,7 @@ class Hanime1GUI(QMainWindow):
         worker = SearchWorker(self.api, keyword, page, self.filter_params)
         worker.signals.result.connect(self.on_search_complete)
         worker.signals.error.connect(self.on_search_error)
-        self.threadpool.start(worker, priority=10)  # 搜索任务优先级设为 10
+        self.api_pool.start(worker, priority=10)  # 搜索任务优先级设为 10
 
     def _update_page_label(self):
         """更新页码导航标签"""
@@ -1032,6 +1186,7 @@ class Hanime1GUI(QMainWindow):
     def on_search_complete(self, search_result):
         if search_result and search_result["videos"]:
             self.current_search_results = search_result["videos"]
+            self._cancel_thumbnail_requests(self.video_list)
             self.video_list.clear()
 
             show_thumbnails = self.settings.get("show_thumbnails", False)
@@ -1046,92 +1201,147 @@ class Hanime1GUI(QMainWindow):
 
                 self.video_list.addItem(item)
 
+            self._schedule_visible_thumbnails(self.video_list)
+
             self.page_navigation.set_total_pages(search_result.get("total_pages", 1))
             # 搜索完成后更新页码导航标签
             self._update_page_label()
             self.statusBar().showMessage(f"搜索完成，找到 {len(search_result['videos'])} 个结果")
         else:
+            self._cancel_thumbnail_requests(self.video_list)
             self.video_list.clear()
             self.page_navigation.set_total_pages(1)
             # 未找到视频结果时更新页码导航标签
             self._update_page_label()
             self.statusBar().showMessage("未找到视频结果")
 
-    def _load_thumbnail_async(self, url, list_item):
-        """异步加载缩略图"""
-
-        class ThumbnailLoaderSignals(QObject):
-            finished = pyqtSignal(bytes)
+    def _cached_thumbnail(self, url):
+        pixmap = self.thumbnail_cache.get(url)
+        if pixmap is not None:
+            self.thumbnail_cache.move_to_end(url)
+        return pixmap
 
-        class ThumbnailLoader(QRunnable):
-            def __init__(self, url):
-                super().__init__()
-                self.url = url
-                self.signals = ThumbnailLoaderSignals()
+    def _cache_thumbnail(self, url, pixmap):
+        self.thumbnail_cache[url] = pixmap
+        self.thumbnail_cache.move_to_end(url)
+        while len(self.thumbnail_cache) > THUMBNAIL_MEMORY_CACHE_SIZE:
+            self.thumbnail_cache.popitem(last=False)
 
-            @pyqtSlot()
-            def run(self):
-                try:
-                    resp = requests.get(self.url, timeout=5)
-                    if resp.status_code == 200:
-                        self.signals.finished.emit(resp.content)
-                except Exception as e:
-                    logging.warning(f"Failed to load thumbnail: {e}")
+    def _load_thumbnail_async(self, url, list_item):
+        """异步加载缩略图，相同地址的请求合并为一个，GUI 线程只负责转换为 QPixmap"""
+        request = self._thumbnail_requests.get(url)
+        if request:
+            if list_item not in request["items"]:
+                request["items"].append(list_item)
+            return
 
-        def on_loaded(data):
-            # 检查设置是否仍然开启
-            if not self.settings.get("show_thumbnails", False):
-                return
+        def on_loaded(image):
+            # 不论请求是否仍被需要，渲染结果都放入内存缓存
+            pixmap = QPixmap.fromImage(image)
+            self._cache_thumbnail(url, pixmap)
 
-            # 检查 list_item 是否已被 C++ 层销毁
-            if sip.isdeleted(list_item):
+            request = self._thumbnail_requests.pop(url, None)
+            if not request:
                 return
+            if request["worker"] is not worker:
+                request["worker"].cancel()
+                self.image_pool.tryTake(request["worker"])
 
-            # 检查 item 是否还属于某个列表
-            if not list_item.listWidget():
+            # 检查设置是否仍然开启
+            if not self.settings.get("show_thumbnails", False):
                 return
 
-            pix = QPixmap()
-            pix.loadFromData(data)
-            if not pix.isNull():
-                # 缩放并美化图片：添加圆角和边框
-                target_size = QSize(200, 112)
-                pix = pix.scaled(
-                    target_size, Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation
-                )
-
-                # 创建带圆角和边框的效果
-                canvas = QPixmap(target_size)
-                canvas.fill(Qt.transparent)
-
-                painter = QPainter(canvas)
-                painter.setRenderHint(QPainter.Antialiasing)
-                painter.setRenderHint(QPainter.SmoothPixmapTransform)
-
-                # 绘制圆角矩形裁剪区域
-                path = QPainterPath()
-                path.addRoundedRect(QRectF(0, 0, target_size.width(), target_size.height()), 8, 8)
-                painter.setClipPath(path)
-
-                # 居中绘制图片
-                x = (target_size.width() - pix.width()) // 2
-                y = (target_size.height() - pix.height()) // 2
-                painter.drawPixmap(x, y, pix)
-
-                # 绘制边框
-                painter.setClipping(False)
-                painter.setPen(QPen(QColor(200, 200, 200, 150), 2))
-                painter.drawRoundedRect(
-                    QRectF(1, 1, target_size.width() - 2, target_size.height() - 2), 8, 8
-                )
-                painter.end()
+            for item in request["items"]:
+                # 检查 item 是否已被 C++ 层销毁，以及是否还属于某个列表
+                if sip.isdeleted(item) or not item.listWidget():
+                    continue
+                item.setIcon(QIcon(pixmap))
+
+        def on_failed(error):
+            # 释放请求，之后滚动到这一项时重新加载
+            request = self._thumbnail_requests.get(url)
+            if request and request["worker"] is worker:
+                del self._thumbnail_requests[url]
+
+        worker = ThumbnailWorker(url, self.thumbnail_disk_cache)
+        worker.signals.result.connect(on_loaded)
+        worker.signals.error.connect(on_failed)
+        self._thumbnail_requests[url] = {"worker": worker, "items": [list_item]}
+        self.image_pool.start(worker, priority=0)  # 缩略图加载优先级最低，设为 0
+
+    def _cancel_thumbnail_request(self, url):
+        """取消缩略图请求：尚未开始的直接从线程池移除，已开始的结果会被丢弃"""
+        request = self._thumbnail_requests.pop(url, None)
+        if request:
+            request["worker"].cancel()
+            self.image_pool.tryTake(request["worker"])
+
+    def _cancel_thumbnail_requests(self, list_widget, keep_urls=()):
+        """取消某个列表中不再需要的缩略图请求"""
+        for url, request in list(self._thumbnail_requests.items()):
+            if url in keep_urls:
+                continue
+            request["items"] = [
+                item
+                for item in request["items"]
+                if not sip.isdeleted(item)
+                and item.listWidget() is not None
+                and item.listWidget() is not list_widget
+            ]
+            if not request["items"]:
+                self._cancel_thumbnail_request(url)
 
-                self.thumbnail_cache[url] = canvas
-                list_item.setIcon(QIcon(canvas))
+    def _schedule_visible_thumbnails(self, list_widget):
+        """滚动或列表刷新后延迟加载可见行的缩略图"""
+        if not self.settings.get("show_thumbnails", False):
+            return
+        self._pending_thumbnail_lists.add(list_widget)
+        self._visible_thumbnail_timer.start()
+
+    def _load_pending_visible_thumbnails(self):
+        lists = self._pending_thumbnail_lists
+        self._pending_thumbnail_lists = set()
+        for list_widget in lists:
+            self._load_visible_thumbnails(list_widget)
+
+    def _visible_row_range(self, list_widget, margin=THUMBNAIL_PREFETCH_ROWS):
+        """返回可见区域（含预加载行）的首尾行号"""
+        count = list_widget.count()
+        if count == 0:
+            return 0, -1
+        viewport = list_widget.viewport()
+        first = list_widget.indexAt(QPoint(0, 0)).row()
+        last = list_widget.indexAt(QPoint(0, viewport.height() - 1)).row()
+        if first < 0:
+            first = 0
+        if last < 0:
+            last = count - 1
+        return max(0, first - margin), min(count - 1, last + margin)
+
+    def _load_visible_thumbnails(self, list_widget):
+        """只为可见行请求缩略图，并取消已滚出范围的请求"""
+        if not self.settings.get("show_thumbnails", False) or not list_widget.isVisible():
+            return
 
-        worker = ThumbnailLoader(url)
-        worker.signals.finished.connect(on_loaded)
-        self.threadpool.start(worker, priority=0)  # 缩略图加载优先级最低，设为 0
+        first, last = self._visible_row_range(list_widget)
+        wanted = {}
+        for row in range(first, last + 1):
+            if list_widget.isRowHidden(row):
+                continue
+            item = list_widget.item(row)
+            url = item.data(THUMBNAIL_URL_ROLE)
+            if not url or not item.icon().isNull():
+                continue
+            pixmap = self._cached_thumbnail(url)
+            if pixmap is not None:
+                item.setIcon(QIcon(pixmap))
+                continue
+            wanted.setdefault(url, []).append(item)
+
+        self._cancel_thumbnail_requests(list_widget, keep_urls=wanted)
+        for url, items in wanted.items():
+            for item in items:
+                self._load_thumbnail_async(url, item)
 
     def on_search_error(self, error):
         error_msg = str(error)
@@ -1186,7 +1396,7 @@ class Hanime1GUI(QMainWindow):
             lambda result: self.on_video_info_complete(result, video_id, search_title)
         )
         worker.signals.error.connect(lambda error: self.on_video_info_error(error, video_id))
-        self.threadpool.start(worker, priority=20)  # 详情获取优先级最高，设为 20
+        self.api_pool.start(worker, priority=20)  # 详情获取优先级最高，设为 20
 
     def on_video_info_complete(self, video_info, video_id, search_title=None):
         if video_info:
@@ -1279,7 +1489,7 @@ class Hanime1GUI(QMainWindow):
 
 
 
-    def add_to_download_queue(self, video_info, source):
+    def add_to_download_queue(self, video_info, source, replace_path=None):
         safe_title = (
             re.sub(r'[\\/:*?"<>|]', "_", video_info["title"][:100]).strip(" _")
             or f"video_{video_info['video_id']}"
@@ -1291,10 +1501,13 @@ class Hanime1GUI(QMainWindow):
         ):
             self.statusBar().showMessage("该视频已在下载队列中")
             return
+        # 队列按 video_id 保存和查找任务：重新下载时替换同一视频出错或已完成的旧任务
+        self.downloads = [d for d in self.downloads if d.get("video_id") != video_info["video_id"]]
         download_task = {
             "video_id": video_info["video_id"],
             "title": video_info["title"],
             "url": source["url"],
+            "quality_num": source.get("quality_num", 0),
             "status": "pending",
             "progress": 0,
             "size": 0,
@@ -1303,6 +1516,9 @@ class Hanime1GUI(QMainWindow):
             "retry_count": 0,
             "max_retries": 3,
         }
+        if replace_path:
+            # 升级画质：下载完成后替换这个文件，开始下载时不检查是否已存在
+            download_task["replace_path"] = replace_path
         self.downloads.append(download_task)
         self.update_download_list()
         self.statusBar().showMessage(f"视频 {video_info['title'][:20]}... 已添加到下载队列")
@@ -1322,12 +1538,13 @@ class Hanime1GUI(QMainWindow):
         return f"[{base_label}] [{download['video_id']}] {download['title'][:30]}"
 
     def _load_thumbnail_for_item(self, item, thumbnail_url, show_thumbnails):
-        """为列表项加载缩略图"""
+        """为列表项设置缩略图，未缓存的缩略图在滚动到可见区域时才加载"""
         if show_thumbnails and thumbnail_url:
-            if thumbnail_url in self.thumbnail_cache:
-                item.setIcon(QIcon(self.thumbnail_cache[thumbnail_url]))
+            pixmap = self._cached_thumbnail(thumbnail_url)
+            if pixmap is not None:
+                item.setIcon(QIcon(pixmap))
             else:
-                self._load_thumbnail_async(thumbnail_url, item)
+                item.setData(THUMBNAIL_URL_ROLE, thumbnail_url)
 
     def _check_existing_file(self, download_path, filename, naming_rule, download):
         """检查文件是否已存在，返回是否应该跳过下载"""
@@ -1340,21 +1557,19 @@ class Hanime1GUI(QMainWindow):
         # 检查是否存在标题相同的视频文件（考虑仅标题保存格式的情况）
         if "{title}" in naming_rule:
             safe_title_only = re.sub(r'[\\/:*?"<>|]', "_", download["title"][:100]).strip(" _")
-            if safe_title_only and os.path.exists(download_path):
-                for existing_file in os.listdir(download_path):
-                    if existing_file.endswith(".mp4"):
-                        existing_name = os.path.splitext(existing_file)[0]
-                        if existing_name == safe_title_only:
-                            self.statusBar().showMessage(f"标题相同的视频 {existing_file} 已存在，跳过下载")
-                            return True
+            existing = safe_title_only and self.library.find_by_title(safe_title_only)
+            if existing:
+                existing_file = os.path.basename(existing["path"])
+                self.statusBar().showMessage(f"标题相同的视频 {existing_file} 已存在，跳过下载")
+                return True
 
         # 检查是否存在视频ID相同的视频文件
         if "{video_id}" in naming_rule or naming_rule == "{title}":
-            if os.path.exists(download_path):
-                for existing_file in os.listdir(download_path):
-                    if existing_file.endswith(".mp4") and download["video_id"] in existing_file:
-                        self.statusBar().showMessage(f"视频ID相同的视频 {existing_file} 已存在，跳过下载")
-                        return True
+            existing = self.library.find_by_video_id(download["video_id"])
+            if existing:
+                existing_file = os.path.basename(existing["path"])
+                self.statusBar().showMessage(f"视频ID相同的视频 {existing_file} 已存在，跳过下载")
+                return True
 
         return False
 
@@ -1366,16 +1581,21 @@ class Hanime1GUI(QMainWindow):
             self.progress_timer.start(20)
 
     def update_download_list(self):
+        self._schedule_download_queue_save()
         self.download_list.clear()
         any_downloading = False
         any_paused = False
+        pending_count = 0
         for download in self.downloads:
             if download["status"] == "downloading":
                 any_downloading = True
             elif download["status"] == "paused":
                 any_paused = True
+            elif download["status"] == "pending":
+                pending_count += 1
             text = self._format_download_item_text(download)
             self.download_list.addItem(text)
+        self.pending_download_count = pending_count
 
         # 更新切换按钮文本: 开始 -> 暂停 -> 继续 -> 开始
         if any_downloading:
@@ -1418,6 +1638,7 @@ class Hanime1GUI(QMainWindow):
         for i, d in enumerate(self.downloads):
             d["priority"] = i
 
+        self._schedule_download_queue_save()
         self.statusBar().showMessage(f"已调整 {len(moved_items)} 个任务的顺序", 2000)
 
     def on_toggle_download(self):
@@ -1438,17 +1659,52 @@ class Hanime1GUI(QMainWindow):
                 self.on_start_download()
 
     def on_start_download(self):
+        self._start_queued_downloads(["pending", "paused"])
+
+    def start_pending_downloads(self):
+        """只启动等待中的任务，不恢复用户暂停的任务"""
+        self._start_queued_downloads(["pending"])
+
+    def _start_queued_downloads(self, statuses):
         max_simultaneous = self.settings.get("max_simultaneous_downloads", 2)
         available_slots = max_simultaneous - len(self.active_downloads)
         if available_slots <= 0:
             return
+        admission = self._disk_space_admission()
         started_count = 0
+        held_count = 0
         for i, download in enumerate(self.downloads):
-            if download["status"] in ["pending", "paused"]:
+            if download["status"] in statuses:
+                if not admission.try_reserve(download):
+                    held_count += 1
+                    continue
                 self.start_download(i)
                 started_count += 1
                 if started_count >= available_slots:
                     break
+        self._hold_for_disk_space(held_count)
+
+    def _disk_space_admission(self, exclude=None):
+        """按磁盘剩余空间和正在下载的任务（exclude 除外）还需要的空间，检查能否再启动新任务"""
+        download_path = self.settings.get(
+            "download_path", os.path.join(os.getcwd(), "hanimeDownload")
+        )
+        num_threads = (
+            self.settings["num_threads"] if self.settings["download_mode"] == "multi_thread" else 1
+        )
+        admission = DiskSpaceAdmission(self.temp_download_dir, download_path, num_threads)
+        for download in self.downloads:
+            if download["status"] == "downloading" and download is not exclude:
+                admission.reserve(download)
+        return admission
+
+    def _hold_for_disk_space(self, held_count):
+        """有任务因空间不足未启动时提示，并在稍后重新检查"""
+        if held_count:
+            self.statusBar().showMessage(f"磁盘空间不足，{held_count} 个任务等待空间释放后开始")
+            self.disk_space_timer.start()
+        else:
+            self.disk_space_timer.stop()
 
     def start_download(self, index):
         if 0 <= index < len(self.downloads):
@@ -1472,7 +1728,9 @@ class Hanime1GUI(QMainWindow):
                 )
 
                 # 检查文件是否已存在
-                if self._check_existing_file(download_path, filename, naming_rule, download):
+                if not download.get("replace_path") and self._check_existing_file(
+                    download_path, filename, naming_rule, download
+                ):
                     del self.downloads[index]
                     self.update_download_list()
                     self.on_start_download()
@@ -1490,8 +1748,7 @@ class Hanime1GUI(QMainWindow):
                     if self.settings["download_mode"] == "multi_thread"
                     else 1
                 )
-                # 获取已下载的大小，用于断点续传
-                downloaded_size = download.get("size", 0)
+                # 断点续传以临时目录中分片文件的实际大小为准
                 worker = DownloadWorker(
                     download["url"],
                     filename,
@@ -1499,7 +1756,11 @@ class Hanime1GUI(QMainWindow):
                     num_threads,
                     self.api.session.headers,
                     self.api.session.cookies.get_dict(),
-                    downloaded_size,
+                    url_refresher=functools.partial(
+                        self.api.refresh_video_source,
+                        download["video_id"],
+                        download.get("quality_num", 0),
+                    ),
                 )
                 worker.video_id = download["video_id"]
                 worker.signals.progress.connect(
@@ -1535,12 +1796,13 @@ class Hanime1GUI(QMainWindow):
                 except Exception as e:
                     logging.warning(f"Failed to send initial progress: {e}")
 
-                self.threadpool.start(worker, priority=5)
+                self.download_pool.start(worker, priority=5)
                 self.statusBar().showMessage(f"开始下载视频 {download['title'][:20]}...")
 
     def on_download_progress_by_id(self, progress_info, video_id):
         for i, download in enumerate(self.downloads):
             if download.get("video_id") == video_id:
+                size_learned = not download.get("total_size") and progress_info["total_size"]
                 self.downloads[i].update(
                     {
                         "progress": progress_info["progress"],
@@ -1548,10 +1810,26 @@ class Hanime1GUI(QMainWindow):
                         "total_size": progress_info["total_size"],
                     }
                 )
+                # 下载途中链接过期后会换成新链接，记录下来供继续下载时使用
+                if progress_info.get("url"):
+                    self.downloads[i]["url"] = progress_info["url"]
+                if size_learned and download["status"] == "downloading":
+                    self._recheck_disk_space(download)
+                self._schedule_download_queue_save()
                 self._update_single_download_row_by_index(i)
                 self.calculate_and_update_overall_progress()
                 break
 
+    def _recheck_disk_space(self, download):
+        """开始时大小未知的任务，得到大小后重新检查空间，放不下时退回等待"""
+        if self._disk_space_admission(exclude=download).try_reserve(download):
+            return
+        worker = self.active_downloads.pop(download["video_id"], None)
+        if worker is not None:
+            worker.cancel()
+        download["status"] = "pending"
+        self._hold_for_disk_space(1)
+
     def set_progress_bar_status(self, status):
         """设置进度条状态，显示不同颜色"""
         if status == "downloading":
@@ -1693,21 +1971,31 @@ class Hanime1GUI(QMainWindow):
                     os.makedirs(os.path.dirname(final_file), exist_ok=True)
                     # 使用shutil.move移动文件
                     shutil.move(temp_file, final_file)
+                    # 升级画质的任务在新文件移动到位后再删除旧文件，新旧文件同名时已被覆盖
+                    replace_path = download.get("replace_path")
+                    if (
+                        replace_path
+                        and os.path.normcase(os.path.abspath(replace_path))
+                        != os.path.normcase(os.path.abspath(final_file))
+                        and os.path.exists(replace_path)
+                    ):
+                        os.remove(replace_path)
+                    self.library.add_file(final_file, download["video_id"], download.get("quality_num", 0))
+                    self._watch_library()
                     self.statusBar().showMessage(f"视频已移动到: {final_file}")
                 else:
                     self.statusBar().showMessage(f"临时文件不存在: {temp_file}")
             except Exception as e:
                 self.statusBar().showMessage(f"文件移动失败: {str(e)}")
-            self.download_history.append(
-                {
-                    "video_id": download["video_id"],
-                    "title": download["title"],
-                    "filename": download.get("filename", ""),
-                    "download_date": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                }
-            )
-            self.save_download_history()
-            self.update_history_list()
+            history_entry = {
+                "video_id": download["video_id"],
+                "title": download["title"],
+                "filename": download.get("filename", ""),
+                "download_date": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            self.download_history.append(history_entry)
+            self.store.add_history(history_entry)
+            self._prepend_history_item(history_entry)
             self.update_download_list()
             # 强制重置进度条状态
             self.current_progress = 0
@@ -1757,7 +2045,7 @@ class Hanime1GUI(QMainWindow):
             worker.signals.result.connect(
                 lambda info, idx=i: self.on_video_info_for_retry(info, idx)
             )
-            self.threadpool.start(worker, priority=20)
+            self.api_pool.start(worker, priority=20)
 
     def on_video_info_for_retry(self, video_info, index):
         if video_info and video_info["video_sources"]:
@@ -1767,16 +2055,22 @@ class Hanime1GUI(QMainWindow):
                 if quality == "最高"
                 else video_info["video_sources"][-1]
             )
-            self.downloads[index].update({"url": source["url"], "status": "downloading"})
+            self.downloads[index].update(
+                {
+                    "url": source["url"],
+                    "quality_num": source.get("quality_num", 0),
+                    "status": "downloading",
+                }
+            )
             self.start_download(index)
 
     def on_pause_download(self):
         if not self._can_run_action("pause"):
             return
 
-        # 暂停所有active_downloads中的worker
+        # 取消所有active_downloads中的worker，释放下载线程；分片保留，继续时从断点下载
         for vid, worker in list(self.active_downloads.items()):
-            worker.pause()
+            worker.cancel()
             for i, d in enumerate(self.downloads):
                 if d.get("video_id") == vid:
                     self.downloads[i]["status"] = "paused"
@@ -1806,15 +2100,23 @@ class Hanime1GUI(QMainWindow):
             return
 
         # 重新启动暂停的任务
+        admission = self._disk_space_admission()
         started_count = 0
+        held_count = 0
         for i in paused_tasks:
             download = self.downloads[i]
             if download["status"] == "paused":
+                if not admission.try_reserve(download):
+                    # 用户已要求继续，改为等待中，空间释放后由定时检查启动
+                    download["status"] = "pending"
+                    held_count += 1
+                    continue
                 # 重新启动暂停的任务
                 self.start_download(i)
                 started_count += 1
                 if started_count >= available_slots:
                     break
+        self._hold_for_disk_space(held_count)
 
         self.update_download_list()
         self.calculate_and_update_overall_progress()
@@ -1835,20 +2137,74 @@ class Hanime1GUI(QMainWindow):
         except Exception as e:
             logging.warning(f"Failed to create temp download dir: {e}")
 
-    def _clear_temp_download_folder(self):
+    def _clear_orphan_temp_files(self):
+        """删除已移出下载队列的任务留在临时文件夹中的分片
+
+        临时文件夹与命令行工具和下载守护进程共用，只删除本程序的下载队列曾经拥有的文件。
+        """
+        try:
+            removed = set(self.store.pop_removed_temp_files())
+        except Exception as e:
+            logging.warning(f"Failed to load removed download tasks: {e}")
+            return
+        # 重新加入队列的任务继续使用原来的分片
+        removed -= {d["filename"] for d in self.downloads if d.get("filename")}
+        if not removed:
+            return
+        try:
+            names = os.listdir(self.temp_download_dir)
+        except OSError:
+            return
+        for name in names:
+            base, sep, index = name.rpartition(".part")
+            if name in removed or (sep and index.isdigit() and base in removed):
+                path = os.path.join(self.temp_download_dir, name)
+                try:
+                    if os.path.isfile(path):
+                        os.remove(path)
+                except Exception as e:
+                    logging.warning(f"Failed to remove {path}: {e}")
+
+    def restore_download_queue(self):
+        """恢复上次退出时未完成的下载队列，并继续下载"""
+        try:
+            tasks = self.store.load_download_queue()
+        except Exception as e:
+            logging.warning(f"Failed to load download queue: {e}")
+            tasks = []
+        for task in tasks:
+            # 退出时正在下载的任务从分片处继续
+            if task.get("status") == "downloading":
+                task["status"] = "pending"
+        self.downloads = tasks
+        self._clear_orphan_temp_files()
+        self.update_download_list()
+        self.calculate_and_update_overall_progress()
+        if any(d["status"] == "pending" for d in self.downloads):
+            self.statusBar().showMessage(f"已恢复 {len(self.downloads)} 个下载任务")
+            QTimer.singleShot(0, self.start_pending_downloads)
+
+    def _schedule_download_queue_save(self):
+        if not self.download_queue_timer.isActive():
+            self.download_queue_timer.start()
+
+    def save_download_queue(self):
+        """只把新增、变化和移除的任务写入数据库"""
+        saved = {}
+        changed = []
+        for position, download in enumerate(self.downloads):
+            data = json.dumps(download, ensure_ascii=False, sort_keys=True, default=str)
+            saved[download["video_id"]] = (position, data)
+            if self._saved_download_queue.get(download["video_id"]) != (position, data):
+                changed.append((position, download))
+        removed = [vid for vid in self._saved_download_queue if vid not in saved]
+        if not changed and not removed:
+            return
         try:
-            if os.path.exists(self.temp_download_dir):
-                for name in os.listdir(self.temp_download_dir):
-                    path = os.path.join(self.temp_download_dir, name)
-                    try:
-                        if os.path.isfile(path) or os.path.islink(path):
-                            os.remove(path)
-                        elif os.path.isdir(path):
-                            shutil.rmtree(path)
-                    except Exception as e:
-                        logging.warning(f"Failed to remove {path}: {e}")
+            self.store.save_download_tasks(changed, removed)
+            self._saved_download_queue = saved
         except Exception as e:
-            logging.warning(f"Failed to clear temp folder: {e}")
+            logging.warning(f"Failed to save download queue: {e}")
 
 
 
@@ -1901,6 +2257,7 @@ class Hanime1GUI(QMainWindow):
             menu.addAction("下载").triggered.connect(
                 lambda: self.on_download_from_menu(selected_items)
             )
+            menu.addAction("下载整个系列").triggered.connect(self.on_download_series)
             menu.addAction("添加到收藏夹").triggered.connect(
                 lambda: self.on_add_to_favorites_from_menu(selected_items)
             )
@@ -1914,11 +2271,149 @@ class Hanime1GUI(QMainWindow):
                 list_title = match.group(2)
                 worker = GetVideoInfoWorker(self.api, video_id, None)  # 菜单下载需要完整信息
                 worker.signals.result.connect(lambda result, title=list_title: self.on_video_info_for_download(result, title))
-                self.threadpool.start(worker, priority=20)
+                self.api_pool.start(worker, priority=20)
 
+    def on_download_series(self):
+        """解析整个系列的视频源，解析完一集就加入下载队列并开始下载"""
+        series = (self.current_video_info or {}).get("series") or []
+        if not series:
+            self.statusBar().showMessage("当前视频没有系列信息")
+            return
+        self.start_batch_download(series, "系列")
 
-    
+    def on_download_search_results(self):
+        """把当前关键词和筛选条件下前几页的搜索结果全部加入下载队列，正在解析时再次点击则停止"""
+        if self.search_batch_worker is not None:
+            self.search_batch_worker.cancel()
+            self.statusBar().showMessage("已停止批量下载，已加入队列的任务不受影响")
+            return
+        keyword = self.search_input.currentText().strip()
+        pages, ok = QInputDialog.getInt(
+            self, "批量下载", "下载前几页搜索结果:", max(1, self.page_navigation.total_pages), 1, 9999
+        )
+        if not ok:
+            return
+        filter_params = dict(self.filter_params, tags=list(self.filter_params.get("tags", [])))
+        worker = self.start_batch_download(
+            crawl_search(self.api, keyword, filter_params, pages), "搜索结果"
+        )
+        worker.signals.finished.connect(self.on_search_batch_finished)
+        self.search_batch_worker = worker
+        self.batch_download_button.setText("停止批量下载")
+
+    def on_search_batch_finished(self):
+        self.search_batch_worker = None
+        self.batch_download_button.setText("批量下载")
+
+    def start_batch_download(self, videos, label):
+        """在后台批量解析视频源，videos 为含 video_id 和 title 的字典（可以是生成器）"""
+        worker = SourceResolveWorker(
+            self.api,
+            videos,
+            self.settings.get("download_quality", "最高"),
+            backlog=lambda: self.pending_download_count,
+            max_backlog=BATCH_MAX_PENDING_DOWNLOADS,
+        )
+        worker.signals.result.connect(self.on_batch_source_resolved)
+        worker.signals.progress.connect(
+            lambda info: self.statusBar().showMessage(
+                f"正在解析{label}: 已加入 {info['resolved']} 个，失败 {info['failed']} 个"
+            )
+        )
+        worker.signals.error.connect(
+            lambda error: self.statusBar().showMessage(f"解析{label}失败: {error}")
+        )
+        worker.signals.finished.connect(lambda: self.on_batch_resolve_finished(worker))
+        self.resolve_workers.add(worker)
+        self.cancel_batch_button.setEnabled(True)
+        self.batch_pool.start(worker)
+        self.statusBar().showMessage(f"正在解析{label}...")
+        return worker
+
+    def subscribe_current_search(self):
+        """把当前关键词和筛选条件保存为订阅，按最新上传排序检查新视频"""
+        keyword = self.search_input.currentText().strip()
+        filter_params = dict(self.filter_params, tags=list(self.filter_params.get("tags", [])))
+        if not filter_params.get("sort"):
+            filter_params["sort"] = "最新上傳"
+        default_name = keyword or " ".join(filter_params["tags"]) or filter_params["genre"] or "订阅"
+        name, ok = QInputDialog.getText(self, "订阅当前搜索", "订阅名称:", text=default_name)
+        name = name.strip()
+        if not ok or not name:
+            return
+        if any(s["name"] == name for s in self.subscriptions):
+            QMessageBox.warning(self, "订阅", f"已存在名为 {name} 的订阅")
+            return
+        subscription = new_subscription(name, keyword, filter_params)
+        self.subscriptions.append(subscription)
+        self.store.save_subscription(subscription)
+        # 首次检查只记录当前最新的视频，之后的新视频才会自动下载
+        self.check_subscriptions([subscription])
+        self.statusBar().showMessage(f"已订阅 {name}，之后上传的新视频会自动下载")
+
+    def remove_subscription(self, name):
+        self.subscriptions = [s for s in self.subscriptions if s["name"] != name]
+        self.store.delete_subscription(name)
+
+    def open_subscriptions_dialog(self):
+        from src.dialogs.dialogs import SubscriptionsDialog
+
+        self.subscriptions_dialog = SubscriptionsDialog(self)
+        self.subscriptions_dialog.exec_()
+        self.subscriptions_dialog = None
+
+    def _apply_subscription_interval(self):
+        minutes = self.settings.get("subscription_interval", 60)
+        if minutes > 0:
+            self.subscription_timer.start(minutes * 60 * 1000)
+        else:
+            self.subscription_timer.stop()
 
+    def check_subscriptions(self, subscriptions=None):
+        """在后台检查订阅，上一次检查未结束时跳过"""
+        if self.subscription_worker is not None:
+            return
+        subscriptions = [dict(s) for s in (subscriptions or self.subscriptions)]
+        if not subscriptions:
+            return
+        worker = SubscriptionWorker(self.api, subscriptions)
+        worker.signals.result.connect(self.on_subscription_checked)
+        worker.signals.error.connect(
+            lambda error: self.statusBar().showMessage(f"检查订阅失败: {error}")
+        )
+        worker.signals.finished.connect(self.on_subscriptions_check_finished)
+        self.subscription_worker = worker
+        self.api_pool.start(worker, priority=0)
+
+    def on_subscription_checked(self, result):
+        subscription = next((s for s in self.subscriptions if s["name"] == result["name"]), None)
+        if subscription is None:  # 检查期间已被删除
+            return
+        subscription["seen_ids"] = result["seen_ids"]
+        subscription["last_checked"] = result["last_checked"]
+        self.store.save_subscription(subscription)
+        if self.subscriptions_dialog is not None:
+            self.subscriptions_dialog.refresh()
+        if result["new_videos"]:
+            self.start_batch_download(result["new_videos"], f"订阅 {result['name']} 的新视频")
+
+    def on_subscriptions_check_finished(self):
+        self.subscription_worker = None
+
+    def on_batch_source_resolved(self, task):
+        self.add_to_download_queue({"video_id": task["video_id"], "title": task["title"]}, task)
+        self.start_pending_downloads()
+
+    def on_batch_resolve_finished(self, worker):
+        self.resolve_workers.discard(worker)
+        self.cancel_batch_button.setEnabled(bool(self.resolve_workers))
+
+    def cancel_batch_downloads(self):
+        """停止所有正在进行的批量解析，已加入下载队列的任务不受影响"""
+        for worker in list(self.resolve_workers):
+            worker.cancel()
+        self.cancel_batch_button.setEnabled(False)
+        self.statusBar().showMessage("已取消批量解析")
 
     def on_browser_play_from_menu(self, items):
         """从右键菜单使用浏览器播放视频"""
@@ -1931,7 +2426,7 @@ class Hanime1GUI(QMainWindow):
                 worker = GetVideoInfoWorker(self.api, video_id, None)  # 需要完整信息以获取视频源
                 worker.signals.result.connect(self.on_video_info_for_browser_play)
                 worker.signals.error.connect(lambda error: self.statusBar().showMessage(f"获取视频信息失败: {error}"))
-                self.threadpool.start(worker, priority=20)
+                self.api_pool.start(worker, priority=20)
                 self.statusBar().showMessage(f"正在获取视频信息...")
     
     def on_video_info_for_browser_play(self, video_info):
@@ -1967,32 +2462,24 @@ class Hanime1GUI(QMainWindow):
 
 
     def load_favorites(self):
-        if os.path.exists(self.favorites_file):
-            try:
-                with open(self.favorites_file, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    self.favorites = {"默认收藏夹": data} if isinstance(data, list) else data
-            except Exception as e:
-                logging.warning(f"Failed to load favorites: {e}")
-                self.favorites = {"默认收藏夹": []}
-        else:
-            self.favorites = {"默认收藏夹": []}
-        self.update_folder_combobox()
-
-    def save_favorites(self):
         try:
-            with open(self.favorites_file, "w", encoding="utf-8") as f:
-                json.dump(self.favorites, f, ensure_ascii=False, indent=2)
+            self.favorites = self.store.load_favorites()
         except Exception as e:
-            logging.warning(f"Failed to save favorites: {e}")
+            logging.warning(f"Failed to load favorites: {e}")
+            self.favorites = {}
+        if not self.favorites:
+            self.favorites = {"默认收藏夹": []}
+            self.store.create_folder("默认收藏夹")
+        self.update_folder_combobox()
 
     def update_favorites_list(self):
-        if hasattr(self, "_original_favorites"):
-            delattr(self, "_original_favorites")
+        self._favorites_index = None
+        self._cancel_thumbnail_requests(self.favorites_list)
         self.favorites_list.clear()
         folder = self.current_favorite_folder
         if folder not in self.favorites:
             self.favorites[folder] = []
+            self.store.create_folder(folder)
 
         show_thumbnails = self.settings.get("show_thumbnails", False)
         if show_thumbnails:
@@ -2005,6 +2492,12 @@ class Hanime1GUI(QMainWindow):
 
             self.favorites_list.addItem(item)
 
+        # 列表刷新后保留当前的搜索过滤
+        if self.favorites_search_input.text().strip():
+            self._apply_favorites_filter()
+        else:
+            self._schedule_visible_thumbnails(self.favorites_list)
+
     def update_folder_combobox(self):
         self.folder_combobox.blockSignals(True)
         cur = self.folder_combobox.currentText()
@@ -2099,7 +2592,7 @@ class Hanime1GUI(QMainWindow):
         name, ok = self.create_custom_input_dialog("新建收藏夹", "请输入名称:")
         if ok and name.strip() and name.strip() not in self.favorites:
             self.favorites[name.strip()] = []
-            self.save_favorites()
+            self.store.create_folder(name.strip())
             self.update_folder_combobox()
             self.folder_combobox.setCurrentText(name.strip())
 
@@ -2116,33 +2609,46 @@ class Hanime1GUI(QMainWindow):
         ):
             if cur in self.favorites:
                 del self.favorites[cur]
-                self.save_favorites()
+                self.store.delete_folder(cur)
                 self.update_folder_combobox()
 
     def on_rename_folder(self):
         cur = self.folder_combobox.currentText()
         name, ok = self.create_custom_input_dialog("重命名", f"重命名 '{cur}' 为:", cur)
         if ok and name.strip() and name.strip() != cur and name.strip() not in self.favorites:
-            self.favorites[name.strip()] = self.favorites.pop(cur)
-            self.save_favorites()
+            # 重建字典以保持收藏夹的原有顺序
+            self.favorites = {
+                (name.strip() if folder == cur else folder): videos
+                for folder, videos in self.favorites.items()
+            }
+            self.store.rename_folder(cur, name.strip())
             self.update_folder_combobox()
             self.folder_combobox.setCurrentText(name.strip())
 
     def on_favorites_search(self, text):
-        if not hasattr(self, "_original_favorites"):
-            self._original_favorites = self.favorites.get(self.current_favorite_folder, [])
-        self.favorites_list.clear()
-        search = text.lower()
-
-        show_thumbnails = self.settings.get("show_thumbnails", False)
-
-        for fav in self._original_favorites:
-            if not search or search in fav["title"].lower() or search in fav.get("video_id", ""):
-                item = QListWidgetItem(f"[{fav['video_id']}] {fav['title']}")
+        """输入防抖，停止输入后再过滤收藏夹"""
+        self._favorites_search_timer.start()
+
+    def _apply_favorites_filter(self):
+        """使用索引过滤收藏夹，只隐藏/显示行而不重建列表项"""
+        text = self.favorites_search_input.text()
+        if self._favorites_index is None:
+            self._favorites_index = FavoritesIndex(
+                self.favorites.get(self.current_favorite_folder, [])
+            )
+        matched = self._favorites_index.search(text)
 
-                self._load_thumbnail_for_item(item, fav.get("thumbnail"), show_thumbnails)
+        self.favorites_list.setUpdatesEnabled(False)
+        try:
+            for row in range(self.favorites_list.count()):
+                hidden = row not in matched
+                if hidden:
+                    self.favorites_list.item(row).setSelected(False)
+                self.favorites_list.setRowHidden(row, hidden)
+        finally:
+            self.favorites_list.setUpdatesEnabled(True)
 
-                self.favorites_list.addItem(item)
+        self._schedule_visible_thumbnails(self.favorites_list)
 
     def on_export_favorites(self):
         menu = QMenu(self)
@@ -2183,16 +2689,17 @@ class Hanime1GUI(QMainWindow):
                         )
                         if btn == 0:
                             exist_ids = {v["video_id"] for v in self.favorites[name]}
-                            self.favorites[name].extend(
-                                [v for v in vids if v["video_id"] not in exist_ids]
-                            )
+                            new_vids = [v for v in vids if v["video_id"] not in exist_ids]
+                            self.favorites[name].extend(new_vids)
+                            self.store.add_favorites(name, new_vids)
                         elif btn == 1:
                             new_name, ok = QInputDialog.getText(self, "重命名", "新名称:")
                             if ok and new_name.strip():
                                 self.favorites[new_name.strip()] = vids
+                                self.store.replace_folder(new_name.strip(), vids)
                     else:
                         self.favorites[name] = vids
-                self.save_favorites()
+                        self.store.replace_folder(name, vids)
                 self.update_folder_combobox()
             except Exception as e:
                 logging.warning(f"Failed to import favorites: {e}")
@@ -2215,6 +2722,7 @@ class Hanime1GUI(QMainWindow):
         names = list(self.favorites.keys())
         folder, ok = self.create_custom_choice_dialog("选择收藏夹", "选择:", names)
         if ok and folder:
+            added = []
             for item in items:
                 match = re.search(r"\[(\d+)]\s*(.+)", item.text())
                 if match:
@@ -2226,15 +2734,15 @@ class Hanime1GUI(QMainWindow):
                             if v["video_id"] == vid:
                                 thumbnail = v.get("thumbnail", "")
                                 break
-                        self.favorites[folder].append(
-                            {
-                                "video_id": vid,
-                                "title": title,
-                                "thumbnail": thumbnail,
-                                "url": f"https://hanime1.me/watch?v={vid}",
-                            }
-                        )
-            self.save_favorites()
+                        entry = {
+                            "video_id": vid,
+                            "title": title,
+                            "thumbnail": thumbnail,
+                            "url": f"https://hanime1.me/watch?v={vid}",
+                        }
+                        self.favorites[folder].append(entry)
+                        added.append(entry)
+            self.store.add_favorites(folder, added)
             self.update_favorites_list()
 
     def on_remove_from_favorites(self, items):
@@ -2247,7 +2755,7 @@ class Hanime1GUI(QMainWindow):
             self.favorites[self.current_favorite_folder] = [
                 f for f in self.favorites[self.current_favorite_folder] if f["video_id"] not in vids
             ]
-            self.save_favorites()
+            self.store.remove_favorites(self.current_favorite_folder, vids)
             self.update_favorites_list()
 
     def on_favorite_selected(self, item):
@@ -2268,7 +2776,7 @@ class Hanime1GUI(QMainWindow):
                     self.api, match.group(1), None
                 )  # 收藏夹下载需要完整信息
                 worker.signals.result.connect(self.on_video_info_for_download)
-                self.threadpool.start(worker, priority=20)
+                self.api_pool.start(worker, priority=20)
 
     def show_download_context_menu(self, pos):
         selected_items = self.download_list.selectedItems()
@@ -2300,19 +2808,31 @@ class Hanime1GUI(QMainWindow):
             if 0 <= idx < len(self.downloads):
                 download = self.downloads[idx]
                 if download["status"] == "downloading":
-                    vid = download["video_id"]
-                    if vid in self.active_downloads:
-                        self.active_downloads[vid].pause()
-                        download["status"] = "paused"
+                    # 与全部暂停相同：取消 worker 释放下载线程，分片保留，继续时从断点下载
+                    worker = self.active_downloads.pop(download["video_id"], None)
+                    if worker is not None:
+                        worker.cancel()
+                    download["status"] = "paused"
         self.update_download_list()
+        # 空出的槽位留给等待中的任务
+        self.start_pending_downloads()
 
     def on_start_selected_downloads(self, items):
+        admission = self._disk_space_admission()
+        held_count = 0
         for item in items:
             idx = self.download_list.row(item)
             if 0 <= idx < len(self.downloads):
                 download = self.downloads[idx]
                 if download["status"] in ["pending", "paused"]:
+                    if not admission.try_reserve(download):
+                        download["status"] = "pending"
+                        held_count += 1
+                        continue
                     self.start_download(idx)
+        self._hold_for_disk_space(held_count)
+        if held_count:
+            self.update_download_list()
 
 
 
@@ -2329,26 +2849,113 @@ class Hanime1GUI(QMainWindow):
         self.calculate_and_update_overall_progress()
 
     def load_download_history(self):
-        if os.path.exists(self.history_file):
+        try:
+            self.download_history = self.store.load_history()
+        except Exception as e:
+            logging.warning(f"Failed to load download history: {e}")
+            self.download_history = []
+
+    def load_library(self):
+        """载入下载目录的视频索引，下载目录改变时重新载入"""
+        download_path = self.settings.get(
+            "download_path", os.path.join(os.getcwd(), "hanimeDownload")
+        )
+        self.library.load(download_path, self._history_video_ids())
+        self._watch_library()
+
+    def _watch_library(self):
+        directories = self.library_watcher.directories()
+        if directories == [self.library.root]:
+            return
+        if directories:
+            self.library_watcher.removePaths(directories)
+        if os.path.isdir(self.library.root):
+            self.library_watcher.addPath(self.library.root)
+
+    def refresh_library(self):
+        self.library.refresh(self._history_video_ids())
+
+    def on_analyze_library(self):
+        """在后台分析本地视频，完成后显示整理计划"""
+        if self.library_plan_worker is not None:
+            return
+        stage_labels = {"quality": "读取本地画质", "sources": "查询视频源"}
+        worker = LibraryPlanWorker(self.api, list(self.library.files.values()))
+        worker.signals.progress.connect(
+            lambda info: self.statusBar().showMessage(
+                f"正在整理视频库: {stage_labels[info['stage']]} {info['done']}/{info['total']}"
+            )
+        )
+        worker.signals.result.connect(self.on_library_plan_ready)
+        worker.signals.error.connect(
+            lambda error: self.statusBar().showMessage(f"整理视频库失败: {error}")
+        )
+        worker.signals.finished.connect(self.on_library_plan_finished)
+        self.library_plan_worker = worker
+        self.library_plan_button.setEnabled(False)
+        self.api_pool.start(worker, priority=0)
+        self.statusBar().showMessage("正在整理视频库...")
+
+    def on_library_plan_finished(self):
+        self.library_plan_worker = None
+        self.library_plan_button.setEnabled(True)
+
+    def on_library_plan_ready(self, plan):
+        from src.dialogs.dialogs import LibraryPlanDialog
+
+        self.statusBar().showMessage("视频库分析完成")
+        if not plan["duplicates"] and not plan["upgrades"]:
+            QMessageBox.information(self, "整理视频库", "没有发现重复或可以升级画质的视频")
+            return
+        LibraryPlanDialog(plan, self).exec_()
+
+    def delete_library_files(self, paths):
+        failed = 0
+        for path in paths:
             try:
-                with open(self.history_file, "r", encoding="utf-8") as f:
-                    self.download_history = json.load(f)
-            except:
-                self.download_history = []
+                os.remove(path)
+            except OSError as e:
+                failed += 1
+                logging.warning(f"Failed to delete {path}: {e}")
+        self.refresh_library()
+        self.statusBar().showMessage(
+            f"已删除 {len(paths) - failed} 个重复文件" + (f"，{failed} 个删除失败" if failed else "")
+        )
 
-    def save_download_history(self):
-        try:
-            with open(self.history_file, "w", encoding="utf-8") as f:
-                json.dump(self.download_history, f, ensure_ascii=False, indent=2)
-        except:
-            pass
+    def queue_library_upgrades(self, upgrades):
+        for upgrade in upgrades:
+            self.add_to_download_queue(
+                {"video_id": upgrade["video_id"], "title": upgrade["title"]},
+                upgrade,
+                replace_path=upgrade["path"],
+            )
+        self.start_pending_downloads()
+        self.statusBar().showMessage(f"已将 {len(upgrades)} 个视频加入下载队列以升级画质")
+
+    def _history_video_ids(self):
+        """下载历史中的 {文件名: video_id}，用于识别仅以标题命名的文件"""
+        return {
+            entry["filename"]: entry["video_id"]
+            for entry in self.download_history
+            if entry.get("filename")
+        }
+
+    def _format_history_item_text(self, item):
+        return f"[{item['video_id']}] {item['title'][:30]}... - {item['download_date']}"
 
     def update_history_list(self):
-        self.history_list.clear()
-        for item in reversed(self.download_history):
-            self.history_list.addItem(
-                f"[{item['video_id']}] {item['title'][:30]}... - {item['download_date']}"
+        self.history_list.setUpdatesEnabled(False)
+        try:
+            self.history_list.clear()
+            self.history_list.addItems(
+                [self._format_history_item_text(item) for item in reversed(self.download_history)]
             )
+        finally:
+            self.history_list.setUpdatesEnabled(True)
+
+    def _prepend_history_item(self, item):
+        """新完成的下载只插入一行，不重建整个历史列表"""
+        self.history_list.insertItem(0, self._format_history_item_text(item))
 
     def refresh_download_history(self):
         self.load_download_history()
@@ -2360,7 +2967,7 @@ class Hanime1GUI(QMainWindow):
             == QMessageBox.Yes
         ):
             self.download_history = []
-            self.save_download_history()
+            self.store.clear_history()
             self.update_history_list()
 
     def show_history_context_menu(self, pos):
@@ -2494,8 +3101,8 @@ class Hanime1GUI(QMainWindow):
         worker.signals.finished.connect(on_cover_loaded)
         worker.signals.error.connect(on_cover_error)
 
-        # 使用实例线程池执行任务，优先级设为 15 (高于缩略图)
-        self.threadpool.start(worker, priority=15)
+        # 使用图片线程池执行任务，优先级设为 15 (高于缩略图)
+        self.image_pool.start(worker, priority=15)
 
     def on_related_video_clicked(self, item):
         match = re.search(r"\[(\d+)]\s*(.+)", item.text())
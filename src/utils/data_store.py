@@ -0,0 +1,419 @@
+"""
+收藏夹、下载历史、下载队列、订阅和本地视频索引的 SQLite 存储
+
+所有修改都是增量的事务操作，不再每次改动都重写整个 JSON 文件。
+首次运行时从 favorites.json / download_history.json 导入旧数据（原文件保留作为备份）。
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+
+
+class DataStore:
+    """
+    基于 SQLite 的本地数据存储
+
+    表结构：
+    - folders: 收藏夹列表及顺序
+    - favorites: 收藏夹中的视频，(folder, video_id) 唯一，按 video_id 建索引
+    - history: 下载历史，按 video_id 和下载日期建索引
+    - download_queue: 未完成的下载任务，任务内容以 JSON 保存，重启后恢复
+    - removed_temp_files: 已移出下载队列的任务的文件名，下次启动时删除它们留在临时目录中的分片
+    - subscriptions: 订阅的搜索条件和已见过的视频 ID，以 JSON 保存
+    - library: 下载目录中的视频文件，按目录和 video_id 建索引
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS folders (
+            name TEXT PRIMARY KEY,
+            position INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS favorites (
+            folder TEXT NOT NULL,
+            video_id TEXT NOT NULL,
+            title TEXT NOT NULL DEFAULT '',
+            thumbnail TEXT NOT NULL DEFAULT '',
+            url TEXT NOT NULL DEFAULT '',
+            extra TEXT,
+            position INTEGER NOT NULL,
+            PRIMARY KEY (folder, video_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_favorites_video_id ON favorites (video_id);
+        CREATE TABLE IF NOT EXISTS history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            video_id TEXT NOT NULL,
+            title TEXT NOT NULL DEFAULT '',
+            filename TEXT NOT NULL DEFAULT '',
+            download_date TEXT NOT NULL DEFAULT '',
+            extra TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_history_video_id ON history (video_id);
+        CREATE INDEX IF NOT EXISTS idx_history_date ON history (download_date);
+        CREATE TABLE IF NOT EXISTS download_queue (
+            video_id TEXT PRIMARY KEY,
+            position INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT '',
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS removed_temp_files (
+            filename TEXT PRIMARY KEY
+        );
+        CREATE TABLE IF NOT EXISTS subscriptions (
+            name TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS library (
+            path TEXT PRIMARY KEY,
+            root TEXT NOT NULL,
+            video_id TEXT,
+            size INTEGER NOT NULL DEFAULT 0,
+            mtime REAL NOT NULL DEFAULT 0,
+            quality_num INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_library_root ON library (root);
+        CREATE INDEX IF NOT EXISTS idx_library_video_id ON library (video_id);
+    """
+
+    FAVORITE_FIELDS = ("video_id", "title", "thumbnail", "url")
+    HISTORY_FIELDS = ("video_id", "title", "filename", "download_date")
+    LIBRARY_FIELDS = ("path", "video_id", "size", "mtime", "quality_num")
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(self.SCHEMA)
+
+    def close(self):
+        with self._lock:
+            try:
+                self._conn.close()
+            except Exception as e:
+                logging.warning(f"Failed to close data store: {e}")
+
+    # ---- 元数据 ----
+
+    def _get_meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def _set_meta(self, key, value):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value))
+        )
+
+    # ---- 旧数据导入 ----
+
+    def import_json(self, favorites_file, history_file):
+        """首次运行时从旧的 JSON 文件导入数据，之后不再重复导入"""
+        with self._lock:
+            if self._get_meta("json_imported"):
+                return
+
+            favorites = {}
+            try:
+                with open(favorites_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                favorites = {"默认收藏夹": data} if isinstance(data, list) else data
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logging.warning(f"Failed to import favorites: {e}")
+
+            history = []
+            try:
+                with open(history_file, "r", encoding="utf-8") as f:
+                    history = json.load(f)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logging.warning(f"Failed to import download history: {e}")
+
+            with self._conn:
+                for name, entries in favorites.items():
+                    self._replace_folder(name, entries)
+                for entry in history:
+                    self._insert_history(entry)
+                self._set_meta("json_imported", 1)
+
+    # ---- 收藏夹 ----
+
+    @classmethod
+    def _split_extra(cls, entry, fields):
+        extra = {k: v for k, v in entry.items() if k not in fields}
+        return json.dumps(extra, ensure_ascii=False) if extra else None
+
+    @staticmethod
+    def _merge_extra(entry, extra):
+        if extra:
+            try:
+                entry.update(json.loads(extra))
+            except Exception as e:
+                logging.warning(f"Failed to parse stored extra fields: {e}")
+        return entry
+
+    def load_favorites(self):
+        """返回 {收藏夹名: [视频信息]}，顺序与保存时一致"""
+        with self._lock:
+            favorites = {
+                row["name"]: []
+                for row in self._conn.execute("SELECT name FROM folders ORDER BY position")
+            }
+            rows = self._conn.execute(
+                "SELECT * FROM favorites ORDER BY folder, position"
+            ).fetchall()
+        for row in rows:
+            entry = {field: row[field] for field in self.FAVORITE_FIELDS}
+            favorites.setdefault(row["folder"], []).append(self._merge_extra(entry, row["extra"]))
+        return favorites
+
+    def _ensure_folder(self, name):
+        self._conn.execute(
+            "INSERT OR IGNORE INTO folders (name, position) "
+            "VALUES (?, (SELECT COALESCE(MAX(position), -1) + 1 FROM folders))",
+            (name,),
+        )
+
+    def create_folder(self, name):
+        with self._lock, self._conn:
+            self._ensure_folder(name)
+
+    def delete_folder(self, name):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM favorites WHERE folder = ?", (name,))
+            self._conn.execute("DELETE FROM folders WHERE name = ?", (name,))
+
+    def rename_folder(self, old_name, new_name):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE folders SET name = ? WHERE name = ?", (new_name, old_name))
+            self._conn.execute(
+                "UPDATE favorites SET folder = ? WHERE folder = ?", (new_name, old_name)
+            )
+
+    def _insert_favorites(self, folder, entries):
+        self._ensure_folder(folder)
+        row = self._conn.execute(
+            "SELECT COALESCE(MAX(position), -1) AS pos FROM favorites WHERE folder = ?", (folder,)
+        ).fetchone()
+        position = row["pos"] + 1
+        for entry in entries:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO favorites "
+                "(folder, video_id, title, thumbnail, url, extra, position) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    folder,
+                    str(entry.get("video_id", "")),
+                    entry.get("title", ""),
+                    entry.get("thumbnail", ""),
+                    entry.get("url", ""),
+                    self._split_extra(entry, self.FAVORITE_FIELDS),
+                    position,
+                ),
+            )
+            position += cursor.rowcount
+
+    def add_favorites(self, folder, entries):
+        """追加视频到收藏夹，已存在的视频会被忽略"""
+        with self._lock, self._conn:
+            self._insert_favorites(folder, entries)
+
+    def remove_favorites(self, folder, video_ids):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM favorites WHERE folder = ? AND video_id = ?",
+                [(folder, vid) for vid in video_ids],
+            )
+
+    def _replace_folder(self, name, entries):
+        self._conn.execute("DELETE FROM favorites WHERE folder = ?", (name,))
+        self._insert_favorites(name, entries)
+
+    def replace_folder(self, name, entries):
+        """用给定列表整体替换某个收藏夹（导入时使用）"""
+        with self._lock, self._conn:
+            self._replace_folder(name, entries)
+
+    def favorite_folders_for(self, video_id):
+        """按 video_id 查询所在的收藏夹"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT folder FROM favorites WHERE video_id = ?", (video_id,)
+            ).fetchall()
+        return [row["folder"] for row in rows]
+
+    # ---- 下载历史 ----
+
+    def _insert_history(self, entry):
+        self._conn.execute(
+            "INSERT INTO history (video_id, title, filename, download_date, extra) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (
+                str(entry.get("video_id", "")),
+                entry.get("title", ""),
+                entry.get("filename", ""),
+                entry.get("download_date", ""),
+                self._split_extra(entry, self.HISTORY_FIELDS),
+            ),
+        )
+
+    def _history_rows(self, rows):
+        history = []
+        for row in rows:
+            entry = {field: row[field] for field in self.HISTORY_FIELDS}
+            history.append(self._merge_extra(entry, row["extra"]))
+        return history
+
+    def load_history(self):
+        """按下载先后顺序返回全部历史"""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM history ORDER BY id").fetchall()
+        return self._history_rows(rows)
+
+    def add_history(self, entry):
+        with self._lock, self._conn:
+            self._insert_history(entry)
+
+    def clear_history(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM history")
+
+    def history_for(self, video_id):
+        """按 video_id 查询下载历史"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM history WHERE video_id = ? ORDER BY id", (video_id,)
+            ).fetchall()
+        return self._history_rows(rows)
+
+    def history_between(self, start_date, end_date):
+        """按下载日期范围查询（日期格式与 download_date 一致，闭区间）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM history WHERE download_date BETWEEN ? AND ? ORDER BY download_date",
+                (start_date, end_date),
+            ).fetchall()
+        return self._history_rows(rows)
+
+    # ---- 下载队列 ----
+
+    def load_download_queue(self):
+        """按队列顺序返回保存的下载任务"""
+        with self._lock:
+            rows = self._conn.execute("SELECT data FROM download_queue ORDER BY position").fetchall()
+        tasks = []
+        for row in rows:
+            try:
+                tasks.append(json.loads(row["data"]))
+            except Exception as e:
+                logging.warning(f"Failed to parse stored download task: {e}")
+        return tasks
+
+    def save_download_tasks(self, changed, removed=()):
+        """增量保存下载队列
+
+        参数:
+            changed: [(位置, 任务)]，新增或有变化的任务
+            removed: 已移出队列的 video_id，同时记录这些任务的文件名
+        """
+        with self._lock, self._conn:
+            filenames = []
+            for vid in removed:
+                row = self._conn.execute(
+                    "SELECT data FROM download_queue WHERE video_id = ?", (vid,)
+                ).fetchone()
+                try:
+                    filename = json.loads(row["data"]).get("filename") if row else None
+                except Exception:
+                    filename = None
+                if filename:
+                    filenames.append((filename,))
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO removed_temp_files (filename) VALUES (?)", filenames
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO download_queue (video_id, position, status, data) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (
+                        str(task["video_id"]),
+                        position,
+                        task.get("status", ""),
+                        json.dumps(task, ensure_ascii=False, default=str),
+                    )
+                    for position, task in changed
+                ],
+            )
+            self._conn.executemany(
+                "DELETE FROM download_queue WHERE video_id = ?", [(vid,) for vid in removed]
+            )
+
+    def pop_removed_temp_files(self):
+        """返回并清空已移出下载队列的任务的文件名"""
+        with self._lock, self._conn:
+            rows = self._conn.execute("SELECT filename FROM removed_temp_files").fetchall()
+            self._conn.execute("DELETE FROM removed_temp_files")
+        return [row["filename"] for row in rows]
+
+    # ---- 订阅 ----
+
+    def load_subscriptions(self):
+        """按添加顺序返回订阅"""
+        with self._lock:
+            rows = self._conn.execute("SELECT data FROM subscriptions ORDER BY rowid").fetchall()
+        subscriptions = []
+        for row in rows:
+            try:
+                subscriptions.append(json.loads(row["data"]))
+            except Exception as e:
+                logging.warning(f"Failed to parse stored subscription: {e}")
+        return subscriptions
+
+    def save_subscription(self, subscription):
+        """新增或更新订阅，更新时保持原有顺序"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO subscriptions (name, data) VALUES (?, ?) "
+                "ON CONFLICT (name) DO UPDATE SET data = excluded.data",
+                (subscription["name"], json.dumps(subscription, ensure_ascii=False)),
+            )
+
+    def delete_subscription(self, name):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM subscriptions WHERE name = ?", (name,))
+
+    # ---- 本地视频索引 ----
+
+    def load_library(self, root):
+        """返回目录 root 下已索引的视频文件"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, video_id, size, mtime, quality_num FROM library WHERE root = ?", (root,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def save_library_files(self, root, changed, removed=()):
+        """增量保存视频索引
+
+        参数:
+            changed: 新增或有变化的文件记录
+            removed: 已不存在的文件路径
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO library (root, path, video_id, size, mtime, quality_num) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(root, *(entry[field] for field in self.LIBRARY_FIELDS)) for entry in changed],
+            )
+            self._conn.executemany(
+                "DELETE FROM library WHERE path = ?", [(path,) for path in removed]
+            )
@@ -0,0 +1,86 @@
+"""
+下载任务的磁盘空间准入检查
+
+开始下载前按任务的 total_size 为临时目录和下载目录所在的卷预留空间，
+放不下的任务先不开始，等空间释放后再启动，避免下载到最后才因磁盘已满失败。
+还不知道大小的任务只要求卷上留有余量，开始下载、得到大小后由调用方重新检查。
+"""
+
+import os
+import shutil
+
+# 每个卷至少保留的剩余空间
+DISK_SPACE_MARGIN = 200 * 1024 * 1024
+
+
+def _existing_path(path):
+    """下载目录可能还没有创建，使用最近的已存在的上级目录"""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def free_space(path):
+    """返回 path 所在卷的剩余空间，无法获取时返回 None"""
+    try:
+        return shutil.disk_usage(_existing_path(path)).free
+    except OSError:
+        return None
+
+
+def same_volume(path_a, path_b):
+    try:
+        return os.stat(_existing_path(path_a)).st_dev == os.stat(_existing_path(path_b)).st_dev
+    except OSError:
+        return False
+
+
+class DiskSpaceAdmission:
+    """
+    一轮启动检查中的空间预留
+
+    - 临时目录：任务还未下载的部分，加上合并分片时的余量（一个分片的大小）
+    - 下载目录：与临时目录不在同一个卷时，完成后移动需要一份完整文件的空间；同一个卷时只是重命名
+    - 还不知道大小的任务不预留空间，只要求剩余空间不少于 margin
+    - 剩余空间无法获取的卷不做限制
+    """
+
+    def __init__(self, temp_dir, download_dir, num_threads=1, margin=DISK_SPACE_MARGIN):
+        self.num_threads = max(1, num_threads)
+        self.same_volume = same_volume(temp_dir, download_dir)
+        self.available = {"temp": free_space(temp_dir)}
+        if not self.same_volume:
+            self.available["download"] = free_space(download_dir)
+        for volume, free in self.available.items():
+            if free is not None:
+                self.available[volume] = free - margin
+
+    def needed(self, download):
+        """返回 {卷: 还需要的字节数}"""
+        total = download.get("total_size") or 0
+        remaining = max(0, total - download.get("size", 0))
+        merge = total // self.num_threads if self.num_threads > 1 else 0
+        if self.same_volume:
+            return {"temp": remaining + merge}
+        return {"temp": remaining + merge, "download": total}
+
+    def reserve(self, download):
+        """为已经在下载的任务预留空间"""
+        for volume, size in self.needed(download).items():
+            if self.available[volume] is not None:
+                self.available[volume] -= size
+
+    def try_reserve(self, download):
+        """空间足够时预留并返回 True，否则不预留并返回 False"""
+        needed = self.needed(download)
+        if any(
+            self.available[volume] is not None and size > self.available[volume]
+            for volume, size in needed.items()
+        ):
+            return False
+        self.reserve(download)
+        return True
@@ -0,0 +1,203 @@
+"""
+下载完成后的完整性校验
+
+- 文件长度必须与服务器给出的大小完全一致
+- 服务器提供了整个文件的摘要（Digest / Repr-Digest / Content-MD5 / x-goog-hash）时进行比对
+- MP4 文件用流式解析检查顶层 box 结构：box 首尾相接覆盖整个文件，且包含 ftyp、moov 和 mdat
+
+校验失败时抛出 VerificationError；能定位到出错位置时 suspect 为可疑的字节范围，
+调用方可以只重新下载这一段。
+mp4_video_height 复用同样的 box 解析读取视频高度，用于判断本地文件的画质。
+"""
+
+import base64
+import binascii
+import hashlib
+import os
+import re
+import struct
+
+# 服务器摘要算法名 -> hashlib 名称（crc32c 等标准库不支持的算法会被忽略）
+DIGEST_ALGORITHMS = {
+    "md5": "md5",
+    "sha": "sha1",
+    "sha-1": "sha1",
+    "sha-256": "sha256",
+    "sha-512": "sha512",
+}
+DIGEST_ITEM = re.compile(r"\s*([\w-]+)\s*=\s*:?([A-Za-z0-9+/=]+):?\s*")
+MP4_REQUIRED_BOXES = ("ftyp", "moov", "mdat")
+
+
+class VerificationError(Exception):
+    """校验失败，suspect 为可疑范围 (start, end)（闭区间），无法定位时为 None"""
+
+    def __init__(self, message, suspect=None):
+        super().__init__(message)
+        self.suspect = suspect
+
+
+def _decode_digest(value):
+    try:
+        return base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def parse_server_digests(headers, partial=False):
+    """从响应头中提取整个文件的摘要，返回 {hashlib 算法名: 摘要字节}
+
+    partial 为 True 表示响应是 Range 请求的 206 响应，此时 Content-MD5 只对应返回的片段，不采用。
+    """
+    digests = {}
+    for header in ("digest", "repr-digest", "x-goog-hash"):
+        value = headers.get(header)
+        if not value:
+            continue
+        for item in value.split(","):
+            match = DIGEST_ITEM.fullmatch(item)
+            if not match:
+                continue
+            algorithm = DIGEST_ALGORITHMS.get(match.group(1).lower())
+            digest = _decode_digest(match.group(2))
+            if algorithm and digest:
+                digests[algorithm] = digest
+
+    content_md5 = headers.get("content-md5")
+    if content_md5 and not partial:
+        digest = _decode_digest(content_md5.strip())
+        if digest:
+            digests["md5"] = digest
+    return digests
+
+
+def file_digests(path, algorithms, block_size=1024 * 1024):
+    """一次读取文件，同时计算多种摘要"""
+    hashers = {name: hashlib.new(name) for name in algorithms}
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            for hasher in hashers.values():
+                hasher.update(block)
+    return {name: hasher.digest() for name, hasher in hashers.items()}
+
+
+def check_mp4_structure(path):
+    """检查 MP4 顶层 box 结构，只读取 box 头，不读取媒体数据"""
+    file_size = os.path.getsize(path)
+    seen = []
+    offset = 0
+    previous = 0
+    with open(path, "rb") as f:
+        while offset < file_size:
+            f.seek(offset)
+            header = f.read(8)
+            # 出错的 box 头可能是上一个 box 的数据损坏导致的，可疑范围从上一个 box 开始
+            suspect = (previous, min(offset + 16, file_size) - 1)
+            if len(header) < 8:
+                raise VerificationError(f"MP4 结构损坏：偏移 {offset} 处的 box 头不完整", suspect)
+
+            size, box_type = struct.unpack(">I4s", header)
+            header_size = 8
+            if size == 1:
+                large = f.read(8)
+                if len(large) < 8:
+                    raise VerificationError(f"MP4 结构损坏：偏移 {offset} 处的 box 头不完整", suspect)
+                size = struct.unpack(">Q", large)[0]
+                header_size = 16
+            elif size == 0:
+                size = file_size - offset  # 最后一个 box 延伸到文件末尾
+
+            try:
+                name = box_type.decode("ascii")
+            except UnicodeDecodeError:
+                name = ""
+            if not name.isprintable() or len(name.strip()) != 4 or size < header_size:
+                raise VerificationError(f"MP4 结构损坏：偏移 {offset} 处的 box 头无效", suspect)
+            if offset + size > file_size:
+                raise VerificationError(
+                    f"MP4 结构损坏：{name} box 超出文件末尾（偏移 {offset}，大小 {size}）", suspect
+                )
+
+            if not seen and name != "ftyp":
+                raise VerificationError(f"MP4 结构损坏：文件不是以 ftyp 开头（{name}）", (0, offset + 15))
+            seen.append(name)
+            previous = offset
+            offset += size
+
+    missing = [name for name in MP4_REQUIRED_BOXES if name not in seen]
+    if missing:
+        raise VerificationError(f"MP4 结构不完整：缺少 {', '.join(missing)}")
+
+
+def _iter_boxes(f, start, end):
+    """遍历 [start, end) 范围内的 box，产出 (类型, 内容起点, 内容终点)，box 头无效时停止"""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        size, box_type = struct.unpack(">I4s", f.read(8))
+        header_size = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size or offset + size > end:
+            return
+        yield box_type, offset + header_size, offset + size
+        offset += size
+
+
+def mp4_video_height(path):
+    """读取 MP4 中视频轨道的高度（tkhd 中的显示尺寸），无法读取时返回 0
+
+    只跳读 moov 中的 box 头和 tkhd，不读取媒体数据。
+    """
+    height = 0
+    try:
+        with open(path, "rb") as f:
+            file_size = os.fstat(f.fileno()).st_size
+            for box_type, start, end in _iter_boxes(f, 0, file_size):
+                if box_type != b"moov":
+                    continue
+                for trak_type, trak_start, trak_end in _iter_boxes(f, start, end):
+                    if trak_type != b"trak":
+                        continue
+                    for tkhd_type, tkhd_start, tkhd_end in _iter_boxes(f, trak_start, trak_end):
+                        if tkhd_type != b"tkhd":
+                            continue
+                        f.seek(tkhd_start)
+                        data = f.read(min(tkhd_end - tkhd_start, 96))
+                        # version 0 的时间字段为 32 位，version 1 为 64 位，宽高在矩阵之后，16.16 定点数
+                        offset = 80 if data and data[0] == 0 else 92
+                        if len(data) >= offset + 4:
+                            height = max(height, struct.unpack(">I", data[offset:offset + 4])[0] >> 16)
+                        break
+                break
+    except (OSError, struct.error):
+        return 0
+    return height
+
+
+def verify_file(path, expected_size, digests=None, check_mp4=None):
+    """校验下载完成的文件
+
+    参数:
+        path: 文件路径
+        expected_size: 服务器给出的大小，0 表示未知
+        digests: parse_server_digests 的结果
+        check_mp4: 是否检查 MP4 结构，为 None 时按扩展名判断
+    """
+    actual_size = os.path.getsize(path)
+    if expected_size and actual_size != expected_size:
+        raise VerificationError(f"文件大小不一致：应为 {expected_size} 字节，实际 {actual_size} 字节")
+
+    if check_mp4 is None:
+        check_mp4 = path.lower().endswith(".mp4")
+    if check_mp4:
+        check_mp4_structure(path)
+
+    if digests:
+        actual = file_digests(path, digests)
+        for algorithm, expected in digests.items():
+            if actual[algorithm] != expected:
+                raise VerificationError(f"文件摘要不一致（{algorithm}）")
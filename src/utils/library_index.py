@@ -0,0 +1,161 @@
+"""
+本地视频索引
+
+记录下载目录中每个视频文件的路径、大小和对应的 video_id / 画质，保存在 SQLite 中。
+开始下载前按标题或 video_id 判断是否已下载只需查表，不再每次列出整个目录；
+目录有变化时用一次扫描找出新增、修改和删除的文件，增量更新索引。
+"""
+
+import logging
+import os
+import re
+import threading
+
+# "[视频ID] 标题" 命名规则中的视频 ID
+REGEX_BRACKET_ID = re.compile(r"\[(\d+)\]")
+
+
+class LibraryIndex:
+    """
+    下载目录的视频文件索引
+
+    - files: 路径 -> {path, video_id, size, mtime, quality_num}
+    - 按 video_id 和文件名（不含扩展名）各建一份反向索引，查询为 O(1)
+    - 文件名中没有视频 ID 时，用调用方提供的 {文件名: video_id}（下载历史）补全
+    - quality_num 只有本程序下载完成的文件才有记录，其余为 0
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.root = None
+        self._lock = threading.RLock()
+        self.files = {}
+        self._by_video_id = {}
+        self._by_stem = {}
+
+    @staticmethod
+    def _key(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    @staticmethod
+    def video_id_from_name(filename, known_ids=None):
+        match = REGEX_BRACKET_ID.search(filename)
+        if match:
+            return match.group(1)
+        stem = os.path.splitext(filename)[0]
+        if stem.isdigit():
+            return stem
+        return (known_ids or {}).get(filename)
+
+    def _add_locked(self, entry):
+        key = self._key(entry["path"])
+        self._remove_locked(key)
+        self.files[key] = entry
+        stem = os.path.splitext(os.path.basename(entry["path"]))[0]
+        self._by_stem.setdefault(stem, set()).add(key)
+        if entry["video_id"]:
+            self._by_video_id.setdefault(entry["video_id"], set()).add(key)
+
+    def _remove_locked(self, key):
+        entry = self.files.pop(key, None)
+        if entry is None:
+            return
+        stem = os.path.splitext(os.path.basename(entry["path"]))[0]
+        for index, value in ((self._by_stem, stem), (self._by_video_id, entry["video_id"])):
+            keys = index.get(value)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del index[value]
+
+    def load(self, root, known_ids=None):
+        """切换到目录 root，载入保存的索引后与磁盘同步一次"""
+        with self._lock:
+            self.root = os.path.abspath(root)
+            self.files = {}
+            self._by_video_id = {}
+            self._by_stem = {}
+            for entry in self.store.load_library(self.root):
+                self._add_locked(entry)
+        self.refresh(known_ids)
+
+    def refresh(self, known_ids=None):
+        """扫描一次目录，只更新新增、大小或修改时间有变化以及已删除的文件"""
+        with self._lock:
+            if self.root is None:
+                return
+            found = {}
+            try:
+                with os.scandir(self.root) as entries:
+                    for dir_entry in entries:
+                        if not dir_entry.name.lower().endswith(".mp4"):
+                            continue
+                        try:
+                            if not dir_entry.is_file():
+                                continue
+                            stat = dir_entry.stat()
+                        except OSError:
+                            continue
+                        found[self._key(dir_entry.path)] = (dir_entry, stat)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.warning(f"Failed to scan library {self.root}: {e}")
+                return
+
+            changed = []
+            for key, (dir_entry, stat) in found.items():
+                old = self.files.get(key)
+                if old and old["size"] == stat.st_size and old["mtime"] == stat.st_mtime:
+                    continue
+                entry = {
+                    "path": dir_entry.path,
+                    "video_id": self.video_id_from_name(dir_entry.name, known_ids)
+                    or (old["video_id"] if old else None),
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                    "quality_num": old["quality_num"] if old else 0,
+                }
+                self._add_locked(entry)
+                changed.append(entry)
+
+            removed_keys = [key for key in self.files if key not in found]
+            removed = [self.files[key]["path"] for key in removed_keys]
+            for key in removed_keys:
+                self._remove_locked(key)
+            if changed or removed:
+                self.store.save_library_files(self.root, changed, removed)
+
+    def add_file(self, path, video_id, quality_num=0):
+        """记录刚下载完成的文件，不在当前目录中的文件忽略"""
+        with self._lock:
+            if self.root is None or self._key(os.path.dirname(path)) != self._key(self.root):
+                return
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return
+            entry = {
+                "path": os.path.join(self.root, os.path.basename(path)),
+                "video_id": video_id,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "quality_num": quality_num,
+            }
+            self._add_locked(entry)
+            self.store.save_library_files(self.root, [entry])
+
+    def find_by_video_id(self, video_id):
+        with self._lock:
+            keys = self._by_video_id.get(video_id)
+            return self.files[next(iter(keys))] if keys else None
+
+    def find_by_title(self, stem):
+        """按不含扩展名的文件名查找"""
+        with self._lock:
+            keys = self._by_stem.get(stem)
+            return self.files[next(iter(keys))] if keys else None
+
+    def files_for(self, video_id):
+        with self._lock:
+            return [self.files[key] for key in self._by_video_id.get(video_id, ())]
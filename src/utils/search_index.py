@@ -0,0 +1,75 @@
+"""
+收藏夹搜索索引
+
+对标题、视频ID和标签建立二元组（bigram）倒排索引，查询时先通过索引求交集得到候选，
+再做子串校验。索引和查询都统一转换为简体小写，因此繁体、简体关键词都能匹配。
+"""
+
+from src.utils.zh_convert import to_simplified, to_simplified_many
+
+
+def normalize_text(text):
+    """统一为简体小写，用于索引和查询"""
+    if not text:
+        return ""
+    return to_simplified(text).lower().strip()
+
+
+class FavoritesIndex:
+    """
+    收藏夹倒排索引
+
+    文档按收藏夹中的位置编号，search 返回匹配的位置集合。
+    """
+
+    def __init__(self, entries=None):
+        self.docs = []
+        self.grams = {}  # bigram -> {位置}
+        self.chars = {}  # 单字 -> {位置}，用于单字查询
+        if entries:
+            self.build(entries)
+
+    @staticmethod
+    def _document(entry):
+        parts = [entry.get("title", ""), entry.get("video_id", "")]
+        parts.extend(entry.get("tags", []) or [])
+        return " ".join(str(p) for p in parts if p)
+
+    def build(self, entries):
+        # 所有文档合并为一次繁简转换
+        raw_docs = [self._document(entry) for entry in entries]
+        self.docs = [doc.lower().strip() for doc in to_simplified_many(raw_docs)]
+        self.grams = {}
+        self.chars = {}
+        for position, doc in enumerate(self.docs):
+            for ch in set(doc):
+                self.chars.setdefault(ch, set()).add(position)
+            for gram in {doc[i : i + 2] for i in range(len(doc) - 1)}:
+                self.grams.setdefault(gram, set()).add(position)
+
+    def _candidates(self, token):
+        if len(token) == 1:
+            return self.chars.get(token, set())
+        candidates = None
+        for gram in {token[i : i + 2] for i in range(len(token) - 1)}:
+            postings = self.grams.get(gram)
+            if not postings:
+                return set()
+            candidates = set(postings) if candidates is None else candidates & postings
+            if not candidates:
+                return set()
+        return candidates
+
+    def search(self, query):
+        """返回匹配的位置集合，空查询匹配全部；多个关键词之间为“与”关系"""
+        tokens = normalize_text(query).split()
+        if not tokens:
+            return set(range(len(self.docs)))
+
+        result = None
+        for token in tokens:
+            matched = {pos for pos in self._candidates(token) if token in self.docs[pos]}
+            result = matched if result is None else result & matched
+            if not result:
+                return set()
+        return result
@@ -0,0 +1,125 @@
+"""
+settings.json 读写服务
+
+settings.json 的唯一持有者。界面设置和 API 会话信息都通过它读写：
+修改先合并到内存，再由后台定时器批量写入（先写临时文件再替换），
+避免在 GUI 线程上同步写文件，也避免多个写入者互相覆盖。
+"""
+
+import atexit
+import copy
+import json
+import logging
+import os
+import threading
+
+# 由 Hanime1API 负责保存的键，界面设置中不应包含
+SESSION_KEYS = ("headers", "session")
+
+
+class SettingsStore:
+    """
+    设置存储
+
+    - update/remove 只修改内存并安排写入，同一时间窗口内的多次修改合并为一次写入
+    - 写入在后台线程进行，最多每 write_interval_ms 毫秒写一次
+    - flush 立即同步写入（退出时使用）
+    """
+
+    def __init__(self, settings_file, write_interval_ms=500):
+        self.settings_file = settings_file
+        self.write_interval = write_interval_ms / 1000
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._data = {}
+        self._dirty = False
+        self._timer = None
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.settings_file):
+            return
+        try:
+            with open(self.settings_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self._data = data
+        except Exception as e:
+            logging.warning(f"Failed to load settings: {e}")
+            # 文件损坏时备份，避免之后的写入覆盖掉原内容
+            try:
+                os.replace(self.settings_file, f"{self.settings_file}.backup")
+            except Exception as e:
+                logging.warning(f"Failed to backup settings.json: {e}")
+
+    def snapshot(self):
+        """返回当前设置的深拷贝"""
+        with self._lock:
+            return copy.deepcopy(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            return copy.deepcopy(self._data.get(key, default))
+
+    def update(self, values):
+        """合并顶层键并安排写入"""
+        values = copy.deepcopy(values)
+        with self._lock:
+            self._data.update(values)
+            self._mark_dirty_locked()
+
+    def remove(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+            self._mark_dirty_locked()
+
+    def _mark_dirty_locked(self):
+        self._dirty = True
+        if self._timer is None:
+            self._timer = threading.Timer(self.write_interval, self._write)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _write(self):
+        with self._write_lock:
+            with self._lock:
+                self._timer = None
+                if not self._dirty:
+                    return
+                data = copy.deepcopy(self._data)
+                self._dirty = False
+
+            try:
+                os.makedirs(os.path.dirname(self.settings_file), exist_ok=True)
+                tmp_file = f"{self.settings_file}.tmp"
+                with open(tmp_file, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_file, self.settings_file)
+            except Exception as e:
+                logging.warning(f"Failed to save settings: {e}")
+                with self._lock:
+                    self._mark_dirty_locked()
+
+    def flush(self):
+        """立即写入尚未保存的修改"""
+        with self._lock:
+            timer = self._timer
+        if timer is not None:
+            timer.cancel()
+        self._write()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_settings_store():
+    """返回全局唯一的设置存储（config/settings.json）"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            settings_file = os.path.join(os.getcwd(), "config", "settings.json")
+            _store = SettingsStore(settings_file)
+            atexit.register(_store.flush)
+        return _store
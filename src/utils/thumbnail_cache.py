@@ -0,0 +1,241 @@
+"""
+缩略图磁盘缓存
+
+将已经渲染好的列表缩略图按 URL 哈希保存在 config/thumbnails 目录下，
+过期后通过 ETag/Last-Modified 条件请求重新验证，并按总大小上限进行 LRU 淘汰。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import requests
+
+
+class ThumbnailCache:
+    """
+    缩略图磁盘缓存
+
+    - 文件按 URL 的 SHA1 存放，key[:2] 作为子目录避免单目录文件过多
+    - index.json 记录校验信息（ETag/Last-Modified）、大小和最后访问时间
+    - 未过期的条目直接返回，不产生任何网络请求
+    """
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, cache_dir, max_size=200 * 1024 * 1024, revalidate_after=7 * 24 * 3600):
+        self.cache_dir = cache_dir
+        self.max_size = max_size  # 缓存总大小上限（字节）
+        self.revalidate_after = revalidate_after  # 超过该时间（秒）后需要重新验证
+        self.index_file = os.path.join(cache_dir, self.INDEX_FILE)
+        self._lock = threading.Lock()
+        self._index = {}
+        self._total_size = 0
+        self._dirty = False
+        self._last_index_save = 0
+        self.index_save_interval = 5.0
+
+        # 复用连接，避免每张缩略图都重新握手
+        self.session = requests.Session()
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+        except Exception as e:
+            logging.warning(f"Failed to create thumbnail cache dir: {e}")
+        self._load_index()
+
+    @staticmethod
+    def _key(url):
+        return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.png")
+
+    def _load_index(self):
+        """加载索引，丢弃文件已不存在的条目"""
+        if not os.path.exists(self.index_file):
+            return
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except Exception as e:
+            logging.warning(f"Failed to load thumbnail cache index: {e}")
+            return
+
+        for key, entry in index.items():
+            if os.path.exists(self._path(key)):
+                self._index[key] = entry
+                self._total_size += entry.get("size", 0)
+            else:
+                self._dirty = True
+
+    def save_index(self, force=True):
+        """保存索引（先写临时文件再替换，避免写一半的索引）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            if not force and time.time() - self._last_index_save < self.index_save_interval:
+                return
+            snapshot = dict(self._index)
+            self._dirty = False
+            self._last_index_save = time.time()
+        try:
+            tmp_file = f"{self.index_file}.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_file, self.index_file)
+        except Exception as e:
+            logging.warning(f"Failed to save thumbnail cache index: {e}")
+
+    def get(self, url):
+        """读取已渲染的缩略图，不存在时返回 None"""
+        key = self._key(url)
+        with self._lock:
+            entry = self._index.get(key)
+            if not entry:
+                return None
+            entry["accessed"] = time.time()
+            self._dirty = True
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except Exception as e:
+            logging.warning(f"Failed to read cached thumbnail: {e}")
+            self._remove(key)
+            return None
+
+    def is_fresh(self, url):
+        """条目存在且未超过重新验证时间"""
+        with self._lock:
+            entry = self._index.get(self._key(url))
+            return bool(entry) and time.time() - entry.get("validated", 0) < self.revalidate_after
+
+    def put(self, url, data, etag=None, last_modified=None):
+        """写入已渲染的缩略图"""
+        key = self._key(url)
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logging.warning(f"Failed to write cached thumbnail: {e}")
+            return
+
+        now = time.time()
+        with self._lock:
+            old = self._index.get(key)
+            if old:
+                self._total_size -= old.get("size", 0)
+            self._index[key] = {
+                "url": url,
+                "size": len(data),
+                "etag": etag,
+                "last_modified": last_modified,
+                "validated": now,
+                "accessed": now,
+            }
+            self._total_size += len(data)
+            self._dirty = True
+            evicted = self._collect_evictions_locked()
+
+        for evict_key in evicted:
+            self._safe_remove(self._path(evict_key))
+        self.save_index(force=False)
+
+    def _collect_evictions_locked(self):
+        """超过大小上限时按最后访问时间淘汰，返回需要删除的 key"""
+        if self._total_size <= self.max_size:
+            return []
+        evicted = []
+        for key, entry in sorted(self._index.items(), key=lambda kv: kv[1].get("accessed", 0)):
+            if self._total_size <= self.max_size * 0.9:
+                break
+            self._total_size -= entry.get("size", 0)
+            evicted.append(key)
+        for key in evicted:
+            del self._index[key]
+        return evicted
+
+    def _remove(self, key):
+        with self._lock:
+            entry = self._index.pop(key, None)
+            if entry:
+                self._total_size -= entry.get("size", 0)
+                self._dirty = True
+        self._safe_remove(self._path(key))
+
+    def _safe_remove(self, path):
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except Exception as e:
+            logging.warning(f"Failed to remove cached thumbnail {path}: {e}")
+
+    def _conditional_headers(self, url):
+        with self._lock:
+            entry = self._index.get(self._key(url))
+            if not entry:
+                return {}
+            headers = {}
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+            return headers
+
+    def _mark_validated(self, url):
+        with self._lock:
+            entry = self._index.get(self._key(url))
+            if entry:
+                entry["validated"] = time.time()
+                self._dirty = True
+
+    def load(self, url, timeout=5):
+        """获取缩略图
+
+        返回 (data, rendered, validators):
+            rendered 为 True 时 data 是缓存中已渲染好的图片；
+            为 False 时 data 是原始下载内容，validators 为需要随渲染结果一起写回缓存的校验信息。
+        """
+        if self.is_fresh(url):
+            data = self.get(url)
+            if data:
+                return data, True, None
+
+        headers = self._conditional_headers(url)
+        try:
+            resp = self.session.get(url, headers=headers, timeout=timeout)
+        except Exception as e:
+            logging.warning(f"Failed to load thumbnail: {e}")
+            return self._stale(url)
+
+        if resp.status_code == 304 and headers:
+            data = self.get(url)
+            if data:
+                self._mark_validated(url)
+                return data, True, None
+            # 缓存文件丢失，重新完整请求
+            try:
+                resp = self.session.get(url, timeout=timeout)
+            except Exception as e:
+                logging.warning(f"Failed to load thumbnail: {e}")
+                return None, False, None
+
+        if resp.status_code == 200:
+            validators = {
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+            }
+            return resp.content, False, validators
+        return self._stale(url)
+
+    def _stale(self, url):
+        """请求失败（离线或服务器出错）时退回到过期的缓存，没有校验信息的缓存同样可用"""
+        data = self.get(url)
+        return (data, True, None) if data else (None, False, None)
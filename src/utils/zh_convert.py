@@ -0,0 +1,157 @@
+"""
+繁简转换服务
+
+对 zhconv 的转换结果做有上限的 LRU 缓存，缓存的结果始终与 zhconv 一致。
+界面上的标签显示名（TAG_MAPPING）是本地化而不是繁简转换，不放入缓存。
+同一页面上的多个字符串可以通过 convert_many 合并成一次 zhconv 调用。
+"""
+
+import collections
+import logging
+import threading
+
+# 批量转换时用于拼接字符串的分隔符，zhconv 的词典中不包含该字符，不会跨分隔符匹配词组
+_SEPARATOR = "\x00"
+
+
+class ZhConverter:
+    """
+    繁体到简体的转换器
+
+    - preset: 预置的转换表（不会被淘汰），只能包含与 zhconv 结果相同的纯繁简转换
+    - max_entries: 缓存条目上限，超过后淘汰最久未使用的条目
+    - max_cached_length: 超过该长度的字符串（如视频描述）不缓存，避免占用过多内存
+    """
+
+    def __init__(self, preset=None, max_entries=4096, max_cached_length=256):
+        self.preset = dict(preset or {})
+        self.max_entries = max_entries
+        self.max_cached_length = max_cached_length
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.zhconv_calls = 0
+
+    def _lookup(self, text):
+        """查找缓存，未命中返回 None"""
+        with self._lock:
+            result = self.preset.get(text)
+            if result is None:
+                result = self._cache.get(text)
+                if result is not None:
+                    self._cache.move_to_end(text)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return result
+
+    def _store(self, text, result):
+        if len(text) > self.max_cached_length:
+            return
+        with self._lock:
+            self._cache[text] = result
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+    def _zhconv(self, text):
+        # zhconv 导入时会加载很大的转换词典，推迟到首次使用
+        from zhconv import convert
+
+        with self._lock:
+            self.zhconv_calls += 1
+        return convert(text, "zh-cn")
+
+    def convert(self, text):
+        """转换单个字符串，出错时返回原文"""
+        if not text:
+            return text
+        result = self._lookup(text)
+        if result is not None:
+            return result
+        try:
+            result = self._zhconv(text)
+        except Exception as e:
+            logging.warning(f"繁简转换失败: {e}")
+            return text
+        self._store(text, result)
+        return result
+
+    def convert_many(self, texts):
+        """批量转换，缓存未命中的字符串合并为一次 zhconv 调用，返回与输入顺序一致的列表"""
+        results = [None] * len(texts)
+        pending = {}  # 原文 -> 在 texts 中的位置列表
+        for i, text in enumerate(texts):
+            if not text:
+                results[i] = text
+                continue
+            if text in pending:
+                pending[text].append(i)
+                continue
+            cached = self._lookup(text)
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending[text] = [i]
+
+        if not pending:
+            return results
+
+        sources = list(pending)
+        converted = None
+        if not any(_SEPARATOR in text for text in sources):
+            try:
+                converted = self._zhconv(_SEPARATOR.join(sources)).split(_SEPARATOR)
+            except Exception as e:
+                logging.warning(f"繁简转换失败: {e}")
+        if converted is None or len(converted) != len(sources):
+            # 无法批量转换时逐个转换
+            converted = []
+            for text in sources:
+                try:
+                    converted.append(self._zhconv(text))
+                except Exception as e:
+                    logging.warning(f"繁简转换失败: {e}")
+                    converted.append(text)
+
+        for text, result in zip(sources, converted):
+            self._store(text, result)
+            for i in pending[text]:
+                results[i] = result
+        return results
+
+    def stats(self):
+        """返回缓存命中统计"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "zhconv_calls": self.zhconv_calls,
+                "cached": len(self._cache),
+                "preset": len(self.preset),
+            }
+
+
+_converter = None
+_converter_lock = threading.Lock()
+
+
+def get_converter():
+    """返回全局共享的转换器"""
+    global _converter
+    with _converter_lock:
+        if _converter is None:
+            _converter = ZhConverter()
+        return _converter
+
+
+def to_simplified(text):
+    return get_converter().convert(text)
+
+
+def to_simplified_many(texts):
+    return get_converter().convert_many(texts)
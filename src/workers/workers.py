@@ -2,16 +2,29 @@
 Hanime1DL 后台任务工作线程类
 """
 
-import concurrent.futures
-import glob
+import collections
 import logging
-import os
-import shutil
 import threading
 import time
 
-import requests
-from PyQt5.QtCore import QObject, QRunnable, pyqtSignal, pyqtSlot
+from PyQt5.QtCore import (
+    QBuffer,
+    QIODevice,
+    QObject,
+    QRectF,
+    QRunnable,
+    QSize,
+    Qt,
+    QThreadPool,
+    pyqtSignal,
+    pyqtSlot,
+)
+from PyQt5.QtGui import QColor, QImage, QPainter, QPainterPath, QPen
+
+from src.core.downloader import DownloadCancelled, DownloadEngine
+from src.core.library_planner import LibraryPlanner
+from src.core.pipeline import SourceResolver
+from src.core.subscriptions import poll_subscription
 
 
 class WorkerSignals(QObject):
@@ -21,6 +34,113 @@ class WorkerSignals(QObject):
     progress = pyqtSignal(dict)
 
 
+class _TimedRunnable(QRunnable):
+    """包装任务，记录排队等待时间"""
+
+    def __init__(self, pool, runnable):
+        super().__init__()
+        self.pool = pool
+        self.runnable = runnable
+        self.enqueued_at = time.monotonic()
+
+    def run(self):
+        self.pool._on_started(self)
+        try:
+            self.runnable.run()
+        finally:
+            self.pool._on_finished(self)
+
+
+class WorkloadPool:
+    """
+    按负载类型划分的有界线程池
+
+    接口与 QThreadPool 保持一致（start/tryTake/clear/waitForDone），
+    同时统计排队深度、运行数量和排队等待时间。
+    """
+
+    def __init__(self, name, max_threads):
+        self.name = name
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(max_threads)
+        self._lock = threading.Lock()
+        self._queued = {}  # id(runnable) -> _TimedRunnable
+        self._running = 0
+        self.submitted = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.max_wait = 0.0
+        self._total_wait = 0.0
+        self._started = 0
+        self._recent_waits = collections.deque(maxlen=200)
+
+    def start(self, runnable, priority=0):
+        wrapper = _TimedRunnable(self, runnable)
+        with self._lock:
+            self._queued[id(runnable)] = wrapper
+            self.submitted += 1
+        self.pool.start(wrapper, priority)
+
+    def tryTake(self, runnable):
+        """从队列中移除尚未开始的任务"""
+        with self._lock:
+            wrapper = self._queued.get(id(runnable))
+        if wrapper is None or not self.pool.tryTake(wrapper):
+            return False
+        with self._lock:
+            self._queued.pop(id(runnable), None)
+            self.cancelled += 1
+        return True
+
+    def clear(self):
+        self.pool.clear()
+        with self._lock:
+            self.cancelled += len(self._queued)
+            self._queued.clear()
+
+    def waitForDone(self, msecs=-1):
+        return self.pool.waitForDone(msecs)
+
+    def setMaxThreadCount(self, max_threads):
+        self.pool.setMaxThreadCount(max_threads)
+
+    def maxThreadCount(self):
+        return self.pool.maxThreadCount()
+
+    def _on_started(self, wrapper):
+        wait = time.monotonic() - wrapper.enqueued_at
+        with self._lock:
+            self._queued.pop(id(wrapper.runnable), None)
+            self._running += 1
+            self._started += 1
+            self._total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self._recent_waits.append(wait)
+
+    def _on_finished(self, wrapper):
+        with self._lock:
+            self._running -= 1
+            self.completed += 1
+
+    def metrics(self):
+        """返回当前统计信息，等待时间单位为毫秒"""
+        with self._lock:
+            recent = sorted(self._recent_waits)
+            p95 = recent[int(len(recent) * 0.95) - 1] if recent else 0.0
+            return {
+                "name": self.name,
+                "max_threads": self.pool.maxThreadCount(),
+                "running": self._running,
+                "queued": len(self._queued),
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+                "avg_wait_ms": (self._total_wait / self._started * 1000) if self._started else 0.0,
+                "p95_wait_ms": p95 * 1000,
+                "max_wait_ms": self.max_wait * 1000,
+            }
+
+
 class SearchWorker(QRunnable):
     def __init__(self, api, query, page=1, filter_params=None):
         super().__init__()
@@ -62,431 +182,276 @@ class GetVideoInfoWorker(QRunnable):
             self.signals.finished.emit()
 
 
-class DownloadWorker(QRunnable):
-    """下载工作线程，支持多线程和断点续传"""
+class ThumbnailWorker(QRunnable):
+    """缩略图加载线程，解码、缩放和圆角合成都在后台线程的 QImage 上完成
 
-    # 常量定义
-    USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    CHUNK_SIZE = 1048576  # 下载块大小1MB，减少I/O操作次数和锁竞争
-    MIN_CHUNK_SIZE = 5 * 1024 * 1024  # 最小块大小(5MB)，小于此值使用单线程
+    成功时 result 发出 QImage，加载失败时发出 error，以便调用方释放请求后重试。
+    """
 
-    def __init__(
-        self,
-        url,
-        filename,
-        save_path=".",
-        num_threads=4,
-        headers=None,
-        cookies=None,
-        downloaded_size=0,
-    ):
+    THUMBNAIL_SIZE = QSize(200, 112)
+
+    def __init__(self, url, disk_cache):
         super().__init__()
         self.url = url
-        self.filename = filename
-        self.save_path = save_path
-        self.num_threads = num_threads
-        self.headers = headers or {"User-Agent": self.USER_AGENT}
-        self.cookies = cookies or {}
+        self.disk_cache = disk_cache
         self.signals = WorkerSignals()
-        self.is_paused = False
-        self.progress_lock = None
-        self.pause_event = threading.Event()
-        self.pause_event.set()  # 默认不暂停
-        self.downloaded_size = downloaded_size  # 已下载的大小，用于断点续传
-
-        # 初始化 Session
-        self.session = requests.Session()
-        adapter = requests.adapters.HTTPAdapter(
-            pool_connections=num_threads + 2, pool_maxsize=num_threads + 2, max_retries=0
-        )
-        self.session.mount("http://", adapter)
-        self.session.mount("https://", adapter)
-        self.session.headers.update(self.headers)
-        if self.cookies:
-            self.session.cookies.update(self.cookies)
-
-        # 进度更新节流机制
-        self.last_progress_update = 0
-        self.last_progress_value = 0
-        self.progress_update_interval = 0.2
-        self.progress_update_threshold = 2.0
-
-        # 下载速度计算
-        self.start_time = time.time()
-        self.last_speed_update = 0
-        self.last_downloaded_size = 0
-        self.current_speed = 0
+        self.cancelled = False
+
+    def cancel(self):
+        """取消加载，已经开始的网络请求会在返回后被丢弃"""
+        self.cancelled = True
 
     @pyqtSlot()
     def run(self):
         try:
-            os.makedirs(self.save_path, exist_ok=True)
-            self.full_path = os.path.join(self.save_path, self.filename)
+            if self.cancelled:
+                return
+            data, rendered, validators = self.disk_cache.load(self.url)
+            if self.cancelled and rendered:
+                return
+            if not data:
+                self.signals.error.emit("缩略图下载失败")
+                return
 
-            file_info = self._get_file_info()
-            if not file_info:
+            image = QImage.fromData(data)
+            if image.isNull():
+                self.signals.error.emit("缩略图数据无效")
                 return
 
-            file_total_size, supports_range_requests = file_info
-            self.progress_lock = threading.Lock()
-            downloaded_size = 0
-
-            if supports_range_requests and file_total_size > 0:
-                self._download_with_multithreading(file_total_size)
-            else:
-                self._download_with_singlethread(file_total_size)
-
-            self.signals.progress.emit(
-                {
-                    "progress": 100,
-                    "filename": self.filename,
-                    "size": file_total_size,
-                    "total_size": file_total_size,
-                }
-            )
+            if not rendered:
+                image = self._render(image)
+                # 将渲染结果写入磁盘缓存，下次启动无需再次下载
+                buffer = QBuffer()
+                buffer.open(QIODevice.WriteOnly)
+                image.save(buffer, "PNG")
+                self.disk_cache.put(self.url, bytes(buffer.data()), **(validators or {}))
 
-            self.signals.finished.emit()
+            if not self.cancelled:
+                self.signals.result.emit(image)
         except Exception as e:
+            logging.warning(f"Failed to load thumbnail: {e}")
             self.signals.error.emit(str(e))
 
-    def _get_file_info(self):
-        response = self.session.head(self.url, timeout=10)
-        response.raise_for_status()
-
-        content_length = response.headers.get("content-length")
-        file_total_size = int(content_length) if content_length else 0
-
-        accept_ranges = response.headers.get("accept-ranges", "none")
-        supports_range_requests = accept_ranges.lower() == "bytes" and file_total_size > 0
-
-        return file_total_size, supports_range_requests
-
-    def _download_with_multithreading(self, file_total_size):
-        if file_total_size < 10 * 1024 * 1024:
-            optimal_threads = min(self.num_threads, 2)
-        elif file_total_size < 50 * 1024 * 1024:
-            optimal_threads = min(self.num_threads, 4)
-        elif file_total_size < 200 * 1024 * 1024:
-            optimal_threads = min(self.num_threads, 8)
-        else:
-            optimal_threads = min(self.num_threads, 16)
-
-        chunk_size = file_total_size // optimal_threads
-        if chunk_size < self.MIN_CHUNK_SIZE:
-            optimal_threads = 1
-            chunk_size = file_total_size
-
-        self.num_threads = optimal_threads
-
-        temp_files = [f"{self.full_path}.part{i}" for i in range(self.num_threads)]
-        ranges = []
-        for i in range(self.num_threads):
-            start = i * chunk_size
-            end = start + chunk_size - 1 if i < self.num_threads - 1 else file_total_size - 1
-            ranges.append((start, end))
-
-        # 初始化已下载大小容器，优先使用传入的downloaded_size
-        downloaded_size_container = [self.downloaded_size]
-
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.num_threads) as executor:
-            future_to_chunk = {
-                executor.submit(
-                    self._download_chunk, i, range_tuple, file_total_size, downloaded_size_container
-                ): i
-                for i, range_tuple in enumerate(ranges)
-            }
-            concurrent.futures.wait(future_to_chunk)
+    def _render(self, source):
+        """缩放并美化图片：添加圆角和边框"""
+        target_size = self.THUMBNAIL_SIZE
+        scaled = source.scaled(target_size, Qt.KeepAspectRatioByExpanding, Qt.SmoothTransformation)
+
+        canvas = QImage(target_size, QImage.Format_ARGB32_Premultiplied)
+        canvas.fill(Qt.transparent)
+
+        painter = QPainter(canvas)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setRenderHint(QPainter.SmoothPixmapTransform)
+
+        # 绘制圆角矩形裁剪区域
+        path = QPainterPath()
+        path.addRoundedRect(QRectF(0, 0, target_size.width(), target_size.height()), 8, 8)
+        painter.setClipPath(path)
+
+        # 居中绘制图片
+        x = (target_size.width() - scaled.width()) // 2
+        y = (target_size.height() - scaled.height()) // 2
+        painter.drawImage(x, y, scaled)
+
+        # 绘制边框
+        painter.setClipping(False)
+        painter.setPen(QPen(QColor(200, 200, 200, 150), 2))
+        painter.drawRoundedRect(
+            QRectF(1, 1, target_size.width() - 2, target_size.height() - 2), 8, 8
+        )
+        painter.end()
+        return canvas
+
+
+class SourceResolveWorker(QRunnable):
+    """批量解析视频源
+
+    按列表顺序每解析完一个视频就通过 result 发出下载任务，progress 报告已处理的数量。
+    videos 可以是生成器，在工作线程中按需读取。
+    backlog 返回下载队列中等待的任务数，达到 max_backlog 时暂停读取新的视频，
+    避免一次解析成千上万个链接（链接过期前可能轮不到下载）。
+    """
+
+    def __init__(self, api, videos, quality, max_workers=4, rate=2, backlog=None, max_backlog=0):
+        super().__init__()
+        self.videos = videos
+        self.resolver = SourceResolver(api, quality, max_workers, rate)
+        self.backlog = backlog
+        self.max_backlog = max_backlog
+        self.resolved = 0
+        self.failed = 0
+        self.signals = WorkerSignals()
 
+    def cancel(self):
+        self.resolver.cancel()
 
+    def _on_resolved(self, task):
+        self.resolved += 1
+        self.signals.result.emit(task)
+        self._emit_progress()
 
-        # 合并分片文件
+    def _on_failed(self, video, error):
+        self.failed += 1
+        logging.warning(f"Failed to resolve video {video['video_id']}: {error}")
+        self._emit_progress()
+
+    def _emit_progress(self):
+        self.signals.progress.emit({"resolved": self.resolved, "failed": self.failed})
+
+    def _throttled(self):
+        for video in self.videos:
+            while (
+                self.backlog
+                and self.backlog() >= self.max_backlog
+                and not self.resolver.cancelled
+            ):
+                time.sleep(0.5)
+            yield video
+
+    @pyqtSlot()
+    def run(self):
         try:
-            self._merge_files(temp_files)
-            # 确保合并后的文件存在且大小合理
-            if os.path.exists(self.full_path):
-                merged_size = os.path.getsize(self.full_path)
-                # 允许一定的误差（1%）
-                if merged_size >= file_total_size * 0.99:
-                    # 清理分片文件
-                    self._cleanup_temp_files(temp_files)
-                    # 额外清理可能的剩余分片文件
-                    self._cleanup_temp_files(
-                        [f"{self.full_path}.part*" for _ in range(self.num_threads)]
-                    )
-                else:
-                    # 合并失败，清理所有文件
-                    if os.path.exists(self.full_path):
-                        os.remove(self.full_path)
-                    self._cleanup_temp_files(temp_files)
+            self.resolver.resolve_all(self._throttled(), self._on_resolved, self._on_failed)
         except Exception as e:
-            # 合并失败，清理所有文件
-            if os.path.exists(self.full_path):
-                os.remove(self.full_path)
-            self._cleanup_temp_files(temp_files)
-            raise e
-
-        # 更新下载完成的进度
-        with self.progress_lock:
-            downloaded_size_container[0] = file_total_size
-
-        # 发送最终进度更新
-        self.signals.progress.emit(
-            {
-                "progress": 100,
-                "filename": self.filename,
-                "size": file_total_size,
-                "total_size": file_total_size,
-            }
-        )
+            self.signals.error.emit(str(e))
+        finally:
+            self.signals.finished.emit()
 
-    def _download_with_singlethread(self, file_total_size):
-        # 检查现有文件大小
-        existing_size = 0
-        if os.path.exists(self.full_path):
-            existing_size = os.path.getsize(self.full_path)
-
-        # 使用已下载的大小（优先使用实例变量downloaded_size，其次使用文件大小）
-        start_pos = max(self.downloaded_size, existing_size)
-
-        # 如果已经下载完成，直接返回
-        if start_pos >= file_total_size:
-            self.signals.progress.emit(
-                {
-                    "progress": 100,
-                    "filename": self.filename,
-                    "size": file_total_size,
-                    "total_size": file_total_size,
-                }
-            )
-            return
 
-        # 设置Range请求头
-        headers = {"Range": f"bytes={start_pos}-"}
-
-        # 从已下载的位置继续下载
-        current_downloaded = start_pos
-        local_downloaded = 0  # 本地计数器，减少锁操作
-
-        with self.session.get(self.url, headers=headers, stream=True, timeout=(5, 30)) as r:
-            r.raise_for_status()
-            # 使用'ab'模式打开文件，追加写入
-            with open(self.full_path, "ab") as f:
-                for chunk in r.iter_content(chunk_size=self.CHUNK_SIZE):
-                    self.pause_event.wait()
-                    if chunk:
-                        f.write(chunk)
-                        current_downloaded += len(chunk)
-                        local_downloaded += len(chunk)
-                        
-                        # 减少进度更新频率，只在下载了1MB后才更新
-                        if local_downloaded >= 1048576:
-                            progress = (
-                                (current_downloaded / file_total_size) * 100
-                                if file_total_size > 0
-                                else 0
-                            )
-
-                            current_time = time.time()
-                            time_diff = current_time - self.last_speed_update
-                            if time_diff >= 1.0:
-                                bytes_diff = current_downloaded - self.last_downloaded_size
-                                self.current_speed = bytes_diff / time_diff
-                                self.last_speed_update = current_time
-                                self.last_downloaded_size = current_downloaded
-
-                            if self._should_update_progress(progress):
-                                self.signals.progress.emit(
-                                    {
-                                        "progress": progress,
-                                        "filename": self.filename,
-                                        "size": current_downloaded,
-                                        "total_size": file_total_size,
-                                        "speed": self.current_speed,
-                                    }
-                                )
-                            local_downloaded = 0
-                
-                # 更新剩余的本地计数
-                if local_downloaded > 0:
-                    progress = (
-                        (current_downloaded / file_total_size) * 100
-                        if file_total_size > 0
-                        else 0
-                    )
-
-                    current_time = time.time()
-                    time_diff = current_time - self.last_speed_update
-                    if time_diff >= 1.0:
-                        bytes_diff = current_downloaded - self.last_downloaded_size
-                        self.current_speed = bytes_diff / time_diff
-                        self.last_speed_update = current_time
-                        self.last_downloaded_size = current_downloaded
-
-                    if self._should_update_progress(progress):
-                        self.signals.progress.emit(
-                            {
-                                "progress": progress,
-                                "filename": self.filename,
-                                "size": current_downloaded,
-                                "total_size": file_total_size,
-                                "speed": self.current_speed,
-                            }
-                        )
-
-    def _download_chunk(self, index, range_tuple, file_total_size, downloaded_size_container):
-        start, end = range_tuple
-        temp_file_path = f"{self.full_path}.part{index}"
-        downloaded_chunk_size = 0
-        local_downloaded = 0  # 线程本地计数器，减少锁竞争
-        max_retries = 3
-
-        # 检查现有分块文件大小
-        existing_size = 0
-        if os.path.exists(temp_file_path):
-            existing_size = os.path.getsize(temp_file_path)
-
-        # 计算实际的开始位置
-        actual_start = start + existing_size
-        local_downloaded = existing_size
-
-        # 如果已经下载完成，直接返回
-        if actual_start >= end:
-            with self.progress_lock:
-                # 确保只添加未计算的部分
-                chunk_total = end - start
-                if existing_size < chunk_total:
-                    downloaded_size_container[0] += chunk_total - existing_size
-            return {"size": end - start}
-
-        # 设置Range请求头
-        headers = {"Range": f"bytes={actual_start}-{end}"}
-
-        for attempt in range(max_retries):
-            try:
-                with self.session.get(self.url, headers=headers, stream=True, timeout=(5, 30)) as r:
-                    r.raise_for_status()
-                    # 使用'ab'模式打开文件，追加写入
-                    with open(temp_file_path, "ab") as f:
-                        for chunk in r.iter_content(chunk_size=self.CHUNK_SIZE):
-                            self.pause_event.wait()
-                            if chunk:
-                                f.write(chunk)
-                                downloaded_chunk_size += len(chunk)
-                                local_downloaded += len(chunk)
-                                
-                                # 减少锁操作频率，只在下载了1MB后才更新全局计数器
-                                if local_downloaded >= 1048576:
-                                    with self.progress_lock:
-                                        downloaded_size_container[0] += local_downloaded
-                                    local_downloaded = 0
-                                    
-                                    current_progress = (
-                                        downloaded_size_container[0] / file_total_size
-                                    ) * 100
-
-                                    current_time = time.time()
-                                    time_diff = current_time - self.last_speed_update
-                                    if time_diff >= 1.0:
-                                        bytes_diff = (
-                                            downloaded_size_container[0] - self.last_downloaded_size
-                                        )
-                                        self.current_speed = bytes_diff / time_diff
-                                        self.last_speed_update = current_time
-                                        self.last_downloaded_size = downloaded_size_container[0]
-
-                                    if self._should_update_progress(current_progress):
-                                        self.signals.progress.emit(
-                                            {
-                                                "progress": current_progress,
-                                                "filename": self.filename,
-                                                "size": downloaded_size_container[0],
-                                                "total_size": file_total_size,
-                                                "speed": self.current_speed,
-                                            }
-                                        )
-                        
-                        # 更新剩余的本地计数
-                        if local_downloaded > 0:
-                            with self.progress_lock:
-                                downloaded_size_container[0] += local_downloaded
-                                
-                                current_progress = (
-                                    downloaded_size_container[0] / file_total_size
-                                ) * 100
-
-                                current_time = time.time()
-                                time_diff = current_time - self.last_speed_update
-                                if time_diff >= 1.0:
-                                    bytes_diff = (
-                                        downloaded_size_container[0] - self.last_downloaded_size
-                                    )
-                                    self.current_speed = bytes_diff / time_diff
-                                    self.last_speed_update = current_time
-                                    self.last_downloaded_size = downloaded_size_container[0]
-
-                                if self._should_update_progress(current_progress):
-                                    self.signals.progress.emit(
-                                        {
-                                            "progress": current_progress,
-                                            "filename": self.filename,
-                                            "size": downloaded_size_container[0],
-                                            "total_size": file_total_size,
-                                            "speed": self.current_speed,
-                                        }
-                                    )
-                    return {"size": downloaded_chunk_size}
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    time.sleep(1 * (attempt + 1))
-                    with self.progress_lock:
-                        downloaded_size_container[0] -= downloaded_chunk_size
-                    downloaded_chunk_size = 0
-                    local_downloaded = 0
+class AnnouncementWorker(QRunnable):
+    """在后台获取公告，只请求一次，标题和公告内容共用同一份结果
+
+    fetch 返回 (程序标题, 公告标题, 公告内容)，通过 result 发出。
+    """
+
+    def __init__(self, fetch):
+        super().__init__()
+        self.fetch = fetch
+        self.signals = WorkerSignals()
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            self.signals.result.emit(self.fetch())
+        except Exception as e:
+            self.signals.error.emit(str(e))
+        finally:
+            self.signals.finished.emit()
+
+
+class SubscriptionWorker(QRunnable):
+    """依次检查订阅，每个订阅检查完通过 result 发出新视频和更新后的记录"""
+
+    def __init__(self, api, subscriptions):
+        super().__init__()
+        self.api = api
+        self.subscriptions = subscriptions
+        self.signals = WorkerSignals()
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            for subscription in self.subscriptions:
+                try:
+                    new_videos, seen_ids = poll_subscription(self.api, subscription)
+                except Exception as e:
+                    self.signals.error.emit(f"{subscription['name']}: {e}")
                     continue
-                else:
-                    raise e
-        return {"size": downloaded_chunk_size}
-
-    def _merge_files(self, temp_files):
-        with open(self.full_path, "wb") as f:
-            for temp_file in temp_files:
-                with open(temp_file, "rb") as tf:
-                    shutil.copyfileobj(tf, f, length=1024 * 1024)
-
-    def _cleanup_temp_files(self, temp_files):
-        for temp_file in temp_files:
-            if "*" in temp_file:
-                files = glob.glob(temp_file)
-                for file in files:
-                    self._safe_remove(file)
-            else:
-                self._safe_remove(temp_file)
-
-    def _safe_remove(self, file_path):
-        """安全删除文件"""
+                self.signals.result.emit(
+                    {
+                        "name": subscription["name"],
+                        "new_videos": new_videos,
+                        "seen_ids": seen_ids,
+                        "last_checked": time.time(),
+                    }
+                )
+        finally:
+            self.signals.finished.emit()
+
+
+class LibraryPlanWorker(QRunnable):
+    """分析本地视频，result 发出整理计划，progress 报告 {stage, done, total}"""
+
+    PROGRESS_INTERVAL = 0.2  # 进度信号的最小间隔（秒），文件很多时避免塞满事件队列
+
+    def __init__(self, api, files):
+        super().__init__()
+        self.files = files
+        self.planner = LibraryPlanner(api)
+        self._last_progress = 0
+        self.signals = WorkerSignals()
+
+    def cancel(self):
+        self.planner.cancel()
+
+    def _on_progress(self, stage, done, total):
+        now = time.monotonic()
+        if done < total and now - self._last_progress < self.PROGRESS_INTERVAL:
+            return
+        self._last_progress = now
+        self.signals.progress.emit({"stage": stage, "done": done, "total": total})
+
+    @pyqtSlot()
+    def run(self):
         try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
+            self.signals.result.emit(self.planner.build(self.files, self._on_progress))
         except Exception as e:
-            logging.warning(f"Failed to remove {file_path}: {e}")
+            self.signals.error.emit(str(e))
+        finally:
+            self.signals.finished.emit()
+
+
+class DownloadWorker(QRunnable):
+    """下载引擎的 Qt 适配器：在线程池中运行 DownloadEngine，通过信号报告进度"""
 
-    def _should_update_progress(self, current_progress):
-        current_time = time.time()
-        time_passed = current_time - self.last_progress_update
-        progress_changed = (
-            abs(current_progress - self.last_progress_value) >= self.progress_update_threshold
+    def __init__(
+        self,
+        url,
+        filename,
+        save_path=".",
+        num_threads=4,
+        headers=None,
+        cookies=None,
+        url_refresher=None,
+    ):
+        super().__init__()
+        self.signals = WorkerSignals()
+        self.engine = DownloadEngine(
+            url,
+            filename,
+            save_path,
+            num_threads,
+            headers,
+            cookies,
+            url_refresher=url_refresher,
+            progress_callback=self.signals.progress.emit,
         )
 
-        if time_passed >= self.progress_update_interval or progress_changed:
-            self.last_progress_update = current_time
-            self.last_progress_value = current_progress
-            return True
-        return False
+    @property
+    def current_speed(self):
+        return self.engine.current_speed
+
+    @property
+    def is_paused(self):
+        return self.engine.is_paused
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            self.engine.download()
+            self.signals.finished.emit()
+        except DownloadCancelled:
+            # 暂停或退出时取消，分片保留，不发送信号
+            pass
+        except Exception as e:
+            self.signals.error.emit(str(e))
 
     def pause(self):
-        self.is_paused = True
-        self.pause_event.clear()
+        self.engine.pause()
 
     def resume(self):
-        self.is_paused = False
-        self.pause_event.set()
+        self.engine.resume()
+
+    def cancel(self):
+        self.engine.cancel()
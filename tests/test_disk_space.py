@@ -0,0 +1,40 @@
+import unittest
+from unittest import mock
+
+from src.utils import disk_space
+from src.utils.disk_space import DISK_SPACE_MARGIN, DiskSpaceAdmission
+
+MB = 1024 * 1024
+
+
+def make_admission(free, num_threads=1):
+    """临时目录和下载目录在同一个卷上，剩余空间为 free"""
+    with mock.patch.object(disk_space, "free_space", return_value=free), mock.patch.object(
+        disk_space, "same_volume", return_value=True
+    ):
+        return DiskSpaceAdmission("temp", "download", num_threads)
+
+
+class DiskSpaceAdmissionTest(unittest.TestCase):
+    def test_unknown_size_admitted_on_low_free_space(self):
+        # 剩余空间只比余量多 100MB，大小未知的任务仍然可以开始
+        admission = make_admission(DISK_SPACE_MARGIN + 100 * MB, num_threads=4)
+        self.assertTrue(admission.try_reserve({"total_size": 0, "size": 0}))
+        self.assertTrue(admission.try_reserve({"total_size": 0, "size": 0}))
+
+    def test_unknown_size_needs_margin(self):
+        admission = make_admission(DISK_SPACE_MARGIN - MB)
+        self.assertFalse(admission.try_reserve({"total_size": 0, "size": 0}))
+
+    def test_known_size_checked_after_probe(self):
+        admission = make_admission(DISK_SPACE_MARGIN + 100 * MB)
+        self.assertFalse(admission.try_reserve({"total_size": 300 * MB, "size": 0}))
+        self.assertTrue(admission.try_reserve({"total_size": 300 * MB, "size": 250 * MB}))
+
+    def test_unknown_free_space_not_limited(self):
+        admission = make_admission(None)
+        self.assertTrue(admission.try_reserve({"total_size": 10 * 1024 * MB, "size": 0}))
+
+
+if __name__ == "__main__":
+    unittest.main()